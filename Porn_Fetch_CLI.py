@@ -1,4 +1,5 @@
 import time
+import json
 import queue
 import logging
 import os.path
@@ -18,8 +19,13 @@ from base_api.modules.config import RuntimeConfig
 from src.backend.CLI_model_feature_addon import *
 import src.backend.shared_functions as shared_functions
 from src.backend.library_manager import get_library_manager
+from src.backend.library_reconcile import reconcile_library
+from src.backend.library_fingerprint import fingerprint_download, fingerprint_library
+from src.backend.thumbnail_cache import get_thumbnail_service
+from src.backend.video_keys import detect_site
 from base_api.modules.errors import (InvalidProxy, ProxySSLError)
 from rich.progress import Progress, BarColumn, TextColumn, SpinnerColumn, TimeElapsedColumn, TimeRemainingColumn
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 try:
     import av
@@ -212,8 +218,7 @@ Enter choice: """)
                     add_model_url(url, path=path)
 
             elif choice == '3':
-                # requires a function fetch_generator_fn(url)
-                update_pending_for_all_models(self.process_model, path=path)
+                self.refresh_models()
 
             elif choice == '4':
                 urls = input("Enter model URLs to delete (comma-separated): ").split(',')
@@ -232,41 +237,180 @@ Enter choice: """)
             else:
                 print("Invalid choice, please enter 1-6.")
 
-    def update_models(self):
-        models = get_all_saved_models(STATE_FILE)
-        idx = 0
-        for model in models:
-            model_url, data = model
-
-            idx += 1
-            print(f"Processing: [{idx}|{len(models)}] -->: {model_url}")
-            pending_videos = data.get("pending")
-
-            if len(pending_videos) >= 1:
-                print(f"Model has pending videos! Downloading: {len(pending_videos)}")
-                for idx, url in enumerate(pending_videos):
-                    print(f"[{idx}|{len(pending_videos)}] Downloading -->: {url}")
-                    videos = [shared_functions.check_video(url)]
-                    try:
-                        self.iterate_generator(generator=videos, batch=True, auto=True, remove_total_bar=True)
-                        record_download(model_url=model_url, video_url=url, path=STATE_FILE)
-
-                    except Exception:
-                        error = traceback.format_exc()
-                        logger_model_feature.error(f"""
+    @staticmethod
+    def crawl_limits() -> dict:
+        """Global and per-site number of models that are crawled at the same time, lookback window of the watermarks"""
+        return {"workers": conf.getint("Performance", "model_crawl_workers", fallback=8),
+                "per_site": conf.getint("Performance", "model_crawl_per_site", fallback=2),
+                "lookback": conf.getint("Performance", "model_crawl_lookback", fallback=5)}
+
+    @staticmethod
+    def model_scheduler() -> ModelScheduler:
+        return ModelScheduler(get_model_database(STATE_FILE),
+                              min_interval=conf.getfloat("Performance", "model_refresh_min_hours", fallback=1) * 3600,
+                              max_interval=conf.getfloat("Performance", "model_refresh_max_hours", fallback=168) * 3600)
+
+    def refresh_models(self, model_urls=None):
+        """Fetches the pending URLs of the given models (default: all) and reschedules them"""
+        results = update_pending_for_all_models(
+            self.process_model, STATE_FILE, model_urls=model_urls, **self.crawl_limits(),
+            publish_date_fn=lambda video: shared_functions.load_video_metadata(video).publish_date)
+        self.model_scheduler().record_refreshes(results)
+
+    def daemon(self):
+        """
+        Runs forever: refreshes the models that are due (see ModelScheduler) and downloads their pending videos,
+        then sleeps until the next model is due. Stop it with CTRL+C.
+        """
+        database = get_model_database(STATE_FILE)
+        scheduler = self.model_scheduler()
+        print(f"{Fore.LIGHTCYAN_EX}[+]{Fore.RESET} Model daemon started, press CTRL+C to stop")
+        try:
+            while True:
+                # Picks up models that were added / removed by other Porn Fetch instances. Compacting (here or in
+                # another instance) keeps their changes: it applies the whole journal under the database's file lock.
+                database.refresh()
+                due = scheduler.due_models()
+                if due:
+                    print(f"{len(due)} of {len(database.models)} models are due for a refresh")
+                    self.refresh_models(model_urls=due)
+                    self.update_models(model_urls=due)
+                    database.compact()
+
+                next_due = scheduler.next_due()
+                # Wake up at least every 10 minutes to notice new models
+                sleep = 600 if next_due is None else min(max(next_due - time.time(), 1), 600)
+                logger_model_feature.info(f"Model daemon: sleeping for {sleep:.0f} seconds")
+                time.sleep(sleep)
+
+        except KeyboardInterrupt:
+            database.close()
+            print("Model daemon stopped")
+
+    def update_models(self, model_urls=None):
+        """
+        Downloads the pending videos of all models (or the given ones). The videos of all models go into one worker
+        pool (Performance -> workers threads fetch the video pages, at most Performance -> semaphore downloads run at
+        the same time). Every video is recorded in the model database as soon as it's downloaded, and every stage is
+        written to a checkpoint, so an interrupted run continues where it stopped (videos that were in flight first).
+        """
+        database = get_model_database(STATE_FILE)
+        checkpoint = RunCheckpoint(f"{STATE_FILE}.checkpoint")
+        in_flight = resume_checkpoint(database, checkpoint)
+        jobs = database.pending_videos(model_urls)  # Videos listed by several models are only downloaded once
+        if in_flight:
+            print(f"Resuming {len(in_flight)} videos of an interrupted run")
+            resumed = {shared_functions.video_key(url) for _, url in in_flight}
+            jobs = in_flight + [job for job in jobs if shared_functions.video_key(job[1]) not in resumed]
+
+        if not jobs:
+            print(f"No model has pending videos!")
+            checkpoint.finish()
+            return
+
+        print(f"Downloading {len(jobs)} pending videos of {len({model_url for model_url, _ in jobs})} models")
+        self.finished_downloading = 0
+        self.to_be_downloaded = len(jobs)
+        self._progress_stop.clear()
+        self.progress.start()
+        self.progress_thread = threading.Thread(target=self._update_progress, daemon=True)
+        self.progress_thread.start()
+
+        downloaded = failed = dead = 0
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+                futures = {executor.submit(self.download_pending_video, model_url, url, checkpoint): (model_url, url)
+                           for model_url, url in jobs}
+
+                for future in as_completed(futures):
+                    model_url, url = futures[future]
+                    failure = future.result()
+                    if failure is None:
+                        database.record_download(model_url=model_url, video_url=url)  # Checkpoint
+                        downloaded += 1
+
+                    else:
+                        failed += 1
+                        dead += database.record_failure(model_url, url, *failure)
+
+            checkpoint.finish()  # Only reached if the run wasn't interrupted
+
+        finally:
+            self._progress_stop.set()
+            self.progress_thread.join()
+            self.progress.stop()
+
+        logger_model_feature.info(f"""
+        Models: {len({model_url for model_url, _ in jobs})}
+        STATUS: Finished! {downloaded} downloaded, {failed} failed, {dead} moved to the dead letter list
+        """)
+        print(f"{Fore.LIGHTGREEN_EX}[+]{Fore.RESET} Finished: {downloaded} downloaded, {failed} failed "
+              f"({dead} of them failed too often and were moved to the dead letter list, the others will be retried)")
+
+    def download_pending_video(self, model_url: str, url: str, checkpoint: RunCheckpoint):
+        """
+        Downloads one pending video of a model (runs in the update_models() pool), retries with exponential backoff
+        and writes the stages to the checkpoint. Removed, premium-only and region-blocked videos aren't retried.
+
+        Returns:
+            None if the video is on disk, else (failure reason, error message) of the last attempt
+        """
+        attempts = max(1, self.retries or 1)
+        failure = None
+        for attempt in range(1, attempts + 1):
+            out_file = None
+            try:
+                video = shared_functions.check_video(url)
+                out_file = self.output_file(shared_functions.load_video_metadata(video))
+                if os.path.exists(out_file):
+                    item = checkpoint.items.get((model_url, url), {})
+                    if item.get("stage") == "fetched" and item.get("file") == out_file:
+                        # An interrupted run completed the transfer, only the tags / library entry are missing
+                        print(f"Finishing interrupted download: {out_file}")
+                        self.finish_download(video, out_file)
+
+                    else:
+                        print(f"Skipping existing file: {out_file}")
+
+                    checkpoint.mark(model_url, url, "downloaded", out_file)
+                    return None
+
+                self.semaphore.acquire()  # Released by download()
+                checkpoint.mark(model_url, url, "downloading", out_file)
+                task_id = self.progress.add_task(description=f"Downloading: {video.title}", total=None)
+                self.download(video, out_file, task_id,
+                              on_fetched=lambda: checkpoint.mark(model_url, url, "fetched", out_file))
+                if os.path.exists(out_file):
+                    checkpoint.mark(model_url, url, "downloaded", out_file)
+                    return None
+
+                raise FileNotFoundError(f"Download finished, but the file doesn't exist: {out_file}")
+
+            except (KeyboardInterrupt, SystemExit):
+                raise
+
+            except BaseException as e:  # Some API errors (e.g. phub's VideoDisabled) don't derive from Exception
+                failure = (classify_failure(e), f"{type(e).__name__}: {e}")
+                error = traceback.format_exc()
+                logger_model_feature.error(f"""
         Model: {model_url}
         Video URL: {url}
         Error: {error}
-        Index: {idx}""")
+        Attempt: {attempt}/{attempts}""")
 
-                logger_model_feature.info(f"""
-        Model: {model_url}
-        STATUS: Finished!
-        """)
+                # Only while downloading, from "fetched" on the file is complete
+                if checkpoint.items.get((model_url, url), {}).get("stage") == "downloading" and out_file \
+                        and os.path.isfile(out_file):
+                    os.remove(out_file)  # Incomplete, the next attempt would skip it as an existing file
 
-            else:
-                print(f"Model has no pending videos, continuing with the next one!")
-                continue
+                if failure[0] in PERMANENT_FAILURES:
+                    break
+
+                if attempt < attempts:
+                    time.sleep(min(2 ** attempt, 60))
+
+        checkpoint.mark(model_url, url, "failed")
+        return failure
 
     def set_proxy(self):
         proxy = input(f"""
@@ -487,24 +631,26 @@ Bugs can be reported at: https://github.com/EchterAlsFake/Porn_Fetch/issues/
                 with open("config.ini", "w") as config_file: #type: TextIOWrapper
                     conf.write(config_file)
 
+    def output_file(self, metadata) -> str:
+        """Output path of a video, based on its metadata (creates the author directory if needed)"""
+        title = metadata.title or "video"
+
+        out_dir = self.output_path or os.getcwd()
+        if self.directory_system:
+            author_dir = os.path.join(out_dir, metadata.author)
+            os.makedirs(author_dir, exist_ok=True)
+            return os.path.join(author_dir, f"{title}.mp4")
+
+        return os.path.join(out_dir, f"{title}.mp4")
+
     def process_video(self, url=None, video=None, batch=False, remove_total_bar=False):
         self.semaphore.acquire()
         if video is None:
             url = url or input("Enter Video URL: ")
             video = shared_functions.check_video(url=url)
 
-        attrs = shared_functions.load_video_attributes(video)
-        author = attrs.get('author', '')
-        title = attrs.get('title', 'video')
-
-        # Determine output path
-        out_dir = self.output_path or os.getcwd()
-        if self.directory_system:
-            author_dir = os.path.join(out_dir, author)
-            os.makedirs(author_dir, exist_ok=True)
-            out_file = os.path.join(author_dir, f"{title}.mp4")
-        else:
-            out_file = os.path.join(out_dir, f"{title}.mp4")
+        metadata = shared_functions.load_video_metadata(video)
+        out_file = self.output_file(metadata)
 
         if os.path.exists(out_file):
             logger.debug(f"File exists, skipping: {out_file}")
@@ -512,9 +658,12 @@ Bugs can be reported at: https://github.com/EchterAlsFake/Porn_Fetch/issues/
             self.semaphore.release()
             return
 
+        # Fetched in the background while the video downloads, for the tags and the library
+        get_thumbnail_service().prefetch(metadata.key, metadata.thumbnail)
+
         # Create per-video task
         task_id = self.progress.add_task(
-            description=f"Downloading: {title}",
+            description=f"Downloading: {metadata.title or 'video'}",
             total=None,
         )
 
@@ -621,19 +770,20 @@ Bugs can be reported at: https://github.com/EchterAlsFake/Porn_Fetch/issues/
         else:
             model = url
 
-        if shared_functions.eporner_pattern.search(model):
+        site = detect_site(model)
+        if site == "eporner":
             model = shared_functions.ep_client.get_pornstar(model, enable_html_scraping=True).videos(pages=10)
 
-        elif shared_functions.xnxx_pattern.match(model):
+        elif site == "xnxx":
             model = shared_functions.xn_client.get_user(model).videos
 
-        elif shared_functions.pornhub_pattern.match(model):
+        elif site == "pornhub":
             model = itertools.chain(shared_functions.ph_client.get_user(model).videos, shared_functions.ph_client.get_user(model).uploads)
 
-        elif shared_functions.hqporner_pattern.match(model):
+        elif site == "hqporner":
             model = shared_functions.hq_client.get_videos_by_actress(model)
 
-        elif shared_functions.xvideos_pattern.match(model):
+        elif site == "xvideos":
             if "/model" in model or "/pornstar" in model:
                 model = shared_functions.xv_client.get_pornstar(model).videos
 
@@ -705,31 +855,34 @@ Bugs can be reported at: https://github.com/EchterAlsFake/Porn_Fetch/issues/
         logger.debug(f"{return_color()}Done!")
         self.iterate_generator(videos)
 
-    def download(self, video, output_path, task_id, remove_total_bar=False):
+    def download(self, video, output_path, task_id, remove_total_bar=False, on_fetched=None):
+        """
+        Downloads a video, writes its tags and adds it to the library. on_fetched is called as soon as the transfer
+        returned, before the tags / library entry are written. Releases the semaphore (once) in every case.
+        """
+        is_byte_download = False
+        transferred = False
         try:
             # Check library for duplicates
             library = get_library_manager()
-            video_attrs = shared_functions.load_video_attributes(video)
-            video_url = video_attrs.get("url") or (video.url if hasattr(video, 'url') else None)
+            metadata = shared_functions.load_video_metadata(video)
 
             # Check if video already in library AND file exists locally
-            if video_url and library.check_duplicate(url=video_url, title=video.title):
+            if metadata.url and library.check_duplicate(url=metadata.url, title=video.title):
                 # Check if local file actually exists
                 from pathlib import Path
                 if Path(output_path).exists():
                     logger.debug(f"Video already in library, skipping: {video.title}")
                     print(f"{Fore.LIGHTYELLOW_EX}[!]{Fore.RESET} Video already in library, skipping: {video.title}")
-                    self.semaphore.release()
-                    self.progress.remove_task(task_id)
-                    return
+                    return  # The semaphore is released below
                 else:
                     logger.debug(f"Video in library but file missing, re-downloading: {video.title}")
                     print(f"{Fore.LIGHTYELLOW_EX}[!]{Fore.RESET} Video in library but file missing, re-downloading: {video.title}")
 
-            # Detect whether this is a byte-based download
+            # Detect whether this is a byte-based download (is_site_video() never imports a site package)
             is_byte_download = (
-                isinstance(video, shared_functions.hq_Video)
-                or isinstance(video, shared_functions.ep_Video)
+                shared_functions.is_site_video(video, "hqporner")
+                or shared_functions.is_site_video(video, "eporner")
             )
 
             def callback_wrapper(pos, total):
@@ -751,7 +904,7 @@ Bugs can be reported at: https://github.com/EchterAlsFake/Porn_Fetch/issues/
                         self.progress.update(self.task_total_progress, advance=1)
 
             # Kick off the right download call
-            if isinstance(video, shared_functions.ph_Video):
+            if shared_functions.is_site_video(video, "pornhub"):
                 video.download(path=output_path,
                     quality=self.quality,
                     downloader=self.threading_mode,
@@ -776,77 +929,15 @@ Bugs can be reported at: https://github.com/EchterAlsFake/Porn_Fetch/issues/
                     no_title=True,
                 )
 
-        finally:
-            logger.debug(f"Finished download: {video.title}")
-            video_attrs = shared_functions.load_video_attributes(video)
-
-            # Only write tags if file exists (download was successful)
-            from pathlib import Path
-            if conf["Video"]["write_metadata"] == "true" and Path(output_path).exists():
-                if remux:
-                    shared_functions.write_tags(
-                        path=output_path,
-                        data=video_attrs)
-
-            # Add video to library
-            try:
-                library = get_library_manager()
-                video_url = video_attrs.get("url") or (video.url if hasattr(video, 'url') else None)
-
-                # Convert tags to list
-                tags_data = video_attrs.get("tags", "")
-                try:
-                    if isinstance(tags_data, str) and tags_data != "Not available":
-                        tags_list = [tag.strip() for tag in tags_data.split(",") if tag.strip()]
-                    elif isinstance(tags_data, list):
-                        # Tags is already a list
-                        tags_list = [str(tag).strip() for tag in tags_data if tag]
-                    else:
-                        tags_list = []
-                except Exception:
-                    tags_list = []
+            transferred = True
+            if on_fetched is not None:
+                on_fetched()
 
-                # Convert actors to list if it's a string
-                actors_data = video_attrs.get("actors", [])
-                try:
-                    if isinstance(actors_data, str) and actors_data != "Not available":
-                        actors_list = [actor.strip() for actor in actors_data.split(",") if actor.strip()]
-                    elif isinstance(actors_data, list):
-                        # Handle list of objects or strings
-                        actors_list = []
-                        for actor in actors_data:
-                            if hasattr(actor, 'name'):
-                                actors_list.append(str(actor.name))
-                            elif isinstance(actor, str):
-                                actors_list.append(actor)
-                            else:
-                                actors_list.append(str(actor))
-                    else:
-                        actors_list = []
-                except Exception:
-                    actors_list = []
-
-                # Convert publish_date to string if it's not already
-                publish_date = video_attrs.get("publish_date")
-                if publish_date and not isinstance(publish_date, str):
-                    publish_date = str(publish_date)
-
-                library.add_video_entry(
-                    url=video_url or "",
-                    video_id=str(hash(video_url)) if video_url else str(hash(video.title)),
-                    title=video_attrs.get("title", "Unknown"),
-                    author=video_attrs.get("author", "Unknown"),
-                    duration=video_attrs.get("duration_seconds"),
-                    tags=tags_list,
-                    actors=actors_list,
-                    file_path=output_path,
-                    thumbnail=video_attrs.get("thumbnail"),
-                    publish_date=publish_date,
-                    quality=self.quality
-                )
-                logger.debug(f"Added video to library: {video.title}")
-            except Exception as e:
-                logger.error(f"Failed to add video to library: {e}")
+        finally:
+            if transferred:
+                # Only for complete files: a failed transfer must not be tagged or end up in the library
+                logger.debug(f"Finished download: {video.title}")
+                self.finish_download(video, output_path)
 
             # Release semaphore and log
             t = next((t for t in self.progress.tasks if t.id == task_id), None)
@@ -854,7 +945,8 @@ Bugs can be reported at: https://github.com/EchterAlsFake/Porn_Fetch/issues/
                 self.progress.update(task_id, completed=t.total)
             self.finished_downloading += 1
             self.semaphore.release()
-            print(f"{Fore.LIGHTGREEN_EX}[+]{Fore.LIGHTYELLOW_EX} Download finished: {video.title}")
+            if transferred:
+                print(f"{Fore.LIGHTGREEN_EX}[+]{Fore.LIGHTYELLOW_EX} Download finished: {video.title}")
 
             # Clean up the per-video bar; leave total bar intact for segments
             try:
@@ -864,6 +956,55 @@ Bugs can be reported at: https://github.com/EchterAlsFake/Porn_Fetch/issues/
             except ValueError:
                 pass
 
+    def finish_download(self, video, output_path):
+        """
+        Writes the tags of a downloaded video and adds it to the library. Errors are logged and never remove the file.
+        """
+        metadata = shared_functions.load_video_metadata(video)
+
+        # Optional content fingerprint (finds the same video downloaded from another URL / site). Computed before the
+        # tags are written, a file that gets replaced by a hard link to the existing copy isn't tagged again.
+        fingerprint = None
+        linked = False
+        if conf.get("Video", "fingerprint_downloads", fallback="false") == "true" and os.path.isfile(output_path):
+            try:
+                fingerprint, duplicate, linked = fingerprint_download(
+                    get_library_manager(), output_path, hardlink=conf.get("Video", "hardlink_duplicates", fallback="false") == "true")
+                if duplicate is not None:
+                    print(f"{Fore.LIGHTYELLOW_EX}[!]{Fore.RESET} Same content as: {duplicate.get('file_path')}")
+
+            except Exception as e:
+                logger.error(f"Failed to fingerprint {output_path}: {e}")
+
+        # Only write tags if file exists (download was successful)
+        if conf["Video"]["write_metadata"] == "true" and remux and os.path.exists(output_path) and not linked:
+            try:
+                shared_functions.write_tags(path=output_path, metadata=metadata)
+
+            except Exception as e:
+                logger.error(f"Failed to write tags to {output_path}: {e}")
+
+        # Add video to library
+        try:
+            get_library_manager().add_video_entry(
+                url=metadata.url or "",
+                video_id=metadata.key,
+                title=metadata.title or "Unknown",
+                author=metadata.author,
+                duration=metadata.duration_seconds,
+                tags=list(metadata.tags),
+                actors=list(metadata.actors),
+                file_path=output_path,
+                thumbnail=metadata.thumbnail,
+                publish_date=metadata.publish_date_text,
+                quality=self.quality,
+                fingerprint=fingerprint,
+                thumbnail_path=get_thumbnail_service().library_path(metadata.key)
+            )
+            logger.debug(f"Added video to library: {video.title}")
+        except Exception as e:
+            logger.error(f"Failed to add video to library: {e}")
+
     def _update_progress(self):
         # Exit once every task is finished (no live tasks left).
         while not self._progress_stop.is_set():
@@ -873,7 +1014,7 @@ Bugs can be reported at: https://github.com/EchterAlsFake/Porn_Fetch/issues/
 
     @staticmethod
     def credits():
-        content = BaseCore().fetch("https://raw.githubusercontent.com/EchterAlsFake/Porn_Fetch/master/README/CREDITS.md")
+        content = shared_functions.core.fetch("https://raw.githubusercontent.com/EchterAlsFake/Porn_Fetch/master/README/CREDITS.md")
         md = Markdown(content)
         rprint(md)
 
@@ -953,6 +1094,25 @@ By using the CLI batch mode you automatically accept the GPLv3 License of Porn F
             parser.add_argument("--remove-model-from-database", help="A model URL that should be removed from the database")
             parser.add_argument("--update-models", help="Runs the model update function", action="store_true")
             parser.add_argument("--update-pending-urls", help="Updates the videos that need to be fetched from a model", action="store_true")
+            parser.add_argument("--retry-dead-letter", help="Puts the model videos that failed too often back into "
+                                                            "the pending lists", action="store_true")
+            parser.add_argument("--daemon", help="Keeps running and refreshes / downloads every model when it's due "
+                                                 "(based on how often the model uploads)", action="store_true")
+            parser.add_argument("--library-import-json", help="Imports a library.json file into the configured library "
+                                                              "(e.g., to migrate to an SQLite library)", type=str)
+            parser.add_argument("--library-export-json", help="Exports the configured library into a library.json file",
+                                type=str)
+            parser.add_argument("--library-reconcile", help="Compares the library with the files in the given directories "
+                                                            "(default: the output path) and reports missing, orphan and "
+                                                            "moved files as JSON", nargs="*", metavar="DIRECTORY")
+            parser.add_argument("--library-reconcile-dry-run", help="Only report, don't update the library",
+                                action="store_true")
+            parser.add_argument("--library-fingerprint", help="Hashes all downloaded files of the library and reports "
+                                                              "files with the same content as JSON", action="store_true")
+            parser.add_argument("--library-hardlink-duplicates", help="Together with --library-fingerprint: replaces "
+                                                                      "duplicate files with hard links", action="store_true")
+            parser.add_argument("--library-stats", help="Prints statistics and the top authors / tags / actors / sites "
+                                                        "of the library as JSON", action="store_true")
 
             args = parser.parse_args()
 
@@ -970,8 +1130,44 @@ By using the CLI batch mode you automatically accept the GPLv3 License of Porn F
                 remove_model_url(model_url, path=STATE_FILE)
                 exit(0)
 
+            if args.retry_dead_letter:
+                count = get_model_database(STATE_FILE).revive_dead_letter()
+                print(f"{count} videos are pending again")
+                exit(0)
+
             if args.update_pending_urls:
-                update_pending_for_all_models(self.process_model, STATE_FILE)
+                self.refresh_models()
+                exit(0)
+
+            if args.library_import_json:
+                count = get_library_manager().import_json(args.library_import_json)
+                print(f"Imported {count} videos into the library")
+                exit(0)
+
+            if args.library_export_json:
+                count = get_library_manager().export_json(args.library_export_json)
+                print(f"Exported {count} videos to: {args.library_export_json}")
+                exit(0)
+
+            if args.library_reconcile is not None:
+                roots = args.library_reconcile or [conf.get("Video", "output_path", fallback=os.getcwd())]
+                report = reconcile_library(get_library_manager(), roots, apply=not args.library_reconcile_dry_run)
+                print(json.dumps(report, indent=2, ensure_ascii=False))
+                exit(0)
+
+            if args.library_fingerprint:
+                report = fingerprint_library(get_library_manager(), hardlink=args.library_hardlink_duplicates)
+                print(json.dumps(report, indent=2, ensure_ascii=False))
+                exit(0)
+
+            if args.library_stats:
+                library = get_library_manager()
+                stats = library.get_library_stats()
+                for facet in ("authors", "tags", "actors"):
+                    stats[f"top_{facet}"] = dict(library.get_facet(facet, limit=20))
+
+                stats["download_months"] = dict(library.get_facet("download_months"))
+                print(json.dumps(stats, indent=2, ensure_ascii=False))
                 exit(0)
 
             if args.update_models:
@@ -980,6 +1176,12 @@ By using the CLI batch mode you automatically accept the GPLv3 License of Porn F
                 cli.update_models()
                 exit(0)
 
+            if args.daemon:
+                cli = CLI()
+                cli.load_user_settings()
+                cli.daemon()
+                exit(0)
+
             if args.batch is False:
                 CLI().init()
 
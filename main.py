@@ -152,7 +152,10 @@ try:
     from src.backend.donation_nag import DonationNag
     from src.backend.license import License, Disclaimer
     from src.backend.config import shared_config
-    from src.backend.library_manager import get_library_manager
+    from src.backend.library_manager import get_library_manager, close_library_manager
+    from src.backend.library_fingerprint import fingerprint_download
+    from src.backend.video_keys import detect_site, video_key_as_filename
+    from src.backend.thumbnail_cache import get_thumbnail_service
     from hqporner_api.api import Sort as hq_Sort
 
     from PySide6.QtCore import (QFile, QTextStream, Signal, QRunnable, QThreadPool, QObject, QSemaphore, Qt, QLocale,
@@ -255,7 +258,7 @@ class VideoData:
             video_titles = [video_titles]
 
         for video_title in video_titles:
-            del self.data_objects[video_title]  # Del is faster than pop :)
+            self.data_objects.pop(video_title, None)  # The same video (key) can finish more than once
 
 video_data = VideoData()
 
@@ -267,8 +270,8 @@ class Signals(QObject):
     progress_add_to_tree_widget = Signal(int, int)  # Tracks the number of videos
     # loaded and processed into the tree widget
 
-    progress_video = Signal(int, int, int)
-    progress_video_range = Signal(int, int)
+    progress_video = Signal(object, int, int)  # video key, position, total
+    progress_video_range = Signal(object, int)
     progress_video_converting = Signal(int, int)
 
     error_signal = Signal(object)
@@ -283,13 +286,14 @@ class Signals(QObject):
     update_check = Signal(bool, dict)
     result = Signal(dict)  # Reports the result of the internet checks if something went wrong
     clear_tree_widget_signal = Signal()  # A signal to clear the tree widget
-    text_data_to_tree_widget = Signal(int)  # Sends the text data in the form of a dictionary to the main class
+    text_data_to_tree_widget = Signal(object)  # Sends the video key of the loaded data to the main class
     download_completed = Signal(object)  # Reports a successfully downloaded video
     progress_send_video = Signal(object,
                                  object)  # Sends the selected video objects from the tree widget to the main class
     tree_widget_finished = Signal()
     # to download them
     url_iterators = Signal(object, object)  # Sends the processed URLs from the file to Porn Fetch
+    thumbnail_ready = Signal(object)  # Reports the video key of a thumbnail that is in the thumbnail cache now
 
 
 class InstallThread(QRunnable):
@@ -442,24 +446,24 @@ class InternetCheck(QRunnable):
                                    http_ip=shared_functions.http_log_ip, http_port=shared_functions.http_log_port)
 
     def run(self):
+        # One session for all sites, only the Referer differs per request (keeps the connections of the shared pool)
+        session = shared_functions.core_internet_checks.session
+        session.headers.update({
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                          "AppleWebKit/537.36 (KHTML, like Gecko) "
+                          "Chrome/139.0.0.0 Safari/537.36",
+            "Accept-Language": "en-US,en;q=0.9",
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        })
+
         for idx, website in enumerate(self.websites, start=1):
             try:
-                ref = shared_functions.origin(website)
-
-                # DUMMY FIX: rebuild session with per-site headers
-                shared_functions.core_internet_checks.initialize_session(headers={
-                    "Referer": ref,
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                                  "AppleWebKit/537.36 (KHTML, like Gecko) "
-                                  "Chrome/139.0.0.0 Safari/537.36",
-                    "Accept-Language": "en-US,en;q=0.9",
-                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-                })
+                headers = {"Referer": shared_functions.origin(website)}
 
                 # Try HEAD first (lighter); some sites disallow HEAD -> fallback to GET
-                resp = shared_functions.core_internet_checks.session.head(website, timeout=10)
+                resp = session.head(website, headers=headers, timeout=10)
                 if resp.status_code in (405, 501):  # method not allowed / not implemented
-                    resp = shared_functions.core_internet_checks.session.get(website, timeout=10)
+                    resp = session.get(website, headers=headers, timeout=10)
 
                 if resp.status_code == 200:
                     self.logger.debug(f"Internet Check: {website} : OK")
@@ -533,42 +537,43 @@ class AddToTreeWidget(QRunnable):
 
         for attempt in range(0, 5):
             try:
-                video_id = random.randint(0, 99999999) # Creates a random ID for each video
                 if isinstance(video, str):
                     video = shared_functions.check_video(url=video, is_url=True)
 
+                video_id = shared_functions.video_key(video.url) # Same (site, video ID) key in every run
                 self.logger.debug(f"Created ID: {video_id} for: {video.url}")
-                data = shared_functions.load_video_attributes(video)
+                metadata = shared_functions.load_video_metadata(video)
                 session_urls.append(video.url)
-                self.logger.debug("Loaded video attributes")
+                self.logger.debug("Loaded video metadata")
+                # Fetched in the background, for the preview, the tags and the library
+                get_thumbnail_service().prefetch(video_id, metadata.thumbnail)
                 stripped_title = shared_functions.core.strip_title(
-                    data.get("title"))  # Strip the title so that videos with special chars can be
-                                        # saved on windows. it would raise an OSError otherwise
+                    metadata.title)  # Strip the title so that videos with special chars can be
+                                     # saved on windows. it would raise an OSError otherwise
 
                 if self.consistent_data.get("video_id_as_filename"):
-                    stripped_title = str(video_id)
+                    stripped_title = video_key_as_filename(video_id)
 
                 if self.consistent_data.get(
                         "directory_system"):  # If the directory system is enabled, this will create an additional folder
-                    author_path = os.path.join(self.output_path, data.get("author"))
+                    author_path = os.path.join(self.output_path, metadata.author)
                     os.makedirs(author_path, exist_ok=True)
                     output_path = os.path.join(str(author_path), stripped_title + ".mp4")
 
                 else:
                     output_path = os.path.join(self.output_path, stripped_title + ".mp4")
 
-                stripped_title = shared_functions.core.strip_title(title=data.get("title"))
-                # Emit the loaded signal with all the required information
-
-                data.update(
-                    {
-                        "title": stripped_title,
-                        "output_path": output_path,
-                        "index": index,
-                        "video": video
-                    })
-
-                video_data.data_objects.update({video_id: data})
+                stripped_title = shared_functions.core.strip_title(title=metadata.title)
+                # Emit the loaded signal with all the required information. The metadata record is shared (it's
+                # cached and immutable), everything that belongs to this download job goes next to it.
+
+                video_data.data_objects.update({video_id: {
+                    "metadata": metadata,
+                    "title": stripped_title,
+                    "output_path": output_path,
+                    "index": index,
+                    "video": video
+                }})
                 return video_id
 
             except (shared_functions.errors.PremiumVideo, IndexError):
@@ -765,7 +770,7 @@ class DownloadThread(QRunnable):
             video_url = video_obj.url if video_obj and hasattr(video_obj, 'url') else ""
 
             # Check if video already in library AND file exists locally
-            if video_url and library.check_duplicate(url=video_url, video_id=str(self.video_id)):
+            if video_url and library.check_duplicate(url=video_url, video_id=self.video_id):
                 # Check if local file actually exists
                 if os.path.isfile(self.output_path):
                     self.logger.debug(f"Video already in library, skipping: {self.video.title}")
@@ -799,7 +804,8 @@ class DownloadThread(QRunnable):
 
 
             # We need to specify the sources, so that it knows which individual progressbar to use
-            if isinstance(self.video, shared_functions.hq_Video) or isinstance(self.video, shared_functions.ep_Video):
+            # is_site_video() never imports a site package, the video of a single site doesn't load the others
+            if shared_functions.is_site_video(self.video, "hqporner") or shared_functions.is_site_video(self.video, "eporner"):
                 video_source = "raw"
                 try:
                     self.video.download(quality=self.quality, path=self.output_path, no_title=True,
@@ -809,7 +815,7 @@ class DownloadThread(QRunnable):
                     error = traceback.format_exc()
                     handle_error_gracefully(data=self.consistent_data, self=self, error_message=f"An error happened while downloading a video from HQPorner / EPorner: {error}", needs_network_log=True)
 
-            elif isinstance(self.video, shared_functions.ph_Video):  # Assuming 'Video' is the class for Pornhub
+            elif shared_functions.is_site_video(self.video, "pornhub"):
                 video_source = "general"
                 self.logger.debug("Starting the Download!")
                 self.video.download(downloader=str(self.threading_mode), path=self.output_path, quality=self.quality, remux=remux, display_remux=self.callback_remux,
@@ -825,11 +831,25 @@ class DownloadThread(QRunnable):
             handle_error_gracefully(self, data=video_data.consistent_data, error_message=error, needs_network_log=True)
 
         finally:
+            # Optional content fingerprint, computed here so that hashing big files doesn't block the UI thread. Done
+            # before the tags are written, a file that gets replaced by a hard link to the existing copy isn't tagged.
+            linked = False
+            if conf.get("Video", "fingerprint_downloads", fallback="false") == "true" and os.path.isfile(self.output_path):
+                try:
+                    fingerprint, duplicate, linked = fingerprint_download(
+                        get_library_manager(), self.output_path,
+                        hardlink=conf.get("Video", "hardlink_duplicates", fallback="false") == "true")
+                    video_data.data_objects.get(self.video_id, {})["fingerprint"] = fingerprint
+
+                except Exception:
+                    self.logger.error(f"Could not fingerprint {self.output_path}: {traceback.format_exc()}")
+
             # Only write tags if file exists (download was successful)
-            if self.consistent_data.get("write_metadata") and os.path.isfile(self.output_path):
+            if self.consistent_data.get("write_metadata") and os.path.isfile(self.output_path) and not linked:
                 try:
                     if not FORCE_DISABLE_AV:
-                        shared_functions.write_tags(path=self.output_path, data=video_data.data_objects.get(self.video_id))
+                        shared_functions.write_tags(path=self.output_path,
+                                                    metadata=video_data.data_objects[self.video_id]["metadata"])
 
                 except Exception:
                     error = traceback.format_exc()
@@ -1000,6 +1020,8 @@ class PornFetch(QMainWindow):
         self.supress_errors = None
         self.direct_download = None
         self._full_pixmap = None
+        self.thumbnail_signals = Signals()
+        self.thumbnail_signals.thumbnail_ready.connect(self.thumbnail_ready)
         if __build__ == "desktop":
             self.ui = Ui_MainWindow()
 
@@ -1884,7 +1906,8 @@ Unless you use your own ELITE proxy, DO NOT REPORT ANY ERRORS THAT OCCUR WHEN YO
             model = self.ui.download_lineedit_model_url.text()
 
         self.logger.info(f"Checking model: {url}")
-        if shared_functions.pornhub_pattern.match(model):
+        site = detect_site(model)
+        if site == "pornhub":
             model_object = shared_functions.ph_client.get_user(model)
             videos = model_object.videos
             uploads = model_object.uploads
@@ -1898,7 +1921,7 @@ Unless you use your own ELITE proxy, DO NOT REPORT ANY ERRORS THAT OCCUR WHEN YO
             elif self.model_videos_type == "uploads":
                 videos = uploads
 
-        elif shared_functions.hqporner_pattern.match(model):
+        elif site == "hqporner":
             try:
                 videos = shared_functions.hq_client.get_videos_by_actress(name=model)
 
@@ -1910,10 +1933,10 @@ Unless you use your own ELITE proxy, DO NOT REPORT ANY ERRORS THAT OCCUR WHEN YO
                 handle_error_gracefully(self, data=video_data.consistent_data, error_message="No videos found. This is probably an error and will be reported.", needs_network_log=True)
                 return
 
-        elif shared_functions.eporner_pattern.match(model):
+        elif site == "eporner":
             videos = shared_functions.ep_client.get_pornstar(url=model, enable_html_scraping=True).videos()
 
-        elif shared_functions.xnxx_pattern.match(model):
+        elif site == "xnxx":
             videos = shared_functions.xn_client.get_user(url=model).videos
 
         elif "xvideos" and "model" or "pornstar" in str(model):
@@ -2038,29 +2061,23 @@ Unless you use your own ELITE proxy, DO NOT REPORT ANY ERRORS THAT OCCUR WHEN YO
         self.threadpool.start(self.add_to_tree_widget_thread_)
         self.logger.debug("Started the thread for adding videos...")
 
-    def add_to_tree_widget_signal(self, identifier: int):
+    def add_to_tree_widget_signal(self, identifier: str):
         """
         Receives video data (by identifier) and applies it to the GUI tree widget.
 
-        The video length is parsed using parse_length(), which now handles multiple formats:
-          - "mm:ss" (e.g. "16:19")
-          - Digits-only strings that are interpreted based on video source (xnxx vs. eporner/phub)
-          - Decimal, mixed-unit, and other formats.
-
-        A display string and a zero-padded sorting key are then generated.
+        The length was normalized when the metadata was loaded (see video_metadata), only the display string (minutes)
+        and a zero-padded sorting key are generated here.
         """
         self.logger.info(f"Applying video data for ID -->: {identifier}")
         self.last_index += 1
         data = video_data.data_objects.get(identifier)
+        metadata = data["metadata"]
         title = data.get("title")
-        author = data.get("author")
-        raw_length = data.get("length")  # Raw length from the data source.
+        author = metadata.author
         index = data.get("index")
-        video = data.get("video")  # e.g. a URL or identifier that may contain "xnxx", "eporner", etc.
-        thumbnail = data.get("thumbnail")
-
-        # Parse the raw length, passing video as a hint for the source.
-        parsed_length = shared_functions.parse_length(raw_length, video)
+        video = data.get("video")
+        thumbnail = metadata.thumbnail
+        parsed_length = metadata.duration_minutes
 
         item = QTreeWidgetItem(self.ui.treeWidget)
 
@@ -2075,7 +2092,7 @@ Unless you use your own ELITE proxy, DO NOT REPORT ANY ERRORS THAT OCCUR WHEN YO
         item.setText(1, author)
 
         # Prepare display and sort keys for the duration.
-        if parsed_length == "Not available" or parsed_length is None:
+        if parsed_length is None:
             display_duration = "Not available"
             formatted_duration = "000000000"
         else:
@@ -2146,66 +2163,28 @@ Unless you use your own ELITE proxy, DO NOT REPORT ANY ERRORS THAT OCCUR WHEN YO
             library = get_library_manager()
             data = video_data.data_objects.get(video_id, {})
             if data:
-                # Extract URL from video object
-                video_obj = data.get("video")
-                video_url = video_obj.url if video_obj and hasattr(video_obj, 'url') else ""
+                metadata = data["metadata"]
 
                 # Get the output path from the data
                 output_path = data.get("output_path", "")
 
-                # Convert tags to list
-                tags_data = data.get("tags", "")
-                try:
-                    if isinstance(tags_data, str) and tags_data != "Not available":
-                        tags_list = [tag.strip() for tag in tags_data.split(",") if tag.strip()]
-                    elif isinstance(tags_data, list):
-                        # Tags is already a list
-                        tags_list = [str(tag).strip() for tag in tags_data if tag]
-                    else:
-                        tags_list = []
-                except Exception:
-                    tags_list = []
-
-                # Convert actors to list if it's a string
-                actors_data = data.get("actors", [])
-                try:
-                    if isinstance(actors_data, str) and actors_data != "Not available":
-                        actors_list = [actor.strip() for actor in actors_data.split(",") if actor.strip()]
-                    elif isinstance(actors_data, list):
-                        # Handle list of objects or strings
-                        actors_list = []
-                        for actor in actors_data:
-                            if hasattr(actor, 'name'):
-                                actors_list.append(str(actor.name))
-                            elif isinstance(actor, str):
-                                actors_list.append(actor)
-                            else:
-                                actors_list.append(str(actor))
-                    else:
-                        actors_list = []
-                except Exception:
-                    actors_list = []
-
-                # Convert publish_date to string if it's not already
-                publish_date = data.get("publish_date")
-                if publish_date and not isinstance(publish_date, str):
-                    publish_date = str(publish_date)
-
                 # Get the quality setting from consistent_data
                 quality = video_data.consistent_data.get("quality", "Unknown")
 
                 library.add_video_entry(
-                    url=video_url,
+                    url=metadata.url or "",
                     video_id=str(video_id),
                     title=data.get("title", "Unknown"),
-                    author=data.get("author", "Unknown"),
-                    duration=data.get("duration_seconds"),
-                    tags=tags_list,
-                    actors=actors_list,
+                    author=metadata.author,
+                    duration=metadata.duration_seconds,
+                    tags=list(metadata.tags),
+                    actors=list(metadata.actors),
                     file_path=output_path,
-                    thumbnail=data.get("thumbnail"),
-                    publish_date=publish_date,
-                    quality=quality
+                    thumbnail=metadata.thumbnail,
+                    publish_date=metadata.publish_date_text,
+                    quality=quality,
+                    fingerprint=data.get("fingerprint"),
+                    thumbnail_path=get_thumbnail_service().library_path(str(video_id))
                 )
                 self.logger.debug(f"Added video to library: {data.get('title')}")
         except Exception as e:
@@ -2320,25 +2299,29 @@ Unless you use your own ELITE proxy, DO NOT REPORT ANY ERRORS THAT OCCUR WHEN YO
             return
 
         thumbnail = item.data(3, Qt.ItemDataRole.UserRole)
-        if not "http" in thumbnail:
+        if not thumbnail or "http" not in thumbnail:
             self.logger.warning("Thumbnail not available for. This is not an error.")
-            return
-
-        if not thumbnail:
             self._pixmap_item.setPixmap(QPixmap())
             return
 
         try:
-            pixmap = QPixmap()
-            # your custom referer logic…
-            if "hqporner" in thumbnail:
-                shared_functions.core.session.headers["Referer"] = "https://hqporner.com"
-
-            pixmap.loadFromData(shared_functions.core.fetch(thumbnail, get_bytes=True))
-            if "hqporner" in thumbnail:
-                del shared_functions.core.session.headers['Referer']
+            # Never fetch in the UI thread: show the cached image, or fetch it in the background and come back here
+            # when it's there (thumbnail_ready)
+            video_id = item.data(1, Qt.ItemDataRole.UserRole)
+            thumbnails = get_thumbnail_service()
+            path = thumbnails.path(str(video_id))
+            if path is None:
+                future = thumbnails.prefetch(str(video_id), thumbnail)
+                if future is not None:  # Not emitted if the fetch failed, that would retry it forever
+                    future.add_done_callback(lambda done: done.exception() is None and
+                                             self.thumbnail_signals.thumbnail_ready.emit(video_id))
+
+                self._pixmap_item.setPixmap(QPixmap())
+                return
 
-            self.logger.info("Fetched thumbnail!")
+            pixmap = QPixmap()
+            pixmap.load(path)
+            self.logger.info("Loaded thumbnail!")
 
             # 1) stash the full-res copy
             self._full_pixmap = pixmap
@@ -2354,6 +2337,13 @@ Unless you use your own ELITE proxy, DO NOT REPORT ANY ERRORS THAT OCCUR WHEN YO
             self.logger.error("Failed to load thumbnail", exc_info=True)
             self._pixmap_item.setPixmap(QPixmap())
 
+    def thumbnail_ready(self, video_id):
+        """Shows a thumbnail that was fetched in the background, if its video is still selected"""
+        item = self.ui.treeWidget.currentItem()
+        if item is not None and item.data(1, Qt.ItemDataRole.UserRole) == video_id:
+            self.last_thumbnail_change = 0
+            self.set_thumbnail(item)
+
     """
     The following functions are used to connect data between Threads and the Main UI
     """
@@ -2450,7 +2440,8 @@ Unless you use your own ELITE proxy, DO NOT REPORT ANY ERRORS THAT OCCUR WHEN YO
 
         try:
             self.logger.debug("Associating a new client object with a logged in session")
-            shared_functions.ph_client = shared_functions.ph_Client(email=username, password=password, core=shared_functions.core_ph)
+            shared_functions.site_clients.set_client("pornhub", shared_functions.ph_Client(
+                email=username, password=password, core=shared_functions.core_ph))
             self.logger.debug("Login Successful!")
             ui_popup(self.tr("Login Successful!", None))
             switch_login_button_state(self)
@@ -2812,6 +2803,7 @@ def main():
     app.setStyleSheet(load_stylesheet(":/style/stylesheets/stylesheet.qss"))
     w = PornFetch()  # This actually starts Porn Fetch
     w.show()  # This shows the main widget
+    app.aboutToQuit.connect(close_library_manager)  # Writes pending library changes before exiting
 
     """
     The following exceptions are just general exceptions to handle some basic errors. They are not so relevant for
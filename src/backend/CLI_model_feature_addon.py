@@ -1,8 +1,64 @@
 import os
 import json
+import time
+import atexit
+import itertools
+import logging
+import threading
 
-from typing import List
+from bisect import insort
+from typing import Callable, Dict, List, Optional, Tuple, Iterable
+from datetime import datetime
+from collections import deque, Counter
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from tempfile import NamedTemporaryFile
+from base_api.base import setup_logger
+from src.backend.video_keys import detect_site, video_key
+from src.backend.site_clients import loaded_class
+
+if os.name == "nt":
+    import msvcrt
+
+else:
+    import fcntl
+
+logger = setup_logger(name="Porn Fetch - [ModelDatabase]", log_file="PornFetch.log", level=logging.DEBUG)
+
+# Failure reason -> (delay before the first retry in seconds, failed attempts until the video goes to the dead letter
+# list). The delay doubles with every further attempt (at most MAX_RETRY_DELAY).
+RETRY_POLICIES = {
+    "removed": (86400, 2),  # Deleted / disabled, checked once more in case the site had a hiccup
+    "premium": (7 * 86400, 3),
+    "region_blocked": (7 * 86400, 3),
+    "unavailable": (3600, 6),  # CDN issues, pending review, ...
+    "error": (300, 10),  # Anything else (network errors, ...)
+}
+PERMANENT_FAILURES = ("removed", "premium", "region_blocked")  # Not retried within the same run
+MAX_RETRY_DELAY = 30 * 86400
+
+
+# Failure reason -> error classes of the site APIs as (module, class name). They are looked up in the imported modules
+# only, so classifying an error doesn't import the packages of the other sites.
+FAILURE_ERRORS = {
+    "removed": (("phub.errors", "VideoDisabled"), ("eporner_api.modules.errors", "VideoDisabled"),
+                ("xvideos_api.modules.errors", "VideoUnavailable"), ("eporner_api.modules.errors", "NotAvailable")),
+    "premium": (("phub.errors", "PremiumVideo"),),
+    "region_blocked": (("phub.errors", "RegionBlocked"),),
+    "unavailable": (("hqporner_api.modules.errors", "NotAvailable"), ("phub.errors", "VideoPendingReview")),
+}
+
+
+def classify_failure(error: BaseException) -> str:
+    """
+    Map an error of the site APIs to a failure reason (a key of RETRY_POLICIES)
+    """
+    for reason, names in FAILURE_ERRORS.items():
+        classes = tuple(cls for cls in (loaded_class(module, name) for module, name in names) if cls is not None)
+        if isinstance(error, classes):
+            return reason
+
+    return "error"
 
 
 def load_state(path) -> dict:
@@ -33,114 +89,1053 @@ def save_state(state: dict, path):
     dirn = os.path.dirname(os.path.abspath(path)) or '.'
     with NamedTemporaryFile('w', delete=False, dir=dirn) as tmp:
         json.dump(state, tmp, indent=2)
+        tmp.flush()
+        os.fsync(tmp.fileno())
         tmp_path = tmp.name
     os.replace(tmp_path, path)
 
 
-def get_all_saved_models(path: str, state: dict = None) -> List[str]:
+@contextmanager
+def file_lock(path: str):
+    """
+    Exclusive lock between processes (and between instances in one process), held while the with block runs. The
+    lock file is created if needed and never deleted.
+    """
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+
+                except OSError:
+                    continue  # LK_LOCK gives up after 10 seconds, keep waiting
+
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+        try:
+            yield
+
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _file_id(path: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Identity of a file's current version (changes when the file is replaced or rewritten), None if it doesn't exist
+    """
+    try:
+        stat = os.stat(path)
+
+    except FileNotFoundError:
+        return None
+
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class ModelState:
+    """
+    Videos of one model. pending maps the pending URLs to their canonical video keys (a dict keeps the order the URLs
+    were found in).
+
+    watermark: The newest video of the model's listing as of the last crawl ({"video_key", "url", "seen",
+               "publish_date"}, plus "resume_position" if the last crawl broke off), None if the model wasn't crawled
+               yet
+    schedule: When the model is due for the next refresh ({"interval", "next_due", "last_refresh"}, seconds / UNIX
+              timestamps), None if it was never refreshed by the ModelScheduler
+    """
+
+    __slots__ = ("downloaded", "_downloaded_sorted", "pending", "watermark", "schedule")
+
+    def __init__(self, downloaded: Iterable[str] = (), pending: Iterable[str] = (), watermark: Optional[Dict] = None,
+                 schedule: Optional[Dict] = None):
+        self.downloaded = set(downloaded)
+        self._downloaded_sorted = sorted(self.downloaded)  # Kept sorted on every write, to_dict() doesn't sort
+        self.pending = {url: video_key(url) for url in pending if url not in self.downloaded}
+        self.watermark = watermark
+        self.schedule = schedule
+
+    def add_downloaded(self, url: str):
+        if url not in self.downloaded:
+            self.downloaded.add(url)
+            insort(self._downloaded_sorted, url)
+
+    def to_dict(self) -> Dict:
+        data = {"downloaded": list(self._downloaded_sorted), "pending": list(self.pending)}
+        if self.watermark is not None:
+            data["watermark"] = self.watermark
+        if self.schedule is not None:
+            data["schedule"] = self.schedule
+        return data
+
+
+class ModelDatabase:
+    """
+    The model database (model_database.json), kept in memory.
+
+    Changes are appended to a journal next to the database (<path>.journal, one JSON object per line), so recording a
+    download costs O(1) instead of rewriting the whole database. The journal is replayed on load and folded into
+    model_database.json (atomic rewrite) on close() or once it gets long. Use batch() to write many changes at once.
+
+    Several Porn Fetch instances can use the same database (e.g. --daemon and --add-model): appends, compactions and
+    loads hold a file lock (<path>.lock). Every journal line has a sequence number and the database remembers the
+    last one it contains ("journal_seq"). Before an instance writes, it applies the lines other instances appended
+    in the meantime (or reloads the database if another instance compacted it), so a compaction never drops changes
+    of other instances and a replay after a crash between the rewrite and the journal deletion doesn't apply entries
+    twice.
+
+    Videos are deduplicated across models by their canonical video key: a video that one model downloaded counts as
+    downloaded for every model that lists it (now or later), and pending_videos() lists every video only once.
+
+    Failed videos are kept in a negative cache (failures) with their attempts and the next retry time, pending_videos()
+    skips them until then. Once a video failed too often (see RETRY_POLICIES) it's moved to the dead letter list and
+    removed from the pending videos of all models.
+    """
+
+    def __init__(self, path: str, compact_after: int = 1000):
+        """
+        Args:
+            path: Path of model_database.json
+            compact_after: Rewrite the database once the journal has this many entries
+        """
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.lock_path = f"{path}.lock"
+        self.compact_after = compact_after
+        self.models: Dict[str, ModelState] = {}
+        self._pending_index: Dict[str, Dict[str, str]] = {}  # Video key -> {model URL: video URL}
+        self._downloaded_keys: Counter = Counter()  # Video key -> number of models that downloaded it
+        self.failures: Dict[str, Dict] = {}  # Video key -> {"url", "reason", "attempts", "next_retry", "error"}
+        self.dead_letter: Dict[str, Dict] = {}  # Video key -> {"url", "reason", "attempts", "error", "since", "models"}
+        self._lock = threading.RLock()
+        self._buffer: List[Dict] = []  # Changes applied in memory, not written to the journal yet
+        self._batch_depth = 0
+        self._journal_entries = 0
+        self._journal_offset = 0  # Bytes of the journal that are applied already
+        self._seq = 0  # Sequence number of the last applied journal entry
+        self._snapshot_id = None  # _file_id() of model_database.json as of the last load
+        self._data: Dict = {}
+        self.load()
+        atexit.register(self.close)
+
+    def load(self):
+        """
+        (Re)load the database and replay the journal
+        """
+        with self._lock, file_lock(self.lock_path):
+            self._load()
+
+        logger.debug(f"Loaded {len(self.models)} models and {self._journal_entries} journal entries")
+
+    def refresh(self):
+        """
+        Apply the changes other Porn Fetch instances wrote since the last load / write
+        """
+        with self._lock, file_lock(self.lock_path):
+            self._catch_up()
+
+    def _load(self):
+        """
+        Load the database and replay the journal. Must be called while holding _lock and the file lock.
+        """
+        state = load_state(self.path)
+        self._snapshot_id = _file_id(self.path)
+        self._seq = state.get("journal_seq", 0)
+        self._data = {key: value for key, value in state.items()
+                      if key not in ("models", "failures", "dead_letter", "journal_seq")}
+        self.failures = state.get("failures", {})
+        self.dead_letter = state.get("dead_letter", {})
+        self.models = {url: ModelState(data.get("downloaded", ()), data.get("pending", ()), data.get("watermark"),
+                                       data.get("schedule"))
+                       for url, data in state["models"].items()}
+        self._build_indexes()
+
+        self._journal_entries = 0
+        self._journal_offset = 0
+        self._replay_journal()
+
+    def _replay_journal(self):
+        """
+        Apply the journal entries after _journal_offset. Must be called while holding _lock and the file lock.
+        """
+        if not os.path.exists(self.journal_path):
+            return
+
+        complete = self._journal_offset
+        with open(self.journal_path, 'rb') as f:
+            f.seek(complete)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Torn write, see below
+
+                complete += len(line)
+                self._journal_entries += 1
+                try:
+                    entry = json.loads(line)
+
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping an invalid journal entry in: {self.journal_path}")
+                    continue
+
+                seq = entry.pop("seq", None)  # Entries of older versions don't have one
+                if seq is not None:
+                    if seq <= self._seq:
+                        continue  # Already part of model_database.json (crash before the journal was deleted)
+
+                    self._seq = seq
+
+                self._apply(entry)
+
+        self._journal_offset = complete
+        if complete != os.path.getsize(self.journal_path):
+            # Cut off a partially written last entry, otherwise the next append would be glued to it. Appends hold
+            # the file lock, so this is left over from a crash and not another instance that is still writing.
+            os.truncate(self.journal_path, complete)
+            logger.warning(f"Removed an incomplete journal entry from: {self.journal_path}")
+
+    def _catch_up(self):
+        """
+        Apply what other instances wrote since the last load / write. Must be called while holding _lock and the file
+        lock.
+        """
+        journal_size = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        if _file_id(self.path) != self._snapshot_id or journal_size < self._journal_offset:
+            # Compacted by another instance: reload and apply our unwritten changes on top of it again
+            buffered = self._buffer
+            self._load()
+            self._buffer = [entry for entry in buffered if self._apply(entry)]
+
+        elif journal_size > self._journal_offset:
+            self._replay_journal()
+
+    def _build_indexes(self):
+        self._pending_index.clear()
+        self._downloaded_keys.clear()
+        for model in self.models.values():
+            self._downloaded_keys.update(video_key(url) for url in model.downloaded)
+
+        for model_url, model in self.models.items():
+            for url, key in list(model.pending.items()):
+                if key in self._downloaded_keys:
+                    self._mark_downloaded(model_url, model, url)  # Downloaded through another model
+
+                elif key in self.dead_letter:
+                    del model.pending[url]
+
+                else:
+                    self._pending_index.setdefault(key, {})[model_url] = url
+
+    def _unindex_pending(self, model_url: str, key: str):
+        models = self._pending_index.get(key)
+        if models is not None:
+            models.pop(model_url, None)
+            if not models:
+                del self._pending_index[key]
+
+    def _mark_downloaded(self, model_url: str, model: ModelState, url: str):
+        model.add_downloaded(url)
+        key = model.pending.pop(url, None) or video_key(url)
+        self._unindex_pending(model_url, key)
+        self._downloaded_keys[key] += 1
+        self.failures.pop(key, None)
+        self.dead_letter.pop(key, None)
+
+    def _add_pending(self, model_url: str, model: ModelState, url: str, key: str):
+        model.pending[url] = key
+        self._pending_index.setdefault(key, {})[model_url] = url
+
+    def _apply(self, entry: Dict) -> bool:
+        """
+        Apply one change to the in-memory state
+
+        Returns:
+            True if the state changed
+        """
+        op = entry.get("op")
+        model_url = entry.get("model")
+        url = entry.get("url")
+
+        if op == "add_model":
+            if model_url in self.models:
+                return False
+
+            self.models[model_url] = ModelState()
+            return True
+
+        if op == "remove_model":
+            model = self.models.pop(model_url, None)
+            if model is None:
+                return False
+
+            for key in model.pending.values():
+                self._unindex_pending(model_url, key)
+
+            self._downloaded_keys.subtract(video_key(url) for url in model.downloaded)
+            self._downloaded_keys += Counter()  # Drops the keys that reached 0
+            return True
+
+        if op == "downloaded":
+            model = self.models.setdefault(model_url, ModelState())
+            if url in model.downloaded:
+                return False
+
+            key = model.pending.get(url) or video_key(url)
+            self._mark_downloaded(model_url, model, url)
+            # The same video, listed by other models
+            for other_url, other_video_url in list(self._pending_index.get(key, {}).items()):
+                self._mark_downloaded(other_url, self.models[other_url], other_video_url)
+
+            return True
+
+        if op == "pending":
+            model = self.models.setdefault(model_url, ModelState())
+            if url in model.downloaded or url in model.pending:
+                return False
+
+            key = video_key(url)
+            if key in self.dead_letter:
+                return False  # Dead, revive_dead_letter() brings it back
+
+            if key in self._downloaded_keys:
+                self._mark_downloaded(model_url, model, url)  # Another model already downloaded it
+
+            else:
+                self._add_pending(model_url, model, url, key)
+
+            return True
+
+        if op == "failure":
+            self.failures[video_key(url)] = entry["failure"]
+            return True
+
+        if op == "dead":
+            key = video_key(url)
+            failure = self.failures.pop(key, {})
+            models = self._pending_index.pop(key, {})
+            for other_url, other_video_url in models.items():
+                self.models[other_url].pending.pop(other_video_url, None)
+
+            self.dead_letter[key] = {"url": url, "reason": failure.get("reason"), "attempts": failure.get("attempts"),
+                                     "error": failure.get("error"), "since": entry.get("since"), "models": models}
+            return True
+
+        if op == "revive":
+            item = self.dead_letter.pop(video_key(url), None)
+            if item is None:
+                return False
+
+            for other_url, other_video_url in item["models"].items():
+                model = self.models.get(other_url)
+                if model is not None and other_video_url not in model.downloaded:
+                    self._add_pending(other_url, model, other_video_url, video_key(other_video_url))
+
+            return True
+
+        if op in ("watermark", "schedule"):
+            model = self.models.get(model_url)
+            if model is None or getattr(model, op) == entry.get(op):
+                return False
+
+            setattr(model, op, entry.get(op))
+            return True
+
+        return False
+
+    def _change(self, op: str, model_url: str, url: Optional[str] = None, **fields) -> bool:
+        entry = {"op": op, "model": model_url, **fields}
+        if url is not None:
+            entry["url"] = url
+
+        with self._lock:
+            if not self._apply(entry):
+                return False
+
+            self._buffer.append(entry)
+            if self._batch_depth == 0:
+                self.flush()
+
+            return True
+
+    @contextmanager
+    def batch(self):
+        """
+        Collect all changes made inside the with block and write them with a single journal append
+        """
+        with self._lock:
+            self._batch_depth += 1
+
+        try:
+            yield self
+
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self.flush()
+
+    def flush(self):
+        """
+        Append the buffered changes to the journal (compacts the database if the journal got too long)
+        """
+        with self._lock:
+            if not self._buffer:
+                return
+
+            with file_lock(self.lock_path):
+                self._catch_up()
+                if not self._buffer:
+                    return  # Another instance made the same changes
+
+                lines = []
+                for entry in self._buffer:
+                    self._seq += 1
+                    lines.append(json.dumps({"seq": self._seq, **entry}, ensure_ascii=False))
+
+                try:
+                    with open(self.journal_path, 'ab') as f:
+                        f.write(("\n".join(lines) + "\n").encode("utf-8"))
+                        f.flush()
+                        os.fsync(f.fileno())
+                        self._journal_offset = f.tell()
+
+                except IOError as e:
+                    self._seq -= len(lines)
+                    logger.error(f"Error writing model database journal: {e}")
+                    return
+
+                self._journal_entries += len(lines)
+                self._buffer.clear()
+
+            if self._journal_entries >= self.compact_after:
+                self.compact()
+
+    def compact(self):
+        """
+        Rewrite model_database.json with the current state (including what other instances appended to the journal)
+        and delete the journal
+        """
+        with self._lock, file_lock(self.lock_path):
+            self._catch_up()
+            state = dict(self._data, models={url: model.to_dict() for url, model in self.models.items()},
+                         failures=self.failures, dead_letter=self.dead_letter, journal_seq=self._seq)
+            try:
+                save_state(state, path=self.path)
+                if os.path.exists(self.journal_path):
+                    os.remove(self.journal_path)
+
+            except OSError as e:
+                logger.error(f"Error saving model database: {e}")
+                return
+
+            self._snapshot_id = _file_id(self.path)
+            self._journal_offset = 0
+            self._journal_entries = 0
+            self._buffer.clear()  # Part of the new model_database.json
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            if self._journal_entries:
+                self.compact()
+
+    def add_model(self, model_url: str) -> bool:
+        return self._change("add_model", model_url)
+
+    def remove_model(self, model_url: str) -> bool:
+        return self._change("remove_model", model_url)
+
+    def record_download(self, model_url: str, video_url: str) -> bool:
+        """
+        Mark video_url as downloaded for model_url (removes it from pending)
+
+        Returns:
+            False if it was already recorded
+        """
+        return self._change("downloaded", model_url, video_url)
+
+    def add_pending(self, model_url: str, video_urls: Iterable[str]) -> int:
+        """
+        Add video URLs to the pending videos of a model (downloaded and already pending URLs are skipped)
+
+        Returns:
+            Number of new pending URLs
+        """
+        with self.batch():
+            return sum(self._change("pending", model_url, url) for url in video_urls)
+
+    def set_watermark(self, model_url: str, watermark: Optional[Dict]) -> bool:
+        """
+        Remember the newest video of a model's listing (see update_pending_for_all_models())
+        """
+        return self._change("watermark", model_url, watermark=watermark)
+
+    def record_failure(self, model_url: str, video_url: str, reason: str, error: str = "") -> bool:
+        """
+        Remember that a pending video failed. It's skipped until its next retry time, or moved to the dead letter
+        list once it failed too often.
+
+        Args:
+            reason: Failure reason, see classify_failure()
+            error: Error message (kept for the user)
+
+        Returns:
+            True if the video was moved to the dead letter list
+        """
+        first_delay, max_attempts = RETRY_POLICIES.get(reason, RETRY_POLICIES["error"])
+        now = time.time()
+        with self._lock:
+            key = video_key(video_url)
+            attempts = self.failures.get(key, {}).get("attempts", 0) + 1
+            failure = {"url": video_url, "reason": reason, "attempts": attempts,
+                       "next_retry": now + min(first_delay * 2 ** (attempts - 1), MAX_RETRY_DELAY), "error": error[:500]}
+
+            with self.batch():
+                self._change("failure", model_url, video_url, failure=failure)
+                if attempts >= max_attempts:
+                    self._change("dead", model_url, video_url, since=datetime.now().isoformat(timespec="seconds"))
+                    logger.info(f"Moved {video_url} to the dead letter list ({reason}, {attempts} attempts)")
+                    return True
+
+            return False
+
+    def revive_dead_letter(self) -> int:
+        """
+        Put all videos of the dead letter list back into the pending videos of their models
+
+        Returns:
+            Number of revived videos
+        """
+        with self._lock, self.batch():
+            return sum(self._change("revive", None, item["url"]) for item in list(self.dead_letter.values()))
+
+    def set_schedule(self, model_url: str, schedule: Optional[Dict]) -> bool:
+        """
+        Store when the model is due for the next refresh (see ModelScheduler)
+        """
+        return self._change("schedule", model_url, schedule=schedule)
+
+    def get_schedule(self, model_url: str) -> Optional[Dict]:
+        """
+        The refresh schedule of a model (see ModelScheduler), None if it was never refreshed
+        """
+        with self._lock:
+            model = self.models.get(model_url)
+            return dict(model.schedule) if model is not None and model.schedule else None
+
+    def due_models(self, now: float) -> List[str]:
+        """
+        Models whose next refresh is due at `now`, most overdue first (models that were never refreshed come first)
+        """
+        with self._lock:
+            due = [(model.schedule["next_due"] if model.schedule else 0, url) for url, model in self.models.items()
+                   if not model.schedule or model.schedule["next_due"] <= now]
+
+        return [url for _, url in sorted(due)]
+
+    def next_due(self) -> Optional[float]:
+        """
+        Timestamp of the next due refresh (0 if a model was never refreshed), None if no models are tracked
+        """
+        with self._lock:
+            return min((model.schedule["next_due"] if model.schedule else 0 for model in self.models.values()),
+                       default=None)
+
+    def is_video_downloaded(self, model_url: str, video_url: str) -> bool:
+        model = self.models.get(model_url)
+        return model is not None and video_url in model.downloaded
+
+    def get_models(self, model_urls: Optional[Iterable[str]] = None) -> List[Tuple[str, Dict]]:
+        """
+        Snapshot of all models (or the given ones, in that order) as
+        (model URL, {"downloaded": [...], "pending": [...], ...}) tuples
+        """
+        with self._lock:
+            if model_urls is None:
+                return [(url, model.to_dict()) for url, model in self.models.items()]
+
+            return [(url, self.models[url].to_dict()) for url in model_urls if url in self.models]
+
+    def pending_videos(self, model_urls: Optional[Iterable[str]] = None) -> List[Tuple[str, str]]:
+        """
+        Pending videos of all models (or the given ones) as (model URL, video URL), every video only once even if
+        several models list it. Recording the download for one model records it for all of them. Failed videos
+        whose next retry time didn't come yet are left out.
+        """
+        now = time.time()
+        with self._lock:
+            models = self.models.items() if model_urls is None else \
+                [(url, self.models[url]) for url in model_urls if url in self.models]
+
+            seen = set()
+            videos = []
+            for model_url, model in models:
+                for url, key in model.pending.items():
+                    if key in seen:
+                        continue
+
+                    seen.add(key)
+                    failure = self.failures.get(key)
+                    if failure is None or failure["next_retry"] <= now:
+                        videos.append((model_url, url))
+
+            return videos
+
+    def get_pending(self, model_url: str) -> List[str]:
+        with self._lock:
+            model = self.models.get(model_url)
+            return list(model.pending) if model is not None else []
+
+
+class RunCheckpoint:
+    """
+    Checkpoint of an update_models() run: (model, video, stage) transitions, appended to <path> (one JSON array per
+    line). The stages of a video are "downloading" (with the output file) -> "fetched" (the transfer is complete, tags
+    and the library entry aren't written yet) -> "downloaded", or "failed".
+
+    A run that finishes deletes its checkpoint. If a run dies, the next one replays the checkpoint: downloaded videos
+    that didn't reach the model database yet are recorded, videos that were still downloading are restarted first
+    (their incomplete files are removed, otherwise they would be skipped as "existing files") and fetched videos only
+    get their tags / library entry, without downloading them again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.items: Dict[Tuple[str, str], Dict] = {}
+        self._file = None
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    model_url, url, stage, output_file = json.loads(line)
+
+                except (json.JSONDecodeError, ValueError):
+                    continue  # Torn last line of a killed run
+
+                self.items[(model_url, url)] = {"stage": stage, "file": output_file}
+
+        logger.info(f"Resuming an interrupted run with {len(self.items)} checkpointed videos")
+
+    def mark(self, model_url: str, url: str, stage: str, output_file: Optional[str] = None):
+        """
+        Record a stage transition (written and synced right away, so it survives a crash)
+        """
+        line = json.dumps([model_url, url, stage, output_file], ensure_ascii=False)
+        with self._lock:
+            self.items[(model_url, url)] = {"stage": stage, "file": output_file}
+            try:
+                if self._file is None:
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                    if self._file.tell():
+                        self._file.write("\n")  # Don't glue this entry to a torn line
+
+                self._file.write(line + "\n")
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+            except IOError as e:
+                logger.error(f"Error writing checkpoint: {e}")
+
+    def in_stage(self, stage: str) -> List[Tuple[str, str, Optional[str]]]:
+        """
+        (model URL, video URL, output file) of all videos whose last stage is `stage`
+        """
+        return [(model_url, url, item["file"]) for (model_url, url), item in self.items.items() if item["stage"] == stage]
+
+    def finish(self):
+        """
+        The run is complete, delete the checkpoint
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+            self.items.clear()
+            try:
+                os.remove(self.path)
+
+            except FileNotFoundError:
+                pass
+
+
+def resume_checkpoint(database: ModelDatabase, checkpoint: RunCheckpoint) -> List[Tuple[str, str]]:
+    """
+    Apply the checkpoint of an interrupted run
+
+    Returns:
+        (model URL, video URL) of the videos that were in flight, they should be downloaded first (fetched ones keep
+        their file, download_pending_video() only finishes them)
+    """
+    with database.batch():
+        for model_url, url, _ in checkpoint.in_stage("downloaded"):
+            database.record_download(model_url, url)
+
+    in_flight = []
+    for model_url, url, output_file in checkpoint.in_stage("downloading"):
+        if output_file and os.path.isfile(output_file):
+            try:
+                os.remove(output_file)
+                logger.info(f"Removed incomplete download: {output_file}")
+
+            except OSError as e:
+                logger.error(f"Could not remove incomplete download {output_file}: {e}")
+
+        in_flight.append((model_url, url))
+
+    in_flight.extend((model_url, url) for model_url, url, _ in checkpoint.in_stage("fetched"))
+    return in_flight
+
+
+_databases: Dict[str, ModelDatabase] = {}
+_databases_lock = threading.Lock()
+
+
+def get_model_database(path: str) -> ModelDatabase:
+    """
+    Get or create the ModelDatabase of a database file (one instance per path)
+    """
+    key = os.path.abspath(path)
+    with _databases_lock:
+        if key not in _databases:
+            _databases[key] = ModelDatabase(path)
+
+        return _databases[key]
+
+
+def get_all_saved_models(path: str) -> List[Tuple[str, Dict[str, List[str]]]]:
     """
     Return a list of all model URLs currently tracked in the database.
     """
-    state = state or load_state(path)
-    list_of_models = []
-    for model in state.get("models", {}).items():
-        list_of_models.append(model)
+    return get_model_database(path).get_models()
 
-    return list_of_models
 
-def add_model_url(model_url: str, path: str, state: dict = None) -> bool:
+def add_model_url(model_url: str, path: str) -> bool:
     """
     Add a new model URL to the state, initializing its downloaded and pending lists if absent.
     """
-    state = state or load_state(path)
-    models = state.setdefault("models", {})
-    if model_url in models:
+    if not get_model_database(path).add_model(model_url):
         print(f"Model URL already present: {model_url}")
         return False
-    models[model_url] = {"downloaded": [], "pending": []}
-    save_state(state, path=path)
     print(f"Added model URL: {model_url}")
     return True
 
 
-def remove_model_url(model_url: str, path: str, state: dict = None) -> bool:
+def remove_model_url(model_url: str, path: str) -> bool:
     """
     Remove a model URL and its history from the state.
     """
-    state = state or load_state(path)
-    models = state.get("models", {})
-    if model_url not in models:
+    if not get_model_database(path).remove_model(model_url):
         print(f"Model URL not found: {model_url}")
         return False
-    del models[model_url]
-    save_state(state, path=path)
     print(f"Removed model URL: {model_url}")
     return True
 
 
-def is_video_downloaded(model_url: str, video_url: str, path: str, state: dict = None) -> bool:
+def is_video_downloaded(model_url: str, video_url: str, path: str) -> bool:
     """
     Check whether a given video_url has already been downloaded for the specified model.
     """
-    state = state or load_state(path)
-    model_state = state.get("models", {}).get(model_url, {})
-    return video_url in set(model_state.get("downloaded", []))
+    return get_model_database(path).is_video_downloaded(model_url, video_url)
 
 
-def record_download(model_url: str, video_url: str, path: str, state: dict = None) -> bool:
+def record_download(model_url: str, video_url: str, path: str) -> bool:
     """
     Record that a video_url was downloaded for the given model_url.
     Removes it from pending if present.
     """
-    state = state or load_state(path)
-    models = state.setdefault("models", {})
-    model_state = models.setdefault(model_url, {"downloaded": [], "pending": []})
-    downloaded = set(model_state.get("downloaded", []))
-    if video_url in downloaded:
-        return False
-    downloaded.add(video_url)
-    model_state["downloaded"] = list(downloaded)
-    # remove from pending
-    model_state["pending"] = [u for u in model_state.get("pending", []) if u != video_url]
-    save_state(state, path=path)
-    return True
+    return get_model_database(path).record_download(model_url, video_url)
 
-def update_pending_for_all_models(fetch_generator_fn, path: str):
+def _crawl_model(fetch_generator_fn, model_url: str, known: set, watermark: Optional[Dict], lookback: int,
+                 publish_date_fn: Optional[Callable[[object], Optional[datetime]]] = None
+                 ) -> Tuple[List[str], Optional[Dict], int]:
+    """
+    Walk the listing of one model (runs in the worker pool), newest videos first, and stop as early as possible.
+    The generators fetch the listing page by page, so stopping on the first page costs a single request.
+
+    The walk stops `lookback` videos after the watermark (the newest video of the last crawl), or once more than
+    `lookback` known videos came in a row (e.g. the watermark video was deleted). The lookback window catches videos
+    that a site lists out of order. Without a watermark (first crawl), the whole listing up to the known videos is read.
+
+    If the listing breaks off (e.g. a network error on a later page), the URLs found so far are kept and the position
+    is stored in the watermark ("resume_position"): the next crawl doesn't stop before it, even though the videos
+    above it are known by then, and reads on until known videos like the crawl that broke off. The generators don't
+    take a start page, so the position counts videos, not pages.
+
+    Args:
+        known: Canonical keys of the downloaded and pending videos of the model
+        watermark: The model's watermark, None if it wasn't crawled yet
+        publish_date_fn: Returns the publish date of a video (None if unknown). Only called for the newest video if
+                         it isn't the watermark video already. A listing whose newest video is older than the
+                         watermark (stale page / changed sort order) doesn't move the watermark back.
+
+    Returns:
+        (new URLs in the order the site lists them, new watermark, number of videos read)
+    """
+    new_urls = []
+    newest = None
+    crossed = False
+    known_in_a_row = after_watermark = read = 0
+    watermark_key = watermark.get("video_key") if watermark else None
+    resume_position = watermark.get("resume_position", 0) if watermark else 0
+    newest_video = None
+    broke_off = False
+
+    try:
+        for video in fetch_generator_fn(model_url, do_return=True):
+            url = video.url
+            key = video_key(url)
+            read += 1
+            if newest is None:
+                newest = {"video_key": key, "url": url, "seen": datetime.now().isoformat(timespec="seconds")}
+                newest_video = video
+
+            if crossed:
+                after_watermark += 1
+
+            if key == watermark_key:
+                crossed = True
+
+            if key in known:
+                known_in_a_row += 1
+
+            else:
+                known_in_a_row = 0
+                known.add(key)
+                new_urls.append(url)
+
+            if read <= resume_position:
+                # Resuming: the videos up to here were found by the crawl that broke off. The watermark (at the top
+                # of the listing) doesn't stop this crawl, only known videos after the resume position do.
+                if read == resume_position:
+                    known_in_a_row = 0
+
+                continue
+
+            if (not resume_position and crossed and after_watermark >= lookback) or known_in_a_row > lookback:
+                break
+
+    except Exception as e:
+        if not read:
+            raise
+
+        broke_off = True
+        logger.warning(f"The listing of {model_url} broke off after {read} videos, resuming there next time: {e}")
+
+    if newest is None:
+        return new_urls, watermark, read
+
+    if newest["video_key"] == watermark_key:
+        newest["publish_date"] = watermark.get("publish_date")
+
+    else:
+        newest["publish_date"] = _publish_date(publish_date_fn, newest_video)
+        if (watermark and watermark.get("publish_date") and newest["publish_date"]
+                and newest["publish_date"] < watermark["publish_date"]):
+            logger.warning(f"The newest video of {model_url} is older than the watermark, keeping the watermark")
+            newest = dict(watermark)
+            newest.pop("resume_position", None)
+
+    if broke_off:
+        newest["resume_position"] = max(read, resume_position)
+
+    return new_urls, newest, read
+
+
+def _publish_date(publish_date_fn, video) -> Optional[str]:
+    """
+    Publish date of a video for the watermark (ISO format), None if it's unknown or couldn't be fetched
+    """
+    if publish_date_fn is None:
+        return None
+
+    try:
+        publish_date = publish_date_fn(video)
+
+    except Exception as e:
+        logger.warning(f"Could not get the publish date of {video.url}: {e}")
+        return None
+
+    return publish_date.isoformat() if publish_date is not None else None
+
+
+def update_pending_for_all_models(fetch_generator_fn, path: str, workers: int = 8, per_site: int = 2,
+                                  lookback: int = 5, model_urls: Optional[Iterable[str]] = None,
+                                  publish_date_fn: Optional[Callable[[object], Optional[datetime]]] = None
+                                  ) -> Dict[str, Optional[int]]:
     """
     For each model URL in state, fetch the generator via fetch_generator_fn(model_url),
-    iterate videos until a downloaded URL is hit, and add new URLs to pending.
+    iterate videos until the model's watermark (or known videos) is crossed, and add new URLs to pending.
+
+    Models are crawled concurrently: at most `workers` models at once and at most `per_site` models of the same
+    site at once, so no single site gets hammered. The sites take turns, a site with many models doesn't block the
+    others.
+
+    Args:
+        model_urls: Only refresh these models (started in that order), None for all
+        publish_date_fn: Returns the publish date of a video, stored in the watermarks (see _crawl_model())
+
+    Returns:
+        {model URL: number of new pending URLs, None if the crawl failed}
     """
-    state = load_state(path)
-    for model_url, data in state.get("models", {}).items():
-        print(f"Gathering URLs for model: {model_url}")
-        downloaded = set(data.get("downloaded", []))
-        pending = set(data.get("pending", []))
-        try:
-            gen = fetch_generator_fn(model_url, do_return=True)
-            for video in gen:
-                url = video.url
-                if url in downloaded:
-                    # once we hit a known video, older ones are already processed
-                    break
-                if url not in pending:
-                    print(f"  New URL: {url}")
-                    pending.add(url)
-        except Exception as e:
-            print(f"  Error fetching videos for {model_url}: {e}")
-        # update state
-        data["pending"] = list(pending)
-    save_state(state, path=path)
-    print("Pending lists updated.")
+    database = get_model_database(path)
+    results: Dict[str, Optional[int]] = {}
+    queues: Dict[Optional[str], deque] = {}
+    for model_url, data in database.get_models(model_urls):
+        queues.setdefault(detect_site(model_url), deque()).append((model_url, data))
+
+    total = sum(len(models) for models in queues.values())
+    running = dict.fromkeys(queues, 0)
+    workers = max(1, workers)
+    per_site = max(1, per_site)
+    finished = new_urls = failed = 0
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+
+        def submit_next():
+            submitted = True
+            while submitted and len(futures) < workers:
+                submitted = False
+                for site, models in queues.items():
+                    if not models or running[site] >= per_site or len(futures) >= workers:
+                        continue
+
+                    model_url, data = models.popleft()
+                    known = {video_key(url) for url in itertools.chain(data["downloaded"], data["pending"])}
+                    future = executor.submit(_crawl_model, fetch_generator_fn, model_url, known,
+                                             data.get("watermark"), lookback, publish_date_fn)
+                    futures[future] = (site, model_url)
+                    running[site] += 1
+                    submitted = True
+
+        submit_next()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                site, model_url = futures.pop(future)
+                running[site] -= 1
+                finished += 1
+                try:
+                    # Merged here (one thread), the workers only read their own copy of the state
+                    urls, watermark, read = future.result()
+                    with database.batch():
+                        added = database.add_pending(model_url, urls)
+                        database.set_watermark(model_url, watermark)
+                    new_urls += added
+                    results[model_url] = added
+                    status = f"{added} new URLs ({read} videos read)"
+
+                except Exception as e:
+                    failed += 1
+                    results[model_url] = None
+                    status = f"Error: {e}"
+                    logger.error(f"Error fetching videos for {model_url}: {e}")
+
+                print(f"[{finished}/{total}] {model_url}: {status} ({len(futures)} running)")
+
+            submit_next()
+
+    database.compact()
+    print(f"Pending lists updated: {new_urls} new URLs from {total} models ({failed} failed) "
+          f"in {time.perf_counter() - start:.1f} seconds.")
+    return results
+
+
+class ModelScheduler:
+    """
+    Decides which models are due for a refresh. The schedule is stored per model in the ModelDatabase.
+
+    The refresh interval of a model follows its upload frequency: after a refresh that found new videos, the interval
+    moves halfway towards the observed time per new video. A refresh without new videos doubles the interval
+    (exponential backoff for inactive models). Intervals stay between min_interval and max_interval.
+    """
+
+    def __init__(self, database: ModelDatabase, min_interval: float = 3600, max_interval: float = 7 * 86400):
+        """
+        Args:
+            database: The ModelDatabase holding the models
+            min_interval: Shortest refresh interval in seconds (also used for new models and after errors)
+            max_interval: Longest refresh interval in seconds
+        """
+        self.database = database
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+
+    def due_models(self, now: Optional[float] = None) -> List[str]:
+        """
+        Models that are due, most overdue first (models that were never refreshed come first)
+        """
+        return self.database.due_models(time.time() if now is None else now)
+
+    def next_due(self) -> Optional[float]:
+        """
+        Timestamp of the next due refresh, None if no models are tracked
+        """
+        return self.database.next_due()
+
+    def record_refresh(self, model_url: str, new_videos: Optional[int], now: Optional[float] = None) -> Dict:
+        """
+        Compute the next due time of a model after a refresh
+
+        Args:
+            new_videos: Number of new videos the refresh found, None if it failed
+
+        Returns:
+            The new schedule of the model
+        """
+        now = time.time() if now is None else now
+        schedule = self.database.get_schedule(model_url) or {}
+        interval = schedule.get("interval", self.min_interval)
+        last_refresh = schedule.get("last_refresh")
+
+        if new_videos is None or last_refresh is None:
+            interval = self.min_interval  # Errors are retried soon, the first refresh has nothing to compare with
+
+        elif new_videos > 0:
+            interval = (interval + (now - last_refresh) / new_videos) / 2
+
+        else:
+            interval *= 2
+
+        interval = min(max(interval, self.min_interval), self.max_interval)
+        schedule = {"interval": round(interval), "next_due": now + interval,
+                    "last_refresh": last_refresh if new_videos is None else now}
+        self.database.set_schedule(model_url, schedule)
+        return schedule
+
+    def record_refreshes(self, results: Dict[str, Optional[int]]):
+        """
+        record_refresh() for all results of update_pending_for_all_models(), written as one batch
+        """
+        now = time.time()
+        with self.database.batch():
+            for model_url, new_videos in results.items():
+                self.record_refresh(model_url, new_videos, now=now)
 
 
-def show_stats(path: str, state: dict = None):
+def show_stats(path: str):
     """
     Print statistics: number of models tracked, pending and downloaded counts per model.
     """
-    state = state or load_state(path)
-    models = state.get("models", {})
+    database = get_model_database(path)
+    models = database.get_models()
     print(f"Total models tracked: {len(models)}")
-    for url, data in models.items():
+    print(f"Failed videos waiting for a retry: {len(database.failures)}, dead letter list: {len(database.dead_letter)}")
+    for url, data in models:
         dcount = len(data.get("downloaded", []))
         pcount = len(data.get("pending", []))
         print(f" - {url}: {dcount} downloaded, {pcount} pending")
@@ -6,10 +6,14 @@ each other.
 """
 
 # config.py
+import os
 from configparser import ConfigParser
 
 shared_config = ConfigParser()
 shared_config.read("config.ini")
+# Relative paths of data files in the configuration are resolved against the directory of config.ini (the working
+# directory at start, a later os.chdir() doesn't move them)
+config_directory = os.path.dirname(os.path.abspath("config.ini"))
 __license__ = "GPL 3"
 __version__ = "3.6"
 __build__ = "desktop"  # android or desktop
@@ -0,0 +1,221 @@
+"""
+Shared HTTP transport for Porn Fetch
+
+Every BaseCore (one per site, plus the common core for thumbnails / update checks) used to open its own connections,
+so the same host was connected to (TCP + TLS handshake) again by every component. The cores now keep their own
+httpx.Client (headers and cookies stay isolated per site), but all of them send their requests through one
+PooledTransport, which keeps a keep-alive pool per host (optionally with HTTP/2).
+
+httpx is optional (base_api 2.x depends on it, 3.x doesn't). Without it the cores keep the sessions base_api builds.
+
+The transport counts requests, new connections and TLS handshakes per host (see connection_stats()), so the reuse
+of warm connections can be measured.
+"""
+
+import atexit
+import logging
+import threading
+from importlib import metadata
+from typing import Dict, Optional, Tuple
+
+from base_api.base import setup_logger
+from src.backend.config import shared_config
+
+try:
+    import httpx
+
+except ImportError:
+    httpx = None
+
+logger = setup_logger(name="Porn Fetch - [HTTP Pool]", log_file="PornFetch.log", level=logging.DEBUG)
+
+STAT_FIELDS = ("requests", "connections", "tls_handshakes")
+
+
+class ConnectionStats:
+    """Thread-safe counters per host"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict[str, int]] = {}
+
+    def add(self, host: str, field: str):
+        with self._lock:
+            counters = self._hosts.get(host)
+            if counters is None:
+                counters = self._hosts[host] = dict.fromkeys(STAT_FIELDS, 0)
+
+            counters[field] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns:
+            {host: {"requests", "connections", "tls_handshakes", "reused"}}, "reused" is the number of requests that
+            were sent over an already open connection
+        """
+        with self._lock:
+            return {host: dict(counters, reused=max(0, counters["requests"] - counters["connections"]))
+                    for host, counters in self._hosts.items()}
+
+    def reset(self):
+        with self._lock:
+            self._hosts.clear()
+
+
+class PooledTransport(httpx.BaseTransport if httpx is not None else object):
+    """httpx transport with keep-alive pools per host that counts connection reuse. Shared by many httpx.Clients."""
+
+    def __init__(self, proxy: Optional[str] = None, verify=True, http2: bool = False, max_connections: int = 100,
+                 max_keepalive_connections: int = 20, keepalive_expiry: float = 30.0,
+                 stats: Optional[ConnectionStats] = None):
+        """
+        Args:
+            proxy: Proxy URL for all connections (None for direct connections)
+            verify: SSL verification, as for httpx (True, False or an SSLContext)
+            http2: Negotiate HTTP/2 where the server supports it (needs the h2 package)
+            max_connections: Open connections over all hosts
+            max_keepalive_connections: Idle connections kept open for reuse
+            keepalive_expiry: Seconds an idle connection is kept open
+            stats: Counters to update (a new ConnectionStats if None)
+        """
+        if httpx is None:
+            raise ImportError("The shared HTTP transport needs the httpx package")
+
+        if http2:
+            try:
+                import h2  # noqa: F401
+
+            except ImportError:
+                logger.warning("HTTP/2 is enabled, but the h2 package isn't installed. Using HTTP/1.1.")
+                http2 = False
+
+        self.stats = stats or ConnectionStats()
+        self._transport = httpx.HTTPTransport(
+            verify=verify, http2=http2, proxy=proxy,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections,
+                                keepalive_expiry=keepalive_expiry))
+
+    def handle_request(self, request: "httpx.Request") -> "httpx.Response":
+        host = request.url.host
+        self.stats.add(host, "requests")
+        trace = request.extensions.get("trace")
+
+        def count_connections(event_name, info):
+            # httpcore trace events, "connection.*" events only happen for new connections
+            if event_name == "connection.connect_tcp.complete":
+                self.stats.add(host, "connections")
+
+            elif event_name == "connection.start_tls.complete":
+                self.stats.add(host, "tls_handshakes")
+
+            if trace is not None:
+                trace(event_name, info)
+
+        request.extensions["trace"] = count_connections
+        return self._transport.handle_request(request)
+
+    def close(self):
+        self._transport.close()
+
+
+_transports: Dict[Tuple, PooledTransport] = {}
+_transports_lock = threading.Lock()
+_stats = ConnectionStats()
+
+
+def get_transport(config) -> PooledTransport:
+    """
+    The shared transport for a base_api configuration. Cores with the same proxy / SSL settings share one transport,
+    a different proxy gets a transport (and connections) of its own.
+    """
+    proxy = getattr(config, "proxy", None) or None
+    verify_ssl = getattr(config, "verify_ssl", True)
+    http2 = shared_config.getboolean("Performance", "http2", fallback=False)
+    key = (proxy, verify_ssl, http2)
+    with _transports_lock:
+        transport = _transports.get(key)
+        if transport is None:
+            transport = _transports[key] = PooledTransport(
+                proxy=proxy, verify=verify_ssl, http2=http2, stats=_stats,
+                max_connections=shared_config.getint("Performance", "connection_pool_size", fallback=100))
+            logger.debug(f"New HTTP transport (proxy: {bool(proxy)}, verify SSL: {verify_ssl}, HTTP/2: {http2})")
+
+        return transport
+
+
+def base_api_version() -> str:
+    try:
+        return metadata.version("eaf_base_api")
+
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def attach_shared_transport(core) -> bool:
+    """
+    Let a BaseCore send its requests through the shared transport. The core keeps its own client, headers and cookies.
+
+    This works with the httpx sessions of base_api 2.x. BaseCore.initialize_session() builds a new session when the
+    core is first used and again after some errors (e.g. HTTP 429), so it's wrapped to attach the transport to every
+    new session as well. base_api 3.x uses curl_cffi sessions, their cores keep their own connections (logged as a
+    warning once).
+
+    Returns:
+        False if the core's session doesn't use httpx
+    """
+    initialize_session = getattr(core, "initialize_session", None)
+    if initialize_session is not None and not getattr(initialize_session, "attaches_shared_transport", False):
+        def initialize_shared_session(*args, **kwargs):
+            result = initialize_session(*args, **kwargs)
+            _replace_session(core)
+            return result
+
+        initialize_shared_session.attaches_shared_transport = True
+        core.initialize_session = initialize_shared_session
+
+    if getattr(core, "session", None) is None:
+        return initialize_session is not None  # Attached when the session is built
+
+    return _replace_session(core)
+
+
+_warned_session_types = set()
+
+
+def _replace_session(core) -> bool:
+    session = core.session
+    if httpx is None or not isinstance(session, httpx.Client):
+        session_type = type(session).__name__
+        if session_type not in _warned_session_types:
+            _warned_session_types.add(session_type)
+            logger.warning(f"base_api {base_api_version()} uses {session_type} sessions, the shared HTTP transport "
+                           f"only supports httpx (base_api 2.x, httpx installed: {httpx is not None}). Every site keeps "
+                           f"its own connections.")
+        return False
+
+    if isinstance(getattr(session, "_transport", None), PooledTransport):
+        return True
+
+    core.session = httpx.Client(transport=get_transport(core.config), headers=session.headers,
+                                cookies=session.cookies, timeout=session.timeout,
+                                follow_redirects=session.follow_redirects)
+    session.close()
+    return True
+
+
+def connection_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Connection counters per host of all shared transports (see ConnectionStats.snapshot())
+    """
+    return _stats.snapshot()
+
+
+def log_connection_stats():
+    stats = connection_stats()
+    requests = sum(counters["requests"] for counters in stats.values())
+    reused = sum(counters["reused"] for counters in stats.values())
+    if requests:
+        logger.info(f"HTTP: {requests} requests to {len(stats)} hosts, {reused} over reused connections")
+
+
+atexit.register(log_connection_stats)
@@ -0,0 +1,365 @@
+"""
+Content fingerprints for the Porn Fetch library.
+
+A fingerprint is a BLAKE2b digest computed in fixed-size chunks (the file is never held in memory). For MP4 files only
+the media data (the "mdat" boxes) is hashed, so writing the metadata tags doesn't change the fingerprint, other files
+are hashed as a whole. Fingerprints are cached in an SQLite database next to the library, keyed by (device, inode,
+size, mtime), so an unchanged file is never hashed twice. The library indexes entries by fingerprint, which finds the
+same video downloaded from another URL / site. Exact duplicates can optionally be replaced by a hard link to the first
+copy.
+"""
+
+import os
+import struct
+import sqlite3
+import hashlib
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import BinaryIO, Dict, List, Optional, Tuple, Iterable
+from base_api.base import setup_logger
+
+logger = setup_logger(name="Porn Fetch - [Library Fingerprint]", log_file="PornFetch.log", level=logging.DEBUG)
+
+CHUNK_SIZE = 1024 * 1024
+DIGEST_SIZE = 16
+CACHE_VERSION = 1  # Bumped whenever the way fingerprints are computed changes, the cache is emptied then
+
+# (device, inode, size, mtime_ns). Any change of the file (or a different file at the same path) changes the key.
+StatKey = Tuple[int, int, int, int]
+
+
+def stat_key(path: str) -> StatKey:
+    stat = os.stat(path)
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def media_ranges(file: BinaryIO) -> Optional[List[Tuple[int, int]]]:
+    """
+    Find the media data of an MP4 file by walking its top level boxes
+
+    Returns:
+        (offset, length) of the payload of every "mdat" box, None if the file isn't a (complete) MP4 file
+    """
+    file_size = os.fstat(file.fileno()).st_size
+    ranges = []
+    offset = 0
+    while offset < file_size:
+        file.seek(offset)
+        header = file.read(8)
+        if len(header) < 8:
+            return None
+
+        size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:  # 64-bit size after the type
+            large_size = file.read(8)
+            if len(large_size) < 8:
+                return None
+
+            size, = struct.unpack(">Q", large_size)
+            header_size = 16
+
+        elif size == 0:  # The box extends to the end of the file
+            size = file_size - offset
+
+        if (offset == 0 and box_type != b"ftyp") or size < header_size or offset + size > file_size:
+            return None
+
+        if box_type == b"mdat":
+            ranges.append((offset + header_size, size - header_size))
+
+        offset += size
+
+    return ranges or None
+
+
+def fingerprint_file(path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    """
+    Hash a file in chunks (reuses one buffer, so memory usage doesn't depend on the file size). Only the media data of
+    MP4 files is hashed, see media_ranges().
+
+    Returns:
+        "blake2b:<hex digest>"
+    """
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        ranges = media_ranges(f) or [(0, None)]
+        for offset, remaining in ranges:
+            f.seek(offset)
+            while remaining is None or remaining > 0:
+                read = f.readinto(view if remaining is None or remaining >= chunk_size else view[:remaining])
+                if not read:
+                    break
+
+                digest.update(view[:read])
+                if remaining is not None:
+                    remaining -= read
+
+    return f"blake2b:{digest.hexdigest()}"
+
+
+def _fingerprint_job(path: str) -> Tuple[str, Optional[StatKey], Optional[str]]:
+    """
+    Runs in the worker processes: (path, stat key before hashing, fingerprint), (path, None, None) on errors
+    """
+    try:
+        key = stat_key(path)
+        return path, key, fingerprint_file(path)
+
+    except OSError:
+        return path, None, None
+
+
+class FingerprintCache:
+    """SQLite cache: (device, inode, size, mtime_ns) -> fingerprint"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS fingerprints (device INTEGER, inode INTEGER, "
+                                "size INTEGER, mtime_ns INTEGER, fingerprint TEXT NOT NULL, "
+                                "PRIMARY KEY (device, inode))")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] < CACHE_VERSION:
+            self.connection.execute("DELETE FROM fingerprints")
+            self.connection.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+
+        self.connection.commit()
+
+    def get(self, key: StatKey) -> Optional[str]:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT fingerprint FROM fingerprints WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ?",
+                key).fetchone()
+            return row[0] if row else None
+
+    def put_many(self, items: Iterable[Tuple[StatKey, str]]):
+        with self._lock:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO fingerprints (device, inode, size, mtime_ns, fingerprint) "
+                    "VALUES (?, ?, ?, ?, ?)", [(*key, fingerprint) for key, fingerprint in items])
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+class Fingerprinter:
+    """Computes (cached) fingerprints of single files or whole libraries"""
+
+    def __init__(self, cache_path: str, workers: Optional[int] = None):
+        """
+        Args:
+            cache_path: Path of the SQLite fingerprint cache
+            workers: Number of processes for fingerprint_many() (default: number of CPUs)
+        """
+        self.cache = FingerprintCache(cache_path)
+        self.workers = workers
+
+    def fingerprint(self, path: str) -> Optional[str]:
+        """
+        Fingerprint of one file (hashed in the calling thread, e.g. right after a download)
+
+        Returns:
+            The fingerprint, None if the file can't be read
+        """
+        return self.fingerprint_many([path], parallel=False).get(path)
+
+    def fingerprint_many(self, paths: Iterable[str], parallel: bool = True) -> Dict[str, str]:
+        """
+        Fingerprints of many files. Cached files aren't read at all, the others are hashed in a process pool.
+
+        Returns:
+            {path: fingerprint} for every readable file
+        """
+        results: Dict[str, str] = {}
+        uncached: List[str] = []
+        for path in dict.fromkeys(paths):
+            try:
+                fingerprint = self.cache.get(stat_key(path))
+
+            except OSError:
+                continue  # Missing file
+
+            if fingerprint is not None:
+                results[path] = fingerprint
+
+            else:
+                uncached.append(path)
+
+        if not uncached:
+            return results
+
+        if parallel and len(uncached) > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                    jobs = list(executor.map(_fingerprint_job, uncached, chunksize=4))
+
+            except (OSError, NotImplementedError, RuntimeError) as e:
+                # No multiprocessing (e.g., Android / some frozen builds). hashlib releases the GIL, threads work too.
+                logger.warning(f"Process pool not available, hashing in threads instead: {e}")
+                with ThreadPoolExecutor(max_workers=self.workers or os.cpu_count()) as executor:
+                    jobs = list(executor.map(_fingerprint_job, uncached))
+
+        else:
+            jobs = [_fingerprint_job(path) for path in uncached]
+
+        new_entries = []
+        for path, key, fingerprint in jobs:
+            if fingerprint is None:
+                continue
+
+            results[path] = fingerprint
+            new_entries.append((key, fingerprint))
+
+        self.cache.put_many(new_entries)
+        logger.debug(f"Fingerprinted {len(new_entries)} files ({len(results) - len(new_entries)} cached)")
+        return results
+
+    def close(self):
+        self.cache.close()
+
+
+def hardlink_duplicate(original: str, duplicate: str, fingerprint: str, cache: FingerprintCache) -> bool:
+    """
+    Replace duplicate with a hard link to original. Only done if both are on the same file system and are still
+    exactly the files that were fingerprinted: their current (device, inode, size, mtime_ns) must be cached with
+    the given fingerprint, a file that changed since it was hashed is never replaced.
+
+    Args:
+        original: The copy to keep
+        duplicate: The copy to replace
+        fingerprint: Fingerprint both files had when they were compared
+        cache: Cache the fingerprints were stored in
+
+    Returns:
+        True if the duplicate is a hard link to the original now
+    """
+    try:
+        original_stat = os.stat(original)
+        duplicate_stat = os.stat(duplicate)
+        if (original_stat.st_dev, original_stat.st_ino) == (duplicate_stat.st_dev, duplicate_stat.st_ino):
+            return True  # Already linked
+
+        if original_stat.st_dev != duplicate_stat.st_dev:
+            return False
+
+        for path, stat in ((original, original_stat), (duplicate, duplicate_stat)):
+            if cache.get((stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)) != fingerprint:
+                logger.warning(f"Not hard linking {duplicate} to {original}: {path} changed since it was fingerprinted")
+                return False
+
+        tmp_path = f"{duplicate}.link-tmp"
+        os.link(original, tmp_path)
+        os.replace(tmp_path, duplicate)  # Atomic, the duplicate path never disappears
+        logger.info(f"Replaced duplicate {duplicate} with a hard link to {original}")
+        return True
+
+    except OSError as e:
+        logger.warning(f"Could not hard link {duplicate} to {original}: {e}")
+        return False
+
+
+_fingerprinter_instance = None
+_fingerprinter_lock = threading.Lock()
+
+def get_fingerprinter(library_path: str) -> Fingerprinter:
+    """
+    Get or create the global Fingerprinter, its cache lives next to the library (<library>.fingerprints.db)
+    """
+    global _fingerprinter_instance
+    with _fingerprinter_lock:
+        if _fingerprinter_instance is None:
+            _fingerprinter_instance = Fingerprinter(os.path.splitext(library_path)[0] + ".fingerprints.db")
+
+        return _fingerprinter_instance
+
+
+def fingerprint_download(library, path: str,
+                         hardlink: bool = False) -> Tuple[Optional[str], Optional[Dict], bool]:
+    """
+    Post-download stage: fingerprint a downloaded file and look for a library entry with the same content. Runs
+    before the tags are written, a file that was replaced by a hard link must not be tagged anymore (that would
+    change the tags of the existing copy).
+
+    Args:
+        library: LibraryManager instance
+        path: Path of the downloaded file
+        hardlink: Replace the new file with a hard link to the existing copy if there is one
+
+    Returns:
+        (fingerprint, library entry with the same content or None, whether the file is a hard link to it now)
+    """
+    fingerprinter = get_fingerprinter(library.library_path)
+    fingerprint = fingerprinter.fingerprint(path)
+    if fingerprint is None:
+        return None, None, False
+
+    for duplicate in library.find_by_fingerprint(fingerprint):
+        original = duplicate.get("file_path")
+        if not original or os.path.abspath(original) == os.path.abspath(path) or not os.path.isfile(original):
+            continue
+
+        # The fingerprint in the library is from the time the copy was downloaded, check the file as it is now
+        if fingerprinter.fingerprint(original) != fingerprint:
+            continue
+
+        logger.warning(f"{path} has the same content as {original} (library entry: {duplicate.get('video_id')})")
+        linked = hardlink and hardlink_duplicate(original, path, fingerprint, fingerprinter.cache)
+        return fingerprint, duplicate, linked
+
+    return fingerprint, None, False
+
+
+def fingerprint_library(library, hardlink: bool = False) -> Dict:
+    """
+    Fingerprint all downloaded files of the library (process pool, cached) and report exact duplicates
+
+    Args:
+        library: LibraryManager instance
+        hardlink: Replace every duplicate file with a hard link to the oldest copy
+
+    Returns:
+        Report with the duplicate groups
+    """
+    videos = [video for video in library.get_all_videos() if video.get("file_path")]
+    fingerprinter = get_fingerprinter(library.library_path)
+    fingerprints = fingerprinter.fingerprint_many(video["file_path"] for video in videos)
+
+    updates = {}
+    groups: Dict[str, List[Dict]] = {}
+    for video in videos:
+        fingerprint = fingerprints.get(video["file_path"])
+        if fingerprint is None:
+            continue
+
+        if fingerprint != video.get("fingerprint"):
+            updates[video["video_id"]] = {"fingerprint": fingerprint}
+
+        groups.setdefault(fingerprint, []).append(video)
+
+    updated = library.update_video_entries(updates) if updates else 0
+
+    duplicates = []
+    linked = 0
+    for fingerprint, group in groups.items():
+        paths = list(dict.fromkeys(os.path.abspath(video["file_path"]) for video in group))
+        if len(paths) < 2:
+            continue
+
+        duplicates.append({"fingerprint": fingerprint, "files": paths,
+                           "video_ids": [video["video_id"] for video in group]})
+        if hardlink:
+            linked += sum(hardlink_duplicate(paths[0], path, fingerprint, fingerprinter.cache) for path in paths[1:])
+
+    return {
+        "fingerprinted_files": len(fingerprints),
+        "updated_entries": updated,
+        "duplicates": duplicates,
+        "hardlinked_files": linked,
+    }
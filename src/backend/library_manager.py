@@ -1,55 +1,175 @@
 """
 Library Manager for Porn Fetch
 Manages a JSON library to track downloaded videos and prevent duplicates
+(see library_storage.py for how the library is stored on disk and library_records.py for what is kept in memory)
 """
 
-import json
 import os
+import json
+import time
+import atexit
 import logging
+import threading
+from bisect import insort
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple, Iterable, Callable, TypeVar
 from base_api.base import setup_logger
+from src.backend.config import shared_config
+from src.backend.library_search import SearchIndex
+from src.backend.library_stats import LibraryStats
+from src.backend.video_keys import video_key
+from src.backend.library_records import VideoRecord
+from src.backend.library_storage import (JSONLibraryStore, SQLiteLibraryStore, LibraryChangedError, is_sqlite_path,
+                                         write_library_json_atomic)
 
 logger = setup_logger(name="Porn Fetch - [Library Manager]", log_file="PornFetch.log", level=logging.DEBUG)
 
+T = TypeVar("T")
+
+# Fields that identify a library entry. update_video_entries() never changes them, so an update in the journal can
+# be matched to its entry again (there can be several entries with the same video ID).
+IDENTITY_FIELDS = ("url", "video_id", "download_date")
+
 
 class LibraryManager:
     """Manages the video library JSON file for tracking downloads"""
 
-    def __init__(self, library_path: str = None):
+    def __init__(self, library_path: str = None, flush_interval: float = 0.5, flush_batch_size: int = 50):
         """
         Initialize the library manager
 
         Args:
-            library_path: Path to library.json file. If None, uses current directory
+            library_path: Path to library.json file. If None, uses current directory.
+                          Paths ending with .db / .sqlite / .sqlite3 use the SQLite backend instead.
+            flush_interval: Seconds the background writer waits to collect more changes before writing them
+            flush_batch_size: Number of pending changes that makes the background writer write immediately
         """
         if library_path:
             self.library_path = library_path
         else:
             self.library_path = os.path.join(os.getcwd(), "library.json")
 
+        # Both backends write every mutation on its own (journal line / row), so we don't rewrite the whole library
+        # per download
+        if is_sqlite_path(self.library_path):
+            self._store = SQLiteLibraryStore(self.library_path)
+
+        else:
+            self._store = JSONLibraryStore(self.library_path)
+
+        # All reads / writes of the in-memory library happen under _lock. Mutations only queue their changes in
+        # _pending, a single background writer thread writes them to disk in batches. _commit_lock makes sure that
+        # the batches reach the storage backend in order, even when flush() is called from another thread.
+        self._lock = threading.RLock()
+        self._commit_lock = threading.Lock()
+        self._pending_changed = threading.Condition(self._lock)
+        self._pending: List[Tuple[str, Optional[int], Optional[Dict]]] = []
+        self._closing = False
+        self._compaction_requested = False
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+
+        # In-memory indexes, keyed by the value we look up and mapping to the internal document IDs of all entries
+        # carrying that value (in insertion order). They are rebuilt on load and kept in sync on add / remove / clear,
+        # so that duplicate checks don't need to walk the whole library for every download.
+        # _videos only holds compact records, full entries are read from disk on demand (see _rehydrate()).
+        self._videos: Dict[int, VideoRecord] = {}
+        self._next_doc_id = 0
+        self._url_index: Dict[str, List[int]] = {}
+        self._id_index: Dict[str, List[int]] = {}
+        self._title_index: Dict[str, List[int]] = {}
+        self._fingerprint_index: Dict[str, List[int]] = {}  # Content fingerprints, see library_fingerprint.py
+        self._search_index: Optional[SearchIndex] = None  # Full-text index, built on the first search
+        # Running totals and facet counts for get_library_stats() / get_facet(), built on first use
+        self._stats: Optional[LibraryStats] = None
+
         self.library_data = self.load_library()
 
+        self._writer_thread = threading.Thread(target=self._writer_loop, name="LibraryWriter", daemon=True)
+        self._writer_thread.start()
+
+        # Write pending changes and fold the journal into library.json when Porn Fetch exits, so that other tools
+        # (upload_to_r2.py) see an up-to-date library.json
+        atexit.register(self.close)
+
     def load_library(self) -> Dict[str, Any]:
         """
-        Load the library from JSON file or create new if doesn't exist
+        Load the library from disk (snapshot + journal) or create new if doesn't exist. The entries are streamed
+        into the indexes one by one, the raw library is never held in memory as a whole.
 
         Returns:
-            Dictionary containing library data
-        """
-        if os.path.exists(self.library_path):
-            try:
-                with open(self.library_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    logger.debug(f"Loaded library with {len(data.get('videos', []))} videos")
-                    return data
-            except (json.JSONDecodeError, IOError) as e:
-                logger.error(f"Error loading library: {e}")
-                return self._create_empty_library()
-        else:
-            logger.debug("Library file doesn't exist, creating new one")
-            return self._create_empty_library()
+            Dictionary containing the top level library fields (version, ...)
+        """
+        with self._lock:
+            self._build_indexes()
+            data = self._store.load(self._apply_loaded)
+            logger.debug(f"Built library indexes for {len(self._videos)} videos")
+            return data
+
+    def _apply_loaded(self, operation: str, video: Optional[Dict], location: Optional[int]):
+        """
+        Apply one mutation streamed by the storage backend while loading (see ApplyCallback in library_storage.py)
+        """
+        if operation == "add":
+            self._index_video(video, location)
+
+        elif operation == "remove":
+            doc_ids = self._id_index.get(video.get("video_id"))
+            if doc_ids:
+                self._unindex_video(doc_ids[0])
+
+        elif operation == "update":
+            doc_ids = self._id_index.get(video.get("video_id"))
+            if doc_ids:
+                doc_id = next((doc_id for doc_id in doc_ids if all(
+                    self._videos[doc_id].get(field) == video.get(field) for field in IDENTITY_FIELDS)), doc_ids[0])
+                self._update_video(doc_id, video)
+
+        elif operation == "clear":
+            self._build_indexes()
+
+    def _reload(self):
+        """
+        Load the library again after library.json was changed by another program (e.g. reformatted by
+        upload_to_r2.py), the byte offsets of the entries point to the wrong places then. Changes that weren't
+        written yet are applied again on top. Must be called while holding _commit_lock and _lock.
+        """
+        logger.warning(f"The library file was changed by another program, loading it again: {self.library_path}")
+        self.library_data = self.load_library()
+        for operation, _, video in self._pending:
+            self._apply_loaded(operation, video, None)
+
+    def _reload_if_changed(self, force: bool = False):
+        """
+        Load the library again if library.json was changed by another program since it was loaded / saved
+
+        Args:
+            force: Load it again even if the file looks unchanged (an entry couldn't be read at its offset)
+        """
+        if not force and not self._store.snapshot_changed():
+            return
+
+        with self._commit_lock, self._lock:
+            if force or self._store.snapshot_changed():
+                self._reload()
+
+    def _read(self, query: Callable[[], T]) -> T:
+        """
+        Run query() while holding _lock, after loading the library again if library.json was changed by another
+        program. Must not be called while holding _lock.
+        """
+        self._reload_if_changed()
+        try:
+            with self._lock:
+                return query()
+
+        except LibraryChangedError as e:
+            # Changed while the query ran, or rewritten without changing size and modification time
+            logger.warning(str(e))
+            self._reload_if_changed(force=True)
+            with self._lock:
+                return query()
 
     def _create_empty_library(self) -> Dict[str, Any]:
         """
@@ -63,23 +183,296 @@ class LibraryManager:
             "videos": []
         }
 
+    def _build_indexes(self, videos: Iterable[Dict] = ()):
+        """
+        (Re)build the internal document store and all lookup indexes from the given video entries
+
+        Args:
+            videos: Video entries, kept in memory until the next save_library()
+        """
+        self._videos.clear()
+        self._url_index.clear()
+        self._id_index.clear()
+        self._title_index.clear()
+        self._fingerprint_index.clear()
+        self._search_index = None
+        self._stats = None
+        self._next_doc_id = 0
+
+        # The document store is the source of truth for the entries, library_data only keeps the top level fields
+        # (version, ...). The "videos" list is materialized again (entry by entry) whenever the library gets saved.
+        for video in videos:
+            self._index_video(video)
+
+    def _index_keys(self, video: VideoRecord) -> List[Tuple[Dict[str, List[int]], str]]:
+        """
+        Return the (index, key) pairs a video entry is stored under.
+
+        Besides its stored video_id, an entry of an older version (random / hash() based ID) is also indexed under the
+        canonical key of its URL, so it's found by check_duplicate(video_id=...) as well. Stored IDs that are canonical
+        keys already ("<site>:<ID>") are used as they are, video_key() would only compute the same key again.
+        """
+        keys = []
+        url = video.url
+        if url:
+            keys.append((self._url_index, url))
+
+        video_id = video.video_id
+        if video_id:
+            keys.append((self._id_index, video_id))
+
+        if url and (not isinstance(video_id, str) or ":" not in video_id):
+            canonical_key = video_key(url)
+            if canonical_key != video_id:
+                keys.append((self._id_index, canonical_key))
+
+        if video.title:
+            keys.append((self._title_index, video.title))
+
+        if video.fingerprint:
+            keys.append((self._fingerprint_index, video.fingerprint))
+
+        return keys
+
+    def _index_video(self, video: Dict, location: Optional[int] = None, doc_id: Optional[int] = None) -> int:
+        """
+        Add a video entry to the document store and all indexes
+
+        Args:
+            video: Video entry to add
+            location: Where the storage backend can read the entry again. If None, the entry is kept in memory.
+            doc_id: Existing document ID to store the entry under (updates, see _update_video()). New ID if None.
+
+        Returns:
+            Internal document ID of the entry
+        """
+        if doc_id is None:
+            doc_id = self._next_doc_id
+            self._next_doc_id += 1
+            add_key = lambda doc_ids: doc_ids.append(doc_id)
+
+        else:
+            add_key = lambda doc_ids: insort(doc_ids, doc_id)  # Keeps the oldest entry first
+
+        video = self._videos[doc_id] = VideoRecord(video, location)
+
+        for index, key in self._index_keys(video):
+            add_key(index.setdefault(key, []))
+
+        if self._search_index is not None:
+            self._search_index.add(doc_id, video)
+
+        if self._stats is not None:
+            self._stats.add(video)
+
+        return doc_id
+
+    def _unindex_video(self, doc_id: int, keep_position: bool = False) -> Optional[VideoRecord]:
+        """
+        Remove a video entry from the document store and all indexes
+
+        Args:
+            doc_id: Internal document ID of the entry
+            keep_position: Only remove it from the indexes, the caller stores a new version under the same doc_id
+
+        Returns:
+            The record of the removed entry, or None if the ID is unknown
+        """
+        video = self._videos.get(doc_id) if keep_position else self._videos.pop(doc_id, None)
+        if video is None:
+            return None
+
+        for index, key in self._index_keys(video):
+            doc_ids = index.get(key)
+            if doc_ids is None:
+                continue
+
+            doc_ids.remove(doc_id)
+            if not doc_ids:
+                del index[key]
+
+        if self._search_index is not None:
+            self._search_index.remove(doc_id, video)
+
+        if self._stats is not None:
+            self._stats.remove(video)
+
+        return video
+
+    def _update_video(self, doc_id: int, video: Dict):
+        """
+        Replace the entry stored under doc_id, keeping its position in the library
+        """
+        self._unindex_video(doc_id, keep_position=True)
+        self._index_video(video, doc_id=doc_id)
+
+    def _lookup(self, index: Dict[str, List[int]], key: Optional[str]) -> Optional[int]:
+        """
+        Return the document ID of the first (oldest) video entry stored under key in the given index
+        """
+        if not key:
+            return None
+
+        with self._lock:
+            doc_ids = index.get(key)
+            return doc_ids[0] if doc_ids else None
+
+    def _rehydrate(self, doc_ids: Iterable[int]) -> List[Dict]:
+        """
+        Return the full video entries of the given documents. Must be called while holding _lock.
+
+        Entries kept in memory are returned directly, all others are read from disk in one go.
+        """
+        records = [self._videos[doc_id] for doc_id in doc_ids]
+        stored = self._store.read_entries(record.location for record in records if record.details is None)
+        return [record.details if record.details is not None else next(stored) for record in records]
+
+    def _iter_entries(self, records: List[VideoRecord]) -> Iterable[Dict]:
+        """
+        Yield the full entries of the given records one by one (used to write snapshots without loading everything)
+        """
+        stored = self._store.read_entries(record.location for record in records if record.details is None)
+        for record in records:
+            yield record.details if record.details is not None else next(stored)
+
+    def _enqueue(self, operations: List[Tuple[str, Optional[int], Optional[Dict]]]):
+        """
+        Queue library mutations for the background writer. Must be called while holding _lock.
+
+        Args:
+            operations: List of (operation, doc_id, video) tuples, see JSONLibraryStore.commit()
+        """
+        self._pending.extend(operations)
+        self._pending_changed.notify()
+
+    def _writer_loop(self):
+        """
+        Background writer: collects mutations for flush_interval seconds (or until flush_batch_size are pending)
+        and writes them to the storage backend in one go. Compacts the journal when it gets too long.
+        """
+        while True:
+            with self._pending_changed:
+                while not self._pending and not self._compaction_requested and not self._closing:
+                    self._pending_changed.wait()
+
+                if self._closing:
+                    return  # close() writes everything that is left
+
+                self._compaction_requested = False
+
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.flush_batch_size and not self._closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+
+                    self._pending_changed.wait(remaining)
+
+            if not self.flush():
+                time.sleep(self.flush_interval)  # Don't spin on a full / read-only disk
+
+            if getattr(self._store, "needs_compaction", False):
+                self.save_library()
+
+                with self._lock:
+                    self._compaction_requested = False
+
+    def flush(self) -> bool:
+        """
+        Write all pending library changes to disk now (blocks until they are written)
+
+        Returns:
+            True if successful, False otherwise
+        """
+        with self._commit_lock:
+            with self._lock:
+                operations, self._pending = self._pending, []
+
+            if not operations:
+                return True
+
+            if self._store.commit(operations):
+                logger.debug(f"Wrote {len(operations)} library changes")
+                if getattr(self._store, "needs_compaction", False):
+                    # Compaction always happens on the writer thread, even if flush() was called from somewhere else
+                    with self._pending_changed:
+                        self._compaction_requested = True
+                        self._pending_changed.notify()
+
+                return True
+
+            # Keep them for the next try
+            with self._lock:
+                self._pending[:0] = operations
+
+            return False
+
     def save_library(self) -> bool:
         """
-        Save the library to JSON file
+        Save the whole library to disk (compacts the journal of the JSON backend)
 
         Returns:
             True if successful, False otherwise
         """
-        try:
-            with open(self.library_path, 'w', encoding='utf-8') as f:
-                json.dump(self.library_data, f, indent=2, ensure_ascii=False)
-            logger.debug(f"Saved library with {len(self.library_data['videos'])} videos")
+        with self._commit_lock:
+            for attempt in range(2):
+                with self._lock:
+                    # Pending changes are part of the snapshot, so they don't need to be written separately
+                    pending, self._pending = self._pending, []
+                    data = dict(self.library_data)
+                    doc_ids = list(self._videos.keys())
+                    records = list(self._videos.values())
+
+                # Records are never changed in place and only moved (see below) while holding _commit_lock, so the
+                # entries can be read and written without blocking the library in the meantime
+                try:
+                    staged = self._store.stage_snapshot(data, self._iter_entries(records))
+                    break
+
+                except LibraryChangedError as e:
+                    logger.warning(str(e))
+                    with self._lock:
+                        self._pending[:0] = pending
+                        if attempt:
+                            return False
+
+                        self._reload()
+
+            if staged is None:
+                return False
+
+            with self._lock:
+                locations = self._store.install_snapshot(staged, doc_ids)
+                if locations is None:
+                    return False
+
+                # The entries can be read from the new snapshot now, no need to keep them in memory
+                for record, location in zip(records, locations):
+                    record.move_to(location)
+
             return True
-        except IOError as e:
-            logger.error(f"Error saving library: {e}")
-            return False
 
-    def check_duplicate(self, url: str = None, video_id: str = None, title: str = None) -> Optional[Dict]:
+    def close(self):
+        """
+        Stop the background writer, write all pending changes to disk (compacting the journal) and close the
+        storage backend
+        """
+        with self._pending_changed:
+            if self._closing:
+                return
+
+            self._closing = True
+            self._pending_changed.notify_all()
+
+        self._writer_thread.join()
+        self.flush()
+        if getattr(self._store, "journal_entries", 0):
+            self.save_library()
+
+        self._store.close()
+
+    def check_duplicate(self, url: str = None, video_id: str = None, title: str = None,
+                        fingerprint: str = None) -> Optional[Dict]:
         """
         Check if a video already exists in the library
 
@@ -87,26 +480,50 @@ class LibraryManager:
             url: Video URL to check
             video_id: Video ID to check
             title: Video title to check (less reliable)
+            fingerprint: Content fingerprint of a downloaded file (same video from another URL / site)
 
         Returns:
             Video entry if duplicate found, None otherwise
         """
-        for video in self.library_data.get("videos", []):
-            # Check by URL (most reliable)
-            if url and video.get("url") == url:
-                logger.debug(f"Found duplicate by URL: {url}")
-                return video
+        def query():
+            doc_id = self._find_duplicate(url=url, video_id=video_id, title=title, fingerprint=fingerprint)
+            return None if doc_id is None else self._rehydrate([doc_id])[0]
 
-            # Check by video ID
-            if video_id and video.get("video_id") == video_id:
-                logger.debug(f"Found duplicate by ID: {video_id}")
-                return video
+        return self._read(query)
 
-            # Check by exact title match (least reliable, optional)
-            if title and video.get("title") == title:
-                logger.debug(f"Found potential duplicate by title: {title}")
-                # Return video but caller should confirm this is actually a duplicate
-                return video
+    def _find_duplicate(self, url: str = None, video_id: str = None, title: str = None,
+                        fingerprint: str = None) -> Optional[int]:
+        """
+        check_duplicate() without reading the entry from disk
+
+        Returns:
+            Document ID of the duplicate, None if there is none
+        """
+        # Check by URL (most reliable)
+        doc_id = self._lookup(self._url_index, url)
+        if doc_id is not None:
+            logger.debug(f"Found duplicate by URL: {url}")
+            return doc_id
+
+        # Check by video ID and by the canonical key of the URL (catches mirrors, locale subdomains, query strings ...)
+        for key in dict.fromkeys((video_id, video_key(url) if url else None)):
+            doc_id = self._lookup(self._id_index, key)
+            if doc_id is not None:
+                logger.debug(f"Found duplicate by ID: {key}")
+                return doc_id
+
+        # Check by content (exact same file)
+        doc_id = self._lookup(self._fingerprint_index, fingerprint)
+        if doc_id is not None:
+            logger.debug(f"Found duplicate by fingerprint: {fingerprint}")
+            return doc_id
+
+        # Check by exact title match (least reliable, optional)
+        doc_id = self._lookup(self._title_index, title)
+        if doc_id is not None:
+            logger.debug(f"Found potential duplicate by title: {title}")
+            # Return video but caller should confirm this is actually a duplicate
+            return doc_id
 
         return None
 
@@ -121,7 +538,9 @@ class LibraryManager:
                        file_path: str = None,
                        thumbnail: str = None,
                        publish_date: str = None,
-                       quality: str = None) -> bool:
+                       quality: str = None,
+                       fingerprint: str = None,
+                       thumbnail_path: str = None) -> bool:
         """
         Add a new video entry to the library
 
@@ -137,15 +556,12 @@ class LibraryManager:
             thumbnail: Thumbnail URL
             publish_date: Video publish date
             quality: Video quality (e.g., "720", "1080", "best", "worst")
+            fingerprint: Content fingerprint of the downloaded file (see library_fingerprint.py)
+            thumbnail_path: Local copy of the thumbnail in the thumbnail cache (see thumbnail_cache.py)
 
         Returns:
             True if added successfully, False otherwise
         """
-        # Check for duplicates first
-        if self.check_duplicate(url=url, video_id=video_id):
-            logger.warning(f"Video already exists in library: {title}")
-            return False
-
         # Create video entry
         video_entry = {
             "url": url,
@@ -161,13 +577,25 @@ class LibraryManager:
             "thumbnail": thumbnail,
             "publish_date": publish_date
         }
+        if fingerprint:
+            video_entry["fingerprint"] = fingerprint
 
-        # Add to library
-        self.library_data["videos"].append(video_entry)
-        logger.debug(f"Added video to library: {title}")
+        if thumbnail_path:
+            video_entry["thumbnail_path"] = thumbnail_path
 
-        # Auto-save
-        return self.save_library()
+        with self._lock:
+            # Check for duplicates first
+            if self._find_duplicate(url=url, video_id=video_id) is not None:
+                logger.warning(f"Video already exists in library: {title}")
+                return False
+
+            # Add to library
+            doc_id = self._index_video(video_entry)
+            logger.debug(f"Added video to library: {title}")
+
+            # Written to disk by the background writer
+            self._enqueue([("add", doc_id, video_entry)])
+            return True
 
     def remove_video_entry(self, video_id: str) -> bool:
         """
@@ -179,14 +607,54 @@ class LibraryManager:
         Returns:
             True if removed, False if not found
         """
-        videos = self.library_data.get("videos", [])
-        for i, video in enumerate(videos):
-            if video.get("video_id") == video_id:
-                del videos[i]
-                self.save_library()
-                logger.debug(f"Removed video from library: {video_id}")
-                return True
-        return False
+        with self._lock:
+            doc_ids = self._id_index.get(video_id) if video_id else None
+            if not doc_ids:
+                return False
+
+            doc_id = doc_ids[0]
+            record = self._unindex_video(doc_id)
+            self._enqueue([("remove", doc_id, {"video_id": record.video_id})])
+
+        logger.debug(f"Removed video from library: {video_id}")
+        return True
+
+    def update_video_entries(self, updates: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Change fields of several library entries at once. All changes are written to disk together (one journal
+        append / one SQLite transaction).
+
+        Args:
+            updates: Maps video IDs to the fields to set (e.g. {"pornhub:ph123": {"file_path": "/new/path.mp4"}})
+
+        Returns:
+            Number of updated entries
+        """
+        def update() -> List[Tuple[str, Optional[int], Optional[Dict]]]:
+            # Every entry with the video ID (the same video can be in the library more than once)
+            targets = [(doc_id, fields) for video_id, fields in updates.items()
+                       for doc_id in self._id_index.get(video_id, ())]
+
+            operations = []
+            for (doc_id, fields), video in zip(targets, self._rehydrate([doc_id for doc_id, _ in targets])):
+                # The identity fields are kept, so the update is found by them on replay (see _apply_loaded())
+                video = {**video, **fields, **{field: video[field] for field in IDENTITY_FIELDS if field in video}}
+                video["video_id"] = self._videos[doc_id].video_id
+                self._update_video(doc_id, video)
+                operations.append(("update", doc_id, video))
+
+            if operations:
+                self._enqueue(operations)
+
+            return operations
+
+        operations = self._read(update)
+
+        if operations:
+            self.flush()
+            logger.debug(f"Updated {len(operations)} library entries")
+
+        return len(operations)
 
     def get_all_videos(self) -> List[Dict]:
         """
@@ -195,7 +663,19 @@ class LibraryManager:
         Returns:
             List of all video entries
         """
-        return self.library_data.get("videos", [])
+        return self._read(lambda: self._rehydrate(self._videos.keys()))
+
+    def find_by_fingerprint(self, fingerprint: str) -> List[Dict]:
+        """
+        Get all videos with the given content fingerprint (oldest first)
+
+        Args:
+            fingerprint: Content fingerprint (see library_fingerprint.py)
+
+        Returns:
+            List of video entries
+        """
+        return self._read(lambda: self._rehydrate(self._fingerprint_index.get(fingerprint, [])))
 
     def get_video_by_id(self, video_id: str) -> Optional[Dict]:
         """
@@ -207,10 +687,11 @@ class LibraryManager:
         Returns:
             Video entry if found, None otherwise
         """
-        for video in self.library_data.get("videos", []):
-            if video.get("video_id") == video_id:
-                return video
-        return None
+        def query():
+            doc_id = self._lookup(self._id_index, video_id)
+            return None if doc_id is None else self._rehydrate([doc_id])[0]
+
+        return self._read(query)
 
     def get_library_stats(self) -> Dict[str, Any]:
         """
@@ -219,16 +700,44 @@ class LibraryManager:
         Returns:
             Dictionary with library statistics
         """
-        videos = self.library_data.get("videos", [])
-        total_duration = sum(v.get("duration", 0) for v in videos if v.get("duration"))
+        with self._lock:
+            stats = self._get_stats()
+            total_duration = stats.total_duration
+
+            return {
+                "total_videos": stats.count,
+                "total_duration_seconds": total_duration,
+                "total_duration_hours": round(total_duration / 3600, 2) if total_duration else 0,
+                "unique_authors": len(stats.facets["authors"]),
+                "unique_tags": len(stats.facets["tags"]),
+                "unique_actors": len(stats.facets["actors"]),
+                "sites": dict(stats.facet("sites")),
+                "library_path": self.library_path
+            }
+
+    def get_facet(self, name: str, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        Get the values of a facet with the number of videos for each of them
 
-        return {
-            "total_videos": len(videos),
-            "total_duration_seconds": total_duration,
-            "total_duration_hours": round(total_duration / 3600, 2) if total_duration else 0,
-            "unique_authors": len(set(v.get("author") for v in videos if v.get("author"))),
-            "library_path": self.library_path
-        }
+        Args:
+            name: "authors", "tags", "actors", "sites" or "download_months" (histogram of the download dates)
+            limit: Only return the top values (the latest months for download_months). None for all
+
+        Returns:
+            List of (value, number of videos), most common first (chronological for download_months)
+        """
+        with self._lock:
+            return self._get_stats().facet(name, limit=limit)
+
+    def _get_stats(self) -> LibraryStats:
+        """
+        The library statistics, counted in one pass on the first call and kept up to date on add / remove afterwards
+        (loading doesn't pay for them). Must be called while holding _lock.
+        """
+        if self._stats is None:
+            self._stats = LibraryStats.build(self._videos.values())
+
+        return self._stats
 
     def clear_library(self) -> bool:
         """
@@ -237,46 +746,80 @@ class LibraryManager:
         Returns:
             True if cleared successfully
         """
-        self.library_data = self._create_empty_library()
-        return self.save_library()
+        with self._lock:
+            self.library_data = self._create_empty_library()
+            self._build_indexes(self.library_data.pop("videos"))
+            self._enqueue([("clear", None, None)])
+            return True
 
-    def search_videos(self, query: str) -> List[Dict]:
+    def search_videos(self, query: str, page: int = 1, per_page: Optional[int] = None) -> List[Dict]:
         """
-        Search videos in library by title, author, or tags
+        Search videos in library by title, author, tags or actors
+
+        Words are combined with AND, "OR" combines groups of words and every word also matches as a prefix
+        (e.g., "amateur pov OR outdoor"). See library_search.py for details.
 
         Args:
             query: Search query string
+            page: Page number (starting at 1), only used together with per_page
+            per_page: Number of results per page. If None, all results are returned
 
         Returns:
-            List of matching video entries
+            List of matching video entries, best match first
         """
-        query_lower = query.lower()
-        results = []
+        offset = (max(page, 1) - 1) * per_page if per_page else 0
 
-        for video in self.library_data.get("videos", []):
-            # Check title
-            if query_lower in video.get("title", "").lower():
-                results.append(video)
-                continue
+        def search():
+            if self._search_index is None:
+                # Built once on the first search (so startup doesn't pay for it), then kept up to date on add / remove
+                self._search_index = SearchIndex()
+                for doc_id, video in self._videos.items():
+                    self._search_index.add(doc_id, video)
 
-            # Check author
-            if query_lower in video.get("author", "").lower():
-                results.append(video)
-                continue
+            results = self._search_index.search(query, limit=per_page, offset=offset)
+            return self._rehydrate([doc_id for doc_id, _ in results])
 
-            # Check tags
-            for tag in video.get("tags", []):
-                if query_lower in tag.lower():
-                    results.append(video)
-                    break
+        return self._read(search)
 
-            # Check actors
-            for actor in video.get("actors", []):
-                if query_lower in actor.lower():
-                    results.append(video)
-                    break
+    def import_json(self, json_path: str) -> int:
+        """
+        Replace the library content with the videos of a library.json file (one-shot migration to SQLite)
 
-        return results
+        Args:
+            json_path: Path to the library.json file
+
+        Returns:
+            Number of imported videos
+        """
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        data.pop("journal_seq", None)
+        with self._lock:
+            self._build_indexes(data.pop("videos", []))
+            self.library_data = data
+            if not self.save_library():
+                raise IOError(f"Could not write imported library to: {self.library_path}")
+
+        logger.info(f"Imported {len(self._videos)} videos from {json_path}")
+        return len(self._videos)
+
+    def export_json(self, json_path: str) -> int:
+        """
+        Export the library in the library.json format (for upload_to_r2.py and older tools)
+
+        Args:
+            json_path: Path of the JSON file to write
+
+        Returns:
+            Number of exported videos
+        """
+        with self._lock:
+            offsets = write_library_json_atomic(self.library_data, self._iter_entries(list(self._videos.values())),
+                                                json_path)
+
+        logger.info(f"Exported {len(offsets)} videos to {json_path}")
+        return len(offsets)
 
 
 # Global instance for easy access
@@ -287,12 +830,21 @@ def get_library_manager(library_path: str = None) -> LibraryManager:
     Get or create a global LibraryManager instance
 
     Args:
-        library_path: Path to library file
+        library_path: Path to library file. If None, the "library_path" setting of the configuration file is used
 
     Returns:
         LibraryManager instance
     """
     global _library_instance
     if _library_instance is None:
+        library_path = library_path or shared_config.get("Video", "library_path", fallback=None)
         _library_instance = LibraryManager(library_path)
-    return _library_instance
\ No newline at end of file
+    return _library_instance
+
+
+def close_library_manager():
+    """
+    Close the global LibraryManager if it was created (doesn't load the library just to close it)
+    """
+    if _library_instance is not None:
+        _library_instance.close()
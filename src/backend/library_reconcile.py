@@ -0,0 +1,246 @@
+"""
+Reconciles the Porn Fetch library with the files on disk.
+
+The output directories are walked with os.scandir in a thread pool (every directory is one task, its subdirectories
+are submitted as new tasks). Files are matched to library entries by their path; entries whose file is gone are
+matched to unreferenced files by (size, mtime) - or by file name if that is unique - to detect moved files.
+
+The scan is incremental: the listing of every directory is cached next to the library together with the directory
+mtime. Directories whose mtime didn't change are not listed again (only stat()ed to find changed subdirectories).
+Note that changing a file in place doesn't change the mtime of its directory, the cached size of such a file is only
+refreshed once something else in the directory changes.
+"""
+
+import os
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from tempfile import NamedTemporaryFile
+from typing import Dict, List, Optional, Tuple, Any, Iterable
+from base_api.base import setup_logger
+
+logger = setup_logger(name="Porn Fetch - [Library Reconcile]", log_file="PornFetch.log", level=logging.DEBUG)
+
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".webm", ".ts", ".mov", ".m4v", ".avi", ".flv")
+SCAN_CACHE_VERSION = 1
+
+# A file as seen by the scanner: (size in bytes, mtime in whole seconds). Whole seconds, because copying a file to
+# another file system (shutil.move) doesn't always keep the sub-second part of the mtime.
+FileStat = Tuple[int, int]
+
+
+def normalize_path(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _scan_directory(path: str, cached: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, Any], bool]:
+    """
+    List one directory (runs in the thread pool)
+
+    Returns:
+        (path, listing, rescanned). listing = {"mtime_ns", "files": {name: [size, mtime]}, "subdirs": [names]}
+    """
+    mtime_ns = os.stat(path).st_mtime_ns
+    if cached is not None and cached.get("mtime_ns") == mtime_ns:
+        return path, cached, False
+
+    files = {}
+    subdirs = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+
+                elif entry.name.lower().endswith(VIDEO_EXTENSIONS) and entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = [stat.st_size, int(stat.st_mtime)]
+
+            except OSError:
+                continue  # Vanished while we were looking at it
+
+    return path, {"mtime_ns": mtime_ns, "files": files, "subdirs": subdirs}, True
+
+
+class LibraryScanner:
+    """Walks the output directories and compares them with the library"""
+
+    def __init__(self, library, cache_path: Optional[str] = None, workers: int = 16):
+        """
+        Args:
+            library: LibraryManager instance
+            cache_path: Where the directory listings are cached. Defaults to <library>.scan.json
+            workers: Number of threads that list directories / stat files
+        """
+        self.library = library
+        self.cache_path = cache_path or os.path.splitext(library.library_path)[0] + ".scan.json"
+        self.workers = workers
+
+    def _load_cache(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+
+            if cache.get("version") == SCAN_CACHE_VERSION:
+                return cache.get("directories", {})
+
+        except (IOError, ValueError):
+            pass
+
+        return {}
+
+    def _save_cache(self, directories: Dict[str, Dict[str, Any]]):
+        dirn = os.path.dirname(os.path.abspath(self.cache_path)) or '.'
+        try:
+            with NamedTemporaryFile('w', delete=False, dir=dirn, encoding='utf-8') as tmp:
+                # dumps() instead of dump(): only dumps() uses the C encoder, the cache can have 100k+ files
+                tmp.write(json.dumps({"version": SCAN_CACHE_VERSION, "directories": directories}))
+                tmp_path = tmp.name
+            os.replace(tmp_path, self.cache_path)
+
+        except IOError as e:
+            logger.error(f"Could not write scan cache: {e}")
+
+    def scan(self, roots: Iterable[str]) -> Tuple[Dict[str, FileStat], Dict[str, int]]:
+        """
+        Walk the given directories (recursively, in parallel)
+
+        Returns:
+            ({file path: (size, mtime)}, counters)
+        """
+        cache = self._load_cache()
+        directories: Dict[str, Dict[str, Any]] = {}
+        files: Dict[str, FileStat] = {}
+        rescanned = 0
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+            seen = set()
+            for root in roots:
+                root = os.path.abspath(root)
+                if os.path.isdir(root) and root not in seen:
+                    seen.add(root)
+                    pending.add(executor.submit(_scan_directory, root, cache.get(root)))
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        path, listing, was_rescanned = future.result()
+
+                    except OSError as e:
+                        logger.warning(f"Could not scan directory: {e}")
+                        continue
+
+                    directories[path] = listing
+                    rescanned += was_rescanned
+                    for name, (size, mtime) in listing["files"].items():
+                        files[os.path.join(path, name)] = (size, mtime)
+
+                    for name in listing["subdirs"]:
+                        subdir = os.path.join(path, name)
+                        if subdir not in seen:
+                            seen.add(subdir)
+                            pending.add(executor.submit(_scan_directory, subdir, cache.get(subdir)))
+
+        self._save_cache(directories)
+        return files, {"directories": len(directories), "rescanned_directories": rescanned, "files": len(files)}
+
+    def _stat_files(self, paths: List[str]) -> Dict[str, FileStat]:
+        """
+        stat() files outside of the scanned directories (in parallel)
+        """
+        def stat(path: str) -> Optional[FileStat]:
+            try:
+                result = os.stat(path)
+                return result.st_size, int(result.st_mtime)
+
+            except OSError:
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return {path: result for path, result in zip(paths, executor.map(stat, paths)) if result is not None}
+
+    def reconcile(self, roots: Iterable[str], apply: bool = True) -> Dict[str, Any]:
+        """
+        Compare the library with the files on disk
+
+        Args:
+            roots: Output directories to walk
+            apply: Write the results to the library (moved files, file sizes / mtimes) in one batch
+
+        Returns:
+            Report with the missing, orphan and moved files
+        """
+        start = time.perf_counter()
+        roots = [os.path.abspath(root) for root in roots]
+        scanned, counters = self.scan(roots)
+        files = {normalize_path(path): stat for path, stat in scanned.items()}
+        real_paths = {normalize_path(path): path for path in scanned}
+        root_prefixes = tuple(normalize_path(root) + os.sep for root in roots)
+
+        videos = [video for video in self.library.get_all_videos() if video.get("file_path")]
+        outside = [video["file_path"] for video in videos if not normalize_path(video["file_path"]).startswith(root_prefixes)]
+        outside_stats = {normalize_path(path): stat for path, stat in self._stat_files(outside).items()}
+
+        updates: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        referenced = set()
+        for video in videos:
+            path = normalize_path(video["file_path"])
+            stat = files.get(path) or outside_stats.get(path)
+            if stat is None:
+                missing.append(video)
+                continue
+
+            referenced.add(path)
+            if (video.get("file_size"), video.get("file_mtime")) != stat:
+                updates[video["video_id"]] = {"file_size": stat[0], "file_mtime": stat[1]}
+
+        orphans = {path: stat for path, stat in files.items() if path not in referenced}
+        by_stat: Dict[FileStat, List[str]] = {}
+        by_name: Dict[str, List[str]] = {}
+        for path, stat in orphans.items():
+            by_stat.setdefault(stat, []).append(path)
+            by_name.setdefault(os.path.basename(path), []).append(path)  # Both normalized (normcase)
+
+        moved = []
+        still_missing = []
+        for video in missing:
+            candidates = by_stat.get((video.get("file_size"), video.get("file_mtime")), [])
+            if len(candidates) != 1:
+                candidates = by_name.get(os.path.normcase(os.path.basename(video["file_path"])), [])
+
+            candidates = [path for path in candidates if path in orphans]  # Not claimed by another entry yet
+            if len(candidates) != 1:
+                still_missing.append(video["file_path"])
+                continue
+
+            new_path = real_paths[candidates[0]]
+            size, mtime = orphans.pop(candidates[0])
+            moved.append({"video_id": video["video_id"], "from": video["file_path"], "to": new_path})
+            updates[video["video_id"]] = {"file_path": new_path, "file_size": size, "file_mtime": mtime}
+
+        updated = self.library.update_video_entries(updates) if apply and updates else 0
+        report = {
+            **counters,
+            "library_videos": len(videos),
+            "missing": still_missing,
+            "orphans": sorted(real_paths[path] for path in orphans),
+            "moved": moved,
+            "updated_entries": updated,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+        logger.info(f"Reconciled library: {len(still_missing)} missing, {len(orphans)} orphan and {len(moved)} moved "
+                    f"files ({counters['files']} files in {counters['directories']} directories, "
+                    f"{counters['rescanned_directories']} rescanned)")
+        return report
+
+
+def reconcile_library(library, roots: Iterable[str], apply: bool = True, workers: int = 16) -> Dict[str, Any]:
+    """
+    Shortcut for LibraryScanner(library, workers=workers).reconcile(roots, apply)
+    """
+    return LibraryScanner(library, workers=workers).reconcile(roots, apply=apply)
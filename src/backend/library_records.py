@@ -0,0 +1,74 @@
+"""
+Compact in-memory records for library entries.
+
+The LibraryManager doesn't keep every library entry as a full dictionary. A VideoRecord only holds the fields that
+the indexes, the search and the statistics need (author, tag and actor names are interned, so every distinct name
+exists only once). Everything else (thumbnail and file paths, cloudflare_url, ...) stays on disk and is read again
+("rehydrated") through the storage backend when someone asks for the full entry.
+"""
+
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+# Fields kept in memory, in the order of library.json entries
+RECORD_FIELDS = ("url", "video_id", "title", "author", "duration", "tags", "actors", "download_date", "fingerprint")
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _intern_names(values) -> Tuple:
+    if not values:
+        return ()
+
+    try:
+        return tuple(map(sys.intern, values))
+
+    except TypeError:  # Not only strings
+        return tuple(_intern(value) for value in values)
+
+
+class VideoRecord:
+    """
+    Index fields of one library entry.
+
+    location: Where the storage backend can read the full entry again (byte offset in library.json, row ID in
+              SQLite), None if the entry isn't on disk in a readable form yet.
+    details: The full entry while it is kept in memory (new entries that aren't part of a snapshot yet), else None.
+    """
+
+    __slots__ = RECORD_FIELDS + ("location", "details")
+
+    def __init__(self, video: Dict, location: Optional[int] = None):
+        self.url = video.get("url")
+        self.video_id = video.get("video_id")
+        self.title = video.get("title")
+        self.author = _intern(video.get("author"))
+        self.duration = video.get("duration")
+        self.tags = _intern_names(video.get("tags"))
+        self.actors = _intern_names(video.get("actors"))
+        self.download_date = video.get("download_date")
+        self.fingerprint = video.get("fingerprint")
+        self.location = location
+        self.details = video if location is None else None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Dictionary-like access to the fields kept in memory (used by the indexes and the search)
+        """
+        if key in RECORD_FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+
+        if self.details is not None:
+            return self.details.get(key, default)
+
+        return default
+
+    def move_to(self, location: int):
+        """
+        The entry was written to disk at location, so the full entry doesn't need to be kept in memory anymore
+        """
+        self.location = location
+        self.details = None
@@ -0,0 +1,173 @@
+"""
+Full-text search index for the Porn Fetch library.
+
+Every video is split into lowercase word tokens (title, author, tags, actors). The index maps each token to the
+documents containing it together with a weight, so a query only touches the documents that actually match instead
+of scanning the whole library.
+
+Query syntax:
+  - Words are combined with AND:           "amateur pov"
+  - Groups are combined with OR:           "amateur pov OR outdoor"
+  - The last word of a group also matches as a prefix (search as you type): "amateur foot" matches
+    "amateur footjob", exact matches rank higher
+"""
+
+import re
+import heapq
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple, Iterable
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# How much a token counts for the relevance, depending on where it was found
+FIELD_WEIGHTS = (
+    ("title", 3),
+    ("author", 2),
+    ("actors", 2),
+    ("tags", 1),
+)
+
+PREFIX_MATCH_FACTOR = 0.5  # Prefix matches count half as much as an exact token match
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(str(text).casefold())
+
+
+def video_tokens(video: Dict) -> Dict[str, int]:
+    """
+    Return all tokens of a video entry with their summed field weights
+    """
+    tokens: Dict[str, int] = {}
+    for field, weight in FIELD_WEIGHTS:
+        value = video.get(field)
+        if not value:
+            continue
+
+        if isinstance(value, (list, tuple)):
+            value = " ".join(map(str, value))
+
+        for token in set(tokenize(value)):
+            tokens[token] = tokens.get(token, 0) + weight
+
+    return tokens
+
+
+class SearchIndex:
+    """Inverted index (token -> {doc_id: weight}) with AND / OR queries, prefix matching and ranking"""
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, int]] = {}
+        # Sorted list of all tokens for prefix lookups. Built lazily on the first search (so loading a big library
+        # doesn't pay for sorted inserts) and maintained incrementally afterwards.
+        self._vocabulary: Optional[List[str]] = None
+
+    def __len__(self):
+        return len(self._postings)
+
+    def clear(self):
+        self._postings.clear()
+        self._vocabulary = None
+
+    def add(self, doc_id: int, video: Dict):
+        for token, weight in video_tokens(video).items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                if self._vocabulary is not None:
+                    insort(self._vocabulary, token)
+
+            postings[doc_id] = weight
+
+    def remove(self, doc_id: int, video: Dict):
+        for token in video_tokens(video):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[token]
+                if self._vocabulary is not None:
+                    del self._vocabulary[bisect_left(self._vocabulary, token)]
+
+    def _prefix_tokens(self, prefix: str) -> Iterable[str]:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+
+        idx = bisect_left(self._vocabulary, prefix)
+        while idx < len(self._vocabulary) and self._vocabulary[idx].startswith(prefix):
+            yield self._vocabulary[idx]
+            idx += 1
+
+    def _match_term(self, term: str, prefix: bool) -> Dict[int, float]:
+        """
+        Return {doc_id: score} of all documents containing the term (exact token, or any token starting with it)
+        """
+        if not prefix:
+            return dict(self._postings.get(term, {}))
+
+        scores: Dict[int, float] = {}
+        for token in self._prefix_tokens(term):
+            factor = 1.0 if token == term else PREFIX_MATCH_FACTOR
+            for doc_id, weight in self._postings[token].items():
+                score = weight * factor
+                if score > scores.get(doc_id, 0):
+                    scores[doc_id] = score
+
+        return scores
+
+    def _match_group(self, terms: List[str]) -> Dict[int, float]:
+        """
+        AND: documents need to contain all terms, their scores are summed up
+        """
+        last = len(terms) - 1
+        matches = sorted((self._match_term(term, prefix=idx == last) for idx, term in enumerate(terms)), key=len)
+        if not matches or not matches[0]:
+            return {}
+
+        result = dict(matches[0])
+        for scores in matches[1:]:
+            result = {doc_id: score + scores[doc_id] for doc_id, score in result.items() if doc_id in scores}
+            if not result:
+                break
+
+        return result
+
+    @staticmethod
+    def parse_query(query: str) -> List[List[str]]:
+        """
+        Split a query into OR groups of AND terms
+        """
+        groups = []
+        for group in re.split(r"\s+OR\s+|\s*\|\s*", query.strip()):
+            terms = tokenize(group)
+            if terms:
+                groups.append(terms)
+
+        return groups
+
+    def search(self, query: str, limit: Optional[int] = None, offset: int = 0) -> List[Tuple[int, float]]:
+        """
+        Search the index
+
+        Args:
+            query: Search query (see module docstring for the syntax)
+            limit: Maximum number of results (None for all)
+            offset: Number of results to skip (pagination)
+
+        Returns:
+            List of (doc_id, score), best match first. Equal scores list the newest video first.
+        """
+        scores: Dict[int, float] = {}
+        for terms in self.parse_query(query):
+            for doc_id, score in self._match_group(terms).items():
+                # OR: a document matching several groups keeps its best score
+                if score > scores.get(doc_id, 0):
+                    scores[doc_id] = score
+
+        key = lambda item: (-item[1], -item[0])
+        if limit is None:
+            return sorted(scores.items(), key=key)[offset:]
+
+        return heapq.nsmallest(offset + limit, scores.items(), key=key)[offset:]
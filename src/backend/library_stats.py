@@ -0,0 +1,121 @@
+"""
+Running statistics and facet counts for the Porn Fetch library.
+
+The LibraryManager builds the aggregates in one pass when they are read for the first time (not while loading the
+library, most runs never read them) and updates them on every add / remove afterwards, so reading the statistics
+again doesn't need to walk the whole library. Facets (authors, tags, actors, sites, download months) are plain counters: the count of one value is
+O(1), the top k values are O(distinct values * log k).
+"""
+
+import heapq
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple, Any
+from src.backend.video_keys import split_video_key, detect_site, SITE_ID_PATTERNS
+
+FACETS = ("authors", "tags", "actors", "sites", "download_months")
+
+
+def video_site(video) -> Optional[str]:
+    """
+    Site of a library entry, taken from its canonical video key (or its URL for entries of older versions)
+    """
+    site, native_id = split_video_key(str(video.get("video_id") or ""))
+    if native_id and site in SITE_ID_PATTERNS:
+        return site
+
+    url = video.get("url")
+    return detect_site(url) if url else None
+
+
+class LibraryStats:
+    """Aggregates over all library entries, kept up to date incrementally"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_duration = 0
+        self.facets: Dict[str, Counter] = {facet: Counter() for facet in FACETS}
+
+    @classmethod
+    def build(cls, records: Iterable) -> "LibraryStats":
+        """
+        Count all library entries (VideoRecords) in one pass. Counter.update() counts in C, which is much cheaper
+        than calling add() for every entry.
+        """
+        stats = cls()
+        records = list(records)
+        facets = stats.facets
+        stats.count = len(records)
+        stats.total_duration = sum(map(cls._duration, records))
+        facets["authors"].update(record.author for record in records if record.author)
+        # A tag listed twice still counts the video only once
+        facets["tags"].update(tag for record in records if record.tags for tag in set(record.tags) if tag)
+        facets["actors"].update(actor for record in records if record.actors for actor in set(record.actors) if actor)
+        facets["sites"].update(filter(None, map(video_site, records)))
+        facets["download_months"].update(record.download_date[:7] for record in records
+                                         if isinstance(record.download_date, str) and record.download_date)
+        return stats
+
+    @staticmethod
+    def _facet_values(video) -> Tuple[Tuple[str, Any], ...]:
+        download_date = video.get("download_date")
+        return (
+            ("authors", (video.get("author"),)),
+            ("tags", set(video.get("tags") or ())),  # A tag listed twice still counts the video only once
+            ("actors", set(video.get("actors") or ())),
+            ("sites", (video_site(video),)),
+            ("download_months", (download_date[:7] if isinstance(download_date, str) else None,)),
+        )
+
+    def add(self, video):
+        """
+        Count a library entry (dictionary or VideoRecord)
+        """
+        self.count += 1
+        self.total_duration += self._duration(video)
+        for facet, values in self._facet_values(video):
+            counter = self.facets[facet]
+            for value in values:
+                if value:
+                    counter[value] += 1
+
+    def remove(self, video):
+        """
+        Stop counting a library entry that was passed to add() before
+        """
+        self.count -= 1
+        self.total_duration -= self._duration(video)
+        for facet, values in self._facet_values(video):
+            counter = self.facets[facet]
+            for value in values:
+                if not value:
+                    continue
+
+                counter[value] -= 1
+                if counter[value] <= 0:
+                    del counter[value]  # Keeps len(counter) == number of distinct values
+
+    @staticmethod
+    def _duration(video) -> int:
+        try:
+            return int(video.get("duration") or 0)
+
+        except (TypeError, ValueError):
+            return 0
+
+    def facet(self, name: str, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        Values of a facet with their counts, most common first
+
+        Args:
+            name: One of FACETS
+            limit: Only return the top values (None for all)
+        """
+        counter = self.facets[name]
+        if name == "download_months":
+            items = sorted(counter.items())  # Histogram, in chronological order
+            return items if limit is None else items[-limit:]
+
+        if limit is None:
+            return sorted(counter.items(), key=lambda item: (-item[1], item[0]))
+
+        return heapq.nsmallest(limit, counter.items(), key=lambda item: (-item[1], item[0]))
@@ -0,0 +1,838 @@
+"""
+Storage backends for the Porn Fetch library.
+
+The LibraryManager keeps the indexes of the library in memory and only hands the single mutations (add / remove /
+clear) to a storage backend, so that a download doesn't need to rewrite the complete library on disk.
+
+Both backends stream the library into the LibraryManager on load (one entry at a time, together with its location on
+disk) and can read single entries again later, so the full entries don't need to stay in memory.
+
+- JSONLibraryStore: library.json snapshot + append-only library.jsonl journal (default)
+- SQLiteLibraryStore: SQLite database in WAL mode (library_path ending with .db / .sqlite / .sqlite3)
+"""
+
+import os
+import re
+import json
+import codecs
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from tempfile import NamedTemporaryFile
+from typing import Dict, List, Optional, Any, Tuple, Callable, Iterable, Iterator, BinaryIO
+from base_api.base import setup_logger
+
+logger = setup_logger(name="Porn Fetch - [Library Storage]", log_file="PornFetch.log", level=logging.DEBUG)
+
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+# Fields that have their own column in the videos table. Everything else a tool may have added to an entry
+# (e.g., cloudflare_url from upload_to_r2.py) is kept as JSON in the "extra" column, so nothing gets lost.
+VIDEO_COLUMNS = ("url", "video_id", "title", "author", "duration", "quality", "download_date", "file_path",
+                 "thumbnail", "publish_date")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT,
+    video_id TEXT,
+    title TEXT,
+    author TEXT,
+    duration INTEGER,
+    quality TEXT,
+    download_date TEXT,
+    file_path TEXT,
+    thumbnail TEXT,
+    publish_date TEXT,
+    extra TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_videos_url ON videos(url);
+CREATE INDEX IF NOT EXISTS idx_videos_video_id ON videos(video_id);
+CREATE INDEX IF NOT EXISTS idx_videos_author ON videos(author);
+CREATE INDEX IF NOT EXISTS idx_videos_download_date ON videos(download_date);
+
+CREATE TABLE IF NOT EXISTS tags (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS video_tags (
+    video INTEGER NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+    tag INTEGER NOT NULL REFERENCES tags(id),
+    position INTEGER NOT NULL,
+    PRIMARY KEY (video, position)
+);
+
+CREATE INDEX IF NOT EXISTS idx_video_tags_tag ON video_tags(tag);
+
+CREATE TABLE IF NOT EXISTS actors (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS video_actors (
+    video INTEGER NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+    actor INTEGER NOT NULL REFERENCES actors(id),
+    position INTEGER NOT NULL,
+    PRIMARY KEY (video, position)
+);
+
+CREATE INDEX IF NOT EXISTS idx_video_actors_actor ON video_actors(actor);
+"""
+
+
+def is_sqlite_path(path: str) -> bool:
+    """
+    Check whether a library path should use the SQLite backend (decided by the file extension)
+    """
+    return str(path).lower().endswith(SQLITE_EXTENSIONS)
+
+
+# Called for every mutation found while loading: (operation, video, location). Operation is "add", "update",
+# "remove" or "clear", location is where the entry can be read again with read_entries() (None for entries that only exist in
+# the journal).
+ApplyCallback = Callable[[str, Optional[Dict], Optional[int]], None]
+
+WHITESPACE = re.compile(r"\s*")
+JSON_WHITESPACE = " \t\r\n"
+
+
+class LibraryChangedError(Exception):
+    """The library file was rewritten by another program, the locations of the entries are no longer valid"""
+
+
+def file_key(path: str) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Identity of a file (st_dev, st_ino, st_size, st_mtime_ns), changes whenever the file is replaced or rewritten.
+    None if the file doesn't exist.
+    """
+    try:
+        stat = os.stat(path)
+
+    except OSError:
+        return None
+
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class _JSONStreamReader:
+    """
+    Minimal streaming reader for library.json: parses it in chunks with JSONDecoder.raw_decode, so the "videos" list
+    is never materialized, and keeps track of the byte offset of every value.
+    """
+
+    def __init__(self, file: BinaryIO, chunk_size: int = 1 << 20):
+        self._file = file
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self.offset = 0  # Byte offset of _buffer[_pos] in the file
+        self._ascii = True  # Character and byte positions are the same while the buffer is pure ASCII
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+
+        chunk = self._file.read(self._chunk_size)
+        self._eof = not chunk
+        self._buffer = self._buffer[self._pos:] + self._text_decoder.decode(chunk, final=self._eof)
+        self._pos = 0
+        self._ascii = self._buffer.isascii()
+        return True
+
+    def _advance(self, pos: int):
+        if self._ascii:
+            self.offset += pos - self._pos
+        else:
+            self.offset += len(self._buffer[self._pos:pos].encode("utf-8"))
+        self._pos = pos
+
+    def peek(self) -> str:
+        """
+        Skip whitespace and return the next character ("" at the end of the file)
+        """
+        while True:
+            if self._pos < len(self._buffer) and self._buffer[self._pos] not in JSON_WHITESPACE:
+                return self._buffer[self._pos]  # Nothing to skip, the usual case inside the videos list
+
+            self._advance(WHITESPACE.match(self._buffer, self._pos).end())
+            if self._pos < len(self._buffer) or not self._fill():
+                return self._buffer[self._pos:self._pos + 1]
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at byte {self.offset} of the library file")
+
+        self._advance(self._pos + 1)
+
+    def skip(self, char: str) -> bool:
+        if self.peek() == char:
+            self._advance(self._pos + 1)
+            return True
+
+        return False
+
+    def value(self) -> Tuple[Any, int]:
+        """
+        Parse the next JSON value
+
+        Returns:
+            (value, byte offset where the value starts)
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue  # The value continues in the next chunk
+                raise
+
+            # A number at the very end of the buffer might continue in the next chunk as well
+            if end == len(self._buffer) and self._fill():
+                continue
+
+            offset = self.offset
+            self._advance(end)
+            return value, offset
+
+
+def iter_library_json(file: BinaryIO, on_video: Callable[[Dict, int], None]) -> Dict[str, Any]:
+    """
+    Stream a library.json file
+
+    Args:
+        file: library.json opened in binary mode
+        on_video: Called with (video, byte offset) for every entry of the "videos" list
+
+    Returns:
+        The top level fields of the library (version, ...) without "videos"
+    """
+    reader = _JSONStreamReader(file)
+    data: Dict[str, Any] = {}
+    reader.expect("{")
+    while not reader.skip("}"):
+        key, _ = reader.value()
+        reader.expect(":")
+        if key == "videos" and reader.peek() == "[":
+            reader.expect("[")
+            if not reader.skip("]"):
+                while True:
+                    video, offset = reader.value()
+                    on_video(video, offset)
+                    if not reader.skip(","):
+                        reader.expect("]")
+                        break
+
+        else:
+            data[key], _ = reader.value()
+
+        reader.skip(",")
+
+    return data
+
+
+def write_library_json(file: BinaryIO, data: Dict[str, Any], videos: Iterable[Dict]) -> List[int]:
+    """
+    Write a library.json file entry by entry (top level fields first, then one video entry per line)
+
+    Args:
+        file: Target file opened in binary mode
+        data: Top level fields (version, ...) without "videos"
+        videos: Video entries
+
+    Returns:
+        Byte offsets of the video entries in the file (for read_entries())
+    """
+    offsets = []
+    position = 0
+
+    def write(text: str):
+        nonlocal position
+        encoded = text.encode("utf-8")
+        file.write(encoded)
+        position += len(encoded)
+
+    write("{\n")
+    for key, value in data.items():
+        if key != "videos":
+            write(f"  {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)},\n")
+
+    write('  "videos": [')
+    separator = "\n    "
+    for video in videos:
+        write(separator)
+        offsets.append(position)
+        write(json.dumps(video, ensure_ascii=False))
+        separator = ",\n    "
+
+    write("\n  ]\n}\n")
+    return offsets
+
+
+def write_library_json_atomic(data: Dict[str, Any], videos: Iterable[Dict], path: str) -> List[int]:
+    """
+    write_library_json() through a temporary file and os.replace
+
+    Returns:
+        Byte offsets of the video entries
+    """
+    dirn = os.path.dirname(os.path.abspath(path)) or '.'
+    with NamedTemporaryFile('wb', delete=False, dir=dirn) as tmp:
+        offsets = write_library_json(tmp, data, videos)
+        tmp.flush()
+        os.fsync(tmp.fileno())
+        tmp_path = tmp.name
+    os.replace(tmp_path, path)
+    return offsets
+
+
+def read_json_entries(path: str, offsets: Iterable[int], read_size: int = 4096) -> Iterator[Dict]:
+    """
+    Read single video entries of a library.json file by their byte offsets (opens the file only once)
+
+    Raises:
+        LibraryChangedError: If there is no video entry at one of the offsets
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'rb') as f:
+        for offset in offsets:
+            size = read_size
+            while True:
+                f.seek(offset)
+                chunk = f.read(size)
+                try:
+                    # A multibyte character cut at the end of the chunk is dropped, it's after the entry anyway
+                    entry = decoder.raw_decode(chunk.decode("utf-8", errors="ignore"))[0]
+
+                except json.JSONDecodeError:
+                    if len(chunk) < size:
+                        raise LibraryChangedError(f"No library entry at byte {offset} of: {path}")
+
+                    size *= 4
+                    continue
+
+                if not isinstance(entry, dict):
+                    # The offset points into another value (e.g. a number or string of a reformatted file)
+                    raise LibraryChangedError(f"No library entry at byte {offset} of: {path}")
+
+                yield entry
+                break
+
+
+class JSONLibraryStore:
+    """
+    Stores the library as a library.json snapshot plus an append-only library.jsonl journal next to it.
+
+    Every mutation is appended as one line to the journal, which makes a library write O(1) per download. A
+    compaction folds the journal back into the snapshot (temp file + os.replace). Each journal line carries a
+    sequence number and the snapshot remembers the last one it contains ("journal_seq"), so a crash in the middle of
+    a compaction never applies a mutation twice. A torn last line (crash during the append) is skipped on load.
+    """
+
+    def __init__(self, path: str, compact_after: int = 500):
+        """
+        Args:
+            path: Path to the library.json snapshot
+            compact_after: Number of journal entries after which a compaction is recommended
+        """
+        self.path = path
+        self.journal_path = os.path.splitext(path)[0] + ".jsonl"
+        self.compact_after = compact_after
+        self.seq = 0  # Sequence number of the last journal entry
+        self.journal_entries = 0  # Number of entries currently in the journal
+        self._snapshot_key = None  # file_key() of the snapshot the offsets point into
+        self._lock = threading.Lock()
+
+    def load(self, apply: ApplyCallback) -> Dict[str, Any]:
+        """
+        Stream the snapshot and replay the journal on top of it
+
+        Args:
+            apply: Called for every entry of the snapshot and every journal entry, see ApplyCallback
+
+        Returns:
+            Dictionary containing the top level library fields (version, ...) without the videos
+        """
+        data = {"version": "1.0"}
+        count = 0
+        self._snapshot_key = None
+        if os.path.exists(self.path):
+            def on_video(video: Dict, offset: int):
+                nonlocal count
+                count += 1
+                apply("add", video, offset)
+
+            try:
+                with open(self.path, 'rb') as f:
+                    stat = os.fstat(f.fileno())
+                    self._snapshot_key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+                    data = iter_library_json(f, on_video)
+
+            except (ValueError, IOError) as e:
+                # Don't let the next compaction overwrite whatever is left of the old library
+                apply("clear", None, None)
+                data = {"version": "1.0"}
+                backup = f"{self.path}.corrupt-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+                logger.error(f"Error loading library: {e}. Moving the broken file to: {backup}")
+                try:
+                    os.replace(self.path, backup)
+
+                except OSError:
+                    pass
+
+                self._snapshot_key = file_key(self.path)
+
+        else:
+            logger.debug("Library file doesn't exist, creating new one")
+
+        self.seq = data.pop("journal_seq", 0)
+        self.journal_entries = 0
+
+        if os.path.exists(self.journal_path):
+            self._truncate_torn_tail()
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping incomplete journal entry in: {self.journal_path}")
+                        continue
+
+                    seq = record.get("seq", 0)
+                    if seq <= self.seq:
+                        continue  # Already part of the snapshot
+
+                    self.seq = seq
+                    self.journal_entries += 1
+                    operation = record.get("op")
+                    if operation == "add":
+                        apply("add", record["video"], None)
+
+                    elif operation == "remove":
+                        # The LibraryManager always removes the oldest entry with that video ID
+                        apply("remove", {"video_id": record.get("video_id")}, None)
+
+                    elif operation == "update":
+                        apply("update", record["video"], None)  # Same here, the oldest entry with the video ID
+
+                    elif operation == "clear":
+                        apply("clear", None, None)
+
+        logger.debug(f"Loaded library with {count} videos from the snapshot and {self.journal_entries} journal entries")
+        return data
+
+    def read_entries(self, locations: Iterable[int]) -> Iterator[Dict]:
+        """
+        Read full video entries from the snapshot again
+
+        Args:
+            locations: Byte offsets passed to the apply callback of load() or returned by install_snapshot()
+
+        Raises:
+            LibraryChangedError: If library.json was changed by another program, see snapshot_changed()
+        """
+        if self.snapshot_changed():
+            raise LibraryChangedError(f"The library file was changed by another program: {self.path}")
+
+        return read_json_entries(self.path, locations)
+
+    def snapshot_changed(self) -> bool:
+        """
+        Check whether library.json was replaced or rewritten since it was loaded (e.g. by upload_to_r2.py), which
+        makes the offsets from load() invalid
+        """
+        return file_key(self.path) != self._snapshot_key
+
+    def _truncate_torn_tail(self):
+        """
+        Cut off a partially written last journal line, otherwise the next append would be glued to it
+        """
+        with open(self.journal_path, 'rb+') as f:
+            content = f.read()  # The journal is kept small by the compaction
+            if not content or content.endswith(b"\n"):
+                return
+
+            f.truncate(content.rfind(b"\n") + 1)
+            logger.warning(f"Removed an incomplete journal entry from: {self.journal_path}")
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self.journal_entries >= self.compact_after
+
+    def commit(self, operations: List[Tuple[str, Optional[int], Optional[Dict]]]) -> bool:
+        """
+        Append library mutations to the journal
+
+        Args:
+            operations: List of (operation, doc_id, video) tuples. Operation is one of "add", "update", "remove" or
+                        "clear"
+
+        Returns:
+            True if successful, False otherwise
+        """
+        lines = []
+        with self._lock:
+            for operation, _, video in operations:
+                self.seq += 1
+                record = {"seq": self.seq, "op": operation}
+                if operation in ("add", "update"):
+                    record["video"] = video
+
+                elif operation == "remove":
+                    record["video_id"] = video.get("video_id")
+
+                lines.append(json.dumps(record, ensure_ascii=False))
+
+            try:
+                with open(self.journal_path, 'a', encoding='utf-8') as f:
+                    f.write("\n".join(lines) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            except IOError as e:
+                logger.error(f"Error writing library journal: {e}")
+                return False
+
+            self.journal_entries += len(lines)
+            return True
+
+    def stage_snapshot(self, data: Dict[str, Any], videos: Iterable[Dict]) -> Optional[Tuple[str, List[int], int]]:
+        """
+        First half of a compaction: write a new snapshot into a temporary file. It only replaces library.json in
+        install_snapshot(), so entries can still be read from the old snapshot in the meantime.
+
+        Args:
+            data: Top level library fields (version, ...) without "videos"
+            videos: All video entries, as of the last journal entry written so far
+
+        Returns:
+            Staged snapshot for install_snapshot(), None on errors
+
+        Raises:
+            LibraryChangedError: If the entries couldn't be read from library.json, see read_entries()
+        """
+        with self._lock:
+            journal_seq = self.seq
+
+        dirn = os.path.dirname(os.path.abspath(self.path)) or '.'
+        tmp_path = None
+        try:
+            with NamedTemporaryFile('wb', delete=False, dir=dirn) as tmp:
+                tmp_path = tmp.name
+                offsets = write_library_json(tmp, dict(data, journal_seq=journal_seq), videos)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+
+        except (OSError, LibraryChangedError) as e:
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+
+                except OSError:
+                    pass
+
+            if isinstance(e, LibraryChangedError):
+                raise  # The LibraryManager loads the library again and retries
+
+            logger.error(f"Error saving library: {e}")
+            return None
+
+        return tmp_path, offsets, journal_seq
+
+    def install_snapshot(self, staged: Tuple[str, List[int], int], doc_ids: List[int]) -> Optional[List[int]]:
+        """
+        Second half of a compaction: replace library.json with the staged snapshot and drop all journal entries
+        it contains. The old locations are invalid afterwards.
+
+        Args:
+            staged: Return value of stage_snapshot()
+            doc_ids: Unused, only needed by the SQLiteLibraryStore
+
+        Returns:
+            New locations of the video entries (same order as written), None on errors
+        """
+        tmp_path, offsets, journal_seq = staged
+        try:
+            os.replace(tmp_path, self.path)
+
+        except OSError as e:
+            logger.error(f"Error saving library: {e}")
+            return None
+
+        self._snapshot_key = file_key(self.path)
+
+        # Entries appended while the snapshot was written need to stay in the journal
+        with self._lock:
+            try:
+                remaining = []
+                if os.path.exists(self.journal_path):
+                    with open(self.journal_path, 'r', encoding='utf-8') as f:
+                        for line in f:
+                            try:
+                                if json.loads(line).get("seq", 0) > journal_seq:
+                                    remaining.append(line)
+
+                            except json.JSONDecodeError:
+                                continue
+
+                dirn = os.path.dirname(os.path.abspath(self.journal_path)) or '.'
+                with NamedTemporaryFile('w', delete=False, dir=dirn, encoding='utf-8') as tmp:
+                    tmp.writelines(remaining)
+                    tmp_path = tmp.name
+                os.replace(tmp_path, self.journal_path)
+                self.journal_entries = len(remaining)
+
+            except IOError as e:
+                # Not critical, the snapshot remembers which journal entries it already contains
+                logger.error(f"Error truncating library journal: {e}")
+
+        logger.debug(f"Compacted library with {len(offsets)} videos")
+        return offsets
+
+    def close(self):
+        pass
+
+
+class SQLiteLibraryStore:
+    """Stores the library in an SQLite database (WAL mode) with one row per video"""
+
+    def __init__(self, path: str):
+        """
+        Open (or create) the library database
+
+        Args:
+            path: Path to the SQLite database file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        # Maps the document IDs of the LibraryManager to the row IDs in the database
+        self._rowids: Dict[int, int] = {}
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+
+    def load(self, apply: ApplyCallback) -> Dict[str, Any]:
+        """
+        Stream the whole library in the JSON schema used by library.json. The videos are passed to apply() in
+        insertion order and their positions become the document IDs used in commit().
+
+        Args:
+            apply: Called with ("add", video, row ID) for every video
+
+        Returns:
+            Dictionary containing the top level library fields (version, ...) without the videos
+        """
+        with self._lock:
+            data: Dict[str, Any] = {key: json.loads(value) for key, value in
+                                    self.connection.execute("SELECT key, value FROM meta")}
+            data.setdefault("version", "1.0")
+
+            self._rowids = {}
+            for doc_id, (rowid, video) in enumerate(self._iter_videos()):
+                self._rowids[doc_id] = rowid
+                apply("add", video, rowid)
+
+            logger.debug(f"Loaded {len(self._rowids)} videos from SQLite library: {self.path}")
+            return data
+
+    def read_entries(self, locations: Iterable[int]) -> Iterator[Dict]:
+        """
+        Read full video entries again
+
+        Args:
+            locations: Row IDs passed to the apply callback of load() or returned by install_snapshot()
+        """
+        for rowid in locations:
+            with self._lock:
+                videos = [video for _, video in self._iter_videos("WHERE {column} = ?", (rowid,))]
+
+            yield from videos
+
+    def snapshot_changed(self) -> bool:
+        """
+        Rows are addressed by their row ID, other programs changing the database don't invalidate them
+        """
+        return False
+
+    def _iter_videos(self, where: str = "", parameters: Tuple = ()) -> Iterator[Tuple[int, Dict]]:
+        """
+        Yield (row ID, video) ordered by row ID. Tags and actors are merged in from their own (equally ordered)
+        cursors, so nothing but the current row is kept in memory.
+        """
+        def names(query: str, column: str) -> Iterator[Tuple[int, str]]:
+            return self.connection.execute(query.format(where=where.format(column=column)), parameters)
+
+        tags = names("SELECT vt.video, t.name FROM video_tags vt JOIN tags t ON t.id = vt.tag {where} "
+                     "ORDER BY vt.video, vt.position", "vt.video")
+        actors = names("SELECT va.video, a.name FROM video_actors va JOIN actors a ON a.id = va.actor {where} "
+                       "ORDER BY va.video, va.position", "va.video")
+        next_tag = next(tags, None)
+        next_actor = next(actors, None)
+
+        cursor = self.connection.execute(
+            f"SELECT id, {', '.join(VIDEO_COLUMNS)}, extra FROM videos {where.format(column='id')} ORDER BY id",
+            parameters)
+        for row in cursor:
+            rowid = row[0]
+            # Keeps the key order of library.json entries (tags and actors come right after quality)
+            video = dict(zip(VIDEO_COLUMNS[:6], row[1:7]))
+            video["tags"] = []
+            while next_tag is not None and next_tag[0] <= rowid:
+                if next_tag[0] == rowid:
+                    video["tags"].append(next_tag[1])
+                next_tag = next(tags, None)
+
+            video["actors"] = []
+            while next_actor is not None and next_actor[0] <= rowid:
+                if next_actor[0] == rowid:
+                    video["actors"].append(next_actor[1])
+                next_actor = next(actors, None)
+
+            video.update(zip(VIDEO_COLUMNS[6:], row[7:-1]))
+            if row[-1]:
+                video.update(json.loads(row[-1]))
+
+            yield rowid, video
+
+    def _name_id(self, table: str, name: str) -> int:
+        self.connection.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+        return self.connection.execute(f"SELECT id FROM {table} WHERE name = ?", (name,)).fetchone()[0]
+
+    @staticmethod
+    def _row_values(video: Dict) -> Tuple:
+        extra = {key: value for key, value in video.items() if key not in VIDEO_COLUMNS
+                 and key not in ("tags", "actors")}
+        values = [video.get(column) for column in VIDEO_COLUMNS]
+        return (*values, json.dumps(extra, ensure_ascii=False) if extra else None)
+
+    def _insert(self, video: Dict) -> int:
+        cursor = self.connection.execute(
+            f"INSERT INTO videos ({', '.join(VIDEO_COLUMNS)}, extra) VALUES ({', '.join('?' * (len(VIDEO_COLUMNS) + 1))})",
+            self._row_values(video))
+        rowid = cursor.lastrowid
+        self._insert_names(rowid, video)
+        return rowid
+
+    def _update(self, rowid: int, video: Dict):
+        self.connection.execute(
+            f"UPDATE videos SET {', '.join(f'{column} = ?' for column in VIDEO_COLUMNS)}, extra = ? WHERE id = ?",
+            (*self._row_values(video), rowid))
+        self.connection.execute("DELETE FROM video_tags WHERE video = ?", (rowid,))
+        self.connection.execute("DELETE FROM video_actors WHERE video = ?", (rowid,))
+        self._insert_names(rowid, video)
+
+    def _insert_names(self, rowid: int, video: Dict):
+        self.connection.executemany(
+            "INSERT INTO video_tags (video, tag, position) VALUES (?, ?, ?)",
+            [(rowid, self._name_id("tags", str(tag)), position) for position, tag in enumerate(video.get("tags") or [])])
+        self.connection.executemany(
+            "INSERT INTO video_actors (video, actor, position) VALUES (?, ?, ?)",
+            [(rowid, self._name_id("actors", str(actor)), position)
+             for position, actor in enumerate(video.get("actors") or [])])
+
+    def commit(self, operations: List[Tuple[str, Optional[int], Optional[Dict]]]) -> bool:
+        """
+        Apply library mutations in a single transaction
+
+        Args:
+            operations: List of (operation, doc_id, video) tuples. Operation is one of "add", "update", "remove" or
+                        "clear"
+
+        Returns:
+            True if successful, False otherwise
+        """
+        with self._lock:
+            try:
+                with self.connection:
+                    for operation, doc_id, video in operations:
+                        if operation == "add":
+                            self._rowids[doc_id] = self._insert(video)
+
+                        elif operation == "update":
+                            rowid = self._rowids.get(doc_id)
+                            if rowid is not None:
+                                self._update(rowid, video)
+
+                        elif operation == "remove":
+                            rowid = self._rowids.pop(doc_id, None)
+                            if rowid is not None:
+                                self.connection.execute("DELETE FROM videos WHERE id = ?", (rowid,))
+
+                        elif operation == "clear":
+                            self._rowids.clear()
+                            self.connection.execute("DELETE FROM videos")
+
+                return True
+
+            except sqlite3.Error as e:
+                logger.error(f"Error writing to SQLite library: {e}")
+                return False
+
+    def stage_snapshot(self, data: Dict[str, Any], videos: Iterable[Dict]) -> Optional[Tuple[Dict, List[Dict]]]:
+        """
+        First half of replacing the complete library: collect the entries. The rows are only replaced in
+        install_snapshot() (single transaction), which is rare for this backend (import / explicit save).
+
+        Args:
+            data: Top level library fields (version, ...) without "videos"
+            videos: All video entries
+
+        Returns:
+            Staged library for install_snapshot()
+        """
+        return data, list(videos)
+
+    def install_snapshot(self, staged: Tuple[Dict, List[Dict]], doc_ids: List[int]) -> Optional[List[int]]:
+        """
+        Second half of replacing the complete library: replace the database content. The old locations are invalid
+        afterwards.
+
+        Args:
+            staged: Return value of stage_snapshot()
+            doc_ids: Document IDs of the videos (same order)
+
+        Returns:
+            New row IDs of the video entries, None on errors
+        """
+        data, videos = staged
+        with self._lock:
+            try:
+                with self.connection:
+                    self.connection.execute("DELETE FROM videos")
+                    self.connection.execute("DELETE FROM meta")
+                    self.connection.executemany(
+                        "INSERT INTO meta (key, value) VALUES (?, ?)",
+                        [(key, json.dumps(value)) for key, value in data.items() if key != "videos"])
+
+                    self._rowids.clear()
+                    rowids = []
+                    for doc_id, video in zip(doc_ids, videos):
+                        self._rowids[doc_id] = self._insert(video)
+                        rowids.append(self._rowids[doc_id])
+
+                return rowids
+
+            except sqlite3.Error as e:
+                logger.error(f"Error writing to SQLite library: {e}")
+                return None
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
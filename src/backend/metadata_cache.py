@@ -0,0 +1,304 @@
+"""
+Cache for video metadata (the VideoMetadata records of shared_functions.load_video_metadata()).
+
+Most attributes of the site APIs are fetched lazily, so loading the metadata of a video costs one or more network
+requests. The cache keeps the normalized metadata by canonical video key, with a TTL (metadata like the
+thumbnail URL expires) and LRU eviction (bounded memory in long-running processes like the model daemon).
+Concurrent loads of the same video are merged into one. The records are immutable (VideoMetadata), every caller gets
+the cached record itself.
+
+Below the in-memory cache sits an optional MetadataStore: an SQLite database shared by the CLI and the GUI, so that
+a new process (re-listing a model, resuming a batch, reopening the GUI) gets the metadata of videos it has seen
+before from disk. The store has per-site TTLs and is bounded by the number of entries (least recently used ones are
+evicted).
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+from base_api.base import setup_logger
+from src.backend.video_keys import split_video_key
+
+logger = setup_logger(name="Porn Fetch - [Metadata Cache]", log_file="PornFetch.log", level=logging.DEBUG)
+
+# How long the metadata of a site stays fresh on disk (seconds). PornHub's thumbnail URLs are signed and expire.
+SITE_TTLS = {"pornhub": 86400, "default": 7 * 86400}
+
+# What the MetadataCache does with a stale entry of the store: "strict" loads it again before returning,
+# "stale-while-revalidate" returns the stale entry right away and reloads it in a background thread
+REVALIDATION_POLICIES = ("strict", "stale-while-revalidate")
+
+
+def parse_site_ttls(value: str) -> Dict[str, float]:
+    """
+    Parse per-site TTLs from the configuration ("default=168,pornhub=24", in hours)
+    """
+    ttls = dict(SITE_TTLS)
+    for item in value.split(","):
+        site, _, hours = item.partition("=")
+        try:
+            ttls[site.strip().lower()] = float(hours) * 3600
+
+        except ValueError:
+            if item.strip():
+                logger.warning(f"Ignoring invalid metadata TTL: {item}")
+
+    return ttls
+
+
+class MetadataStore:
+    """Persistent key/value store (SQLite, WAL mode): video key -> normalized attribute dictionary"""
+
+    def __init__(self, path: str, max_entries: int = 50000, site_ttls: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            path: Path of the SQLite database
+            max_entries: Number of videos kept, the least recently used ones are evicted first
+            site_ttls: Seconds the metadata of a site stays fresh ("default" for all other sites)
+        """
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.site_ttls = dict(SITE_TTLS, **(site_ttls or {}))
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, data TEXT NOT NULL, "
+                                "fetched REAL NOT NULL, accessed REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS metadata_accessed ON metadata (accessed)")
+        self.connection.commit()
+
+    def ttl(self, key: str) -> float:
+        site, _ = split_video_key(key)
+        return self.site_ttls.get(site, self.site_ttls["default"])
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """
+        Returns:
+            (attributes, stale), None if the key isn't stored
+        """
+        now = time.time()
+        with self._lock:
+            row = self.connection.execute("SELECT data, fetched FROM metadata WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+
+            # Only every hour per entry, so that warm reads don't turn into writes. Good enough for the LRU eviction.
+            if self.connection.execute("UPDATE metadata SET accessed = ? WHERE key = ? AND accessed < ?",
+                                       (now, key, now - 3600)).rowcount:
+                self.connection.commit()
+
+        data, fetched = row
+        return json.loads(data), fetched + self.ttl(key) < now
+
+    def put(self, key: str, data: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            self.connection.execute("INSERT OR REPLACE INTO metadata (key, data, fetched, accessed) VALUES (?, ?, ?, ?)",
+                                    (key, json.dumps(data, ensure_ascii=False), now, now))
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._evict()
+
+            self.connection.commit()
+
+    def _evict(self):
+        """
+        Delete the least recently used entries above max_entries (checked every 100 writes, 10 % slack so that
+        eviction doesn't run on every write)
+        """
+        count = self.connection.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+        if count <= self.max_entries:
+            return
+
+        excess = count - int(self.max_entries * 0.9)
+        self.connection.execute("DELETE FROM metadata WHERE key IN "
+                                "(SELECT key FROM metadata ORDER BY accessed LIMIT ?)", (excess,))
+        logger.debug(f"Evicted {excess} entries from the metadata store")
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self.connection.execute("DELETE FROM metadata WHERE key = ?", (key,))
+            self.connection.commit()
+
+    def clear(self):
+        with self._lock:
+            self.connection.execute("DELETE FROM metadata")
+            self.connection.commit()
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+class MetadataCache:
+    """Thread-safe TTL + LRU cache: video key -> immutable metadata record"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, store: Optional[MetadataStore] = None,
+                 revalidation: str = "strict", record_type: Optional[Type] = None):
+        """
+        Args:
+            max_entries: Number of videos kept, the least recently used ones are evicted first
+            ttl: Seconds an entry stays valid
+            store: Persistent store below the in-memory cache (None to only cache in memory)
+            revalidation: What to do with stale entries of the store, one of REVALIDATION_POLICIES
+            record_type: Type of the cached records, stored with to_dict() and read back with from_dict() (None if
+                         the records are JSON values already)
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.store = store
+        self.revalidation = revalidation if revalidation in REVALIDATION_POLICIES else "strict"
+        self.record_type = record_type
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._loading: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Any:
+        """
+        Returns:
+            The cached record, None if the key isn't cached or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires, data = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return data
+
+    def put(self, key: str, data: Any):
+        self._remember(key, data)
+        if self.store is not None:
+            try:
+                self.store.put(key, data.to_dict() if self.record_type is not None else data)
+
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logger.error(f"Could not write the metadata store: {e}")
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> Any:
+        """
+        Return the cached metadata of key (from memory or the store), or call loader() and cache its result. If
+        another thread is already loading the same key, wait for it instead of loading it twice.
+        """
+        while True:
+            data = self.get(key)
+            if data is not None:
+                with self._lock:
+                    self.hits += 1
+                return data
+
+            with self._lock:
+                event = self._loading.get(key)
+                if event is None:
+                    event = self._loading[key] = threading.Event()
+                    break
+
+            event.wait()  # Loaded by another thread (or it failed, then we try ourselves)
+
+        stored = None
+        try:
+            stored = self._load_stored(key)
+            if stored is not None and (not stored[1] or self.revalidation == "stale-while-revalidate"):
+                data, stale = stored
+                self._remember(key, data)
+                with self._lock:
+                    self.hits += 1
+
+                if stale:
+                    threading.Thread(target=self._revalidate, args=(key, loader), daemon=True).start()
+
+                return data
+
+            with self._lock:
+                self.misses += 1
+
+            data = loader()
+            self.put(key, data)
+            return data
+
+        finally:
+            with self._lock:
+                del self._loading[key]
+            event.set()
+
+    def _load_stored(self, key: str) -> Optional[Tuple[Any, bool]]:
+        if self.store is None:
+            return None
+
+        try:
+            stored = self.store.get(key)
+            if stored is None or self.record_type is None:
+                return stored
+
+            data, stale = stored
+            return self.record_type.from_dict(data), stale
+
+        except (sqlite3.Error, ValueError, TypeError) as e:
+            logger.error(f"Could not read the metadata store: {e}")
+            return None
+
+    def _revalidate(self, key: str, loader: Callable[[], Any]):
+        try:
+            self.put(key, loader())
+
+        except Exception as e:
+            logger.warning(f"Could not revalidate the metadata of {key}: {e}")
+
+    def _remember(self, key: str, data: Any):
+        """
+        Put an entry of the store into the in-memory cache
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+        if self.store is not None:
+            self.store.invalidate(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+        if self.store is not None:
+            self.store.clear()
+
+
+def open_metadata_store(path: str, max_entries: int, site_ttls: str) -> Optional[MetadataStore]:
+    """
+    Open the persistent metadata store, None if it can't be opened (then only the in-memory cache is used)
+
+    Args:
+        path: Path of the SQLite database (empty to disable the store)
+        max_entries: Number of videos kept
+        site_ttls: Per-site TTLs in hours, as in the configuration ("default=168,pornhub=24")
+    """
+    if not path:
+        return None
+
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return MetadataStore(path, max_entries=max_entries, site_ttls=parse_site_ttls(site_ttls))
+
+    except (OSError, sqlite3.Error) as e:
+        logger.error(f"Could not open the metadata store {path}: {e}")
+        return None
@@ -4,81 +4,99 @@ If you know what you do, you can change a few things here :)
 """
 
 import os
-import re
 import logging
-
-from hqporner_api.modules.errors import WeirdError
+import importlib
+import threading
 
 from src.backend.config import *
+from src.backend.video_keys import video_key, parse_video_url # URL normalization / canonical video keys
+from src.backend.metadata_cache import MetadataCache, open_metadata_store
+from src.backend.video_metadata import VideoMetadata, extract_metadata, parse_length  # noqa: F401
+from src.backend.site_clients import (site_clients, site_module, is_site_video, loaded_video_classes, SITE_PREFIXES)
+from src.backend.thumbnail_cache import get_thumbnail_service
 from urllib.parse import urlsplit
 from mutagen.mp4 import MP4, MP4Cover
-from base_api.base import BaseCore, setup_logger
-from base_api.modules.config import RuntimeConfig
-from phub import Client as ph_Client, errors, Video as ph_Video, consts as phub_consts
-from hqporner_api import Client as hq_Client, Video as hq_Video
-from xnxx_api import Client as xn_Client, Video as xn_Video
-from xvideos_api import Client as xv_Client, Video as xv_Video
-from eporner_api import Client as ep_Client, Video as ep_Video, Category as ep_Category # Used in the main file
-from missav_api.missav_api import Video as mv_Video, Client as mv_Client
-from xhamster_api import Client as xh_Client, Video as xh_Video
-from spankbang_api import Client as sp_Client, Video as sp_Video
-from base_api.modules.config import config # This is the global configuration instance of base core config
-# which is also affecting all other APIs when the refresh_clients function is called
-# Initialize clients globally, so that we can override them later with a new configuration from BaseCore if needed
-mv_client = mv_Client()
-ep_client = ep_Client()
-ph_client = ph_Client()
-xv_client = xv_Client()
-xh_client = xh_Client()
-sp_client = sp_Client()
-hq_client = hq_Client()
-xn_client = xn_Client()
-core = BaseCore() # We need that sometimes in Porn Fetch's main class e.g., thumbnail fetching
-core_ph = None
-core_internet_checks = BaseCore(config=config, auto_init=True)
+from base_api.base import setup_logger
+# The site API packages and their clients are imported / built on first use (see site_clients). They are still available
+# under their old names (ph_client, xv_Video, core, errors ...) through the module __getattr__ below.
+
+_metadata_cache = None
+_metadata_cache_lock = threading.Lock()
+
+def get_metadata_cache() -> MetadataCache:
+    """
+    Get or create the global MetadataCache: video metadata by canonical video key, so that the same video isn't fetched
+    multiple times (see load_video_metadata) and (on disk) between runs and between the CLI and the GUI. The store is
+    opened on first use, not when shared_functions is imported.
+    """
+    global _metadata_cache
+    with _metadata_cache_lock:
+        if _metadata_cache is None:
+            store_path = shared_config.get("Performance", "metadata_store_path", fallback="metadata_cache.db")
+            if store_path and not os.path.isabs(store_path):
+                store_path = os.path.join(config_directory, store_path)  # Next to config.ini
+
+            store = open_metadata_store(
+                store_path,
+                max_entries=shared_config.getint("Performance", "metadata_store_size", fallback=50000),
+                site_ttls=shared_config.get("Performance", "metadata_store_ttls", fallback=""))
+
+            _metadata_cache = MetadataCache(
+                max_entries=shared_config.getint("Performance", "metadata_cache_size", fallback=1024),
+                ttl=shared_config.getint("Performance", "metadata_cache_ttl", fallback=3600),
+                store=store,
+                revalidation=shared_config.get("Performance", "metadata_revalidation", fallback="strict"),
+                record_type=VideoMetadata)
+
+        return _metadata_cache
+
+# Module attributes that are resolved on first access
+LAZY_ATTRIBUTES = {
+    "metadata_cache": get_metadata_cache,
+    "core": lambda: site_clients.core("common"), # We need that sometimes in Porn Fetch's main class e.g., thumbnail fetching
+    "core_ph": lambda: site_clients.core("pornhub"),
+    "core_internet_checks": lambda: site_clients.core("internet_checks"),
+    "errors": lambda: importlib.import_module("phub.errors"),
+    "phub_consts": lambda: importlib.import_module("phub.consts"),
+    "ep_Category": lambda: site_module("eporner").Category, # Used in the main file
+    # The global configuration instance of base core config, which is also affecting all other APIs when the
+    # refresh_clients function is called
+    "config": lambda: importlib.import_module("base_api.modules.config").config,
+}
+
+
+def __getattr__(name):
+    """
+    Lazy module attributes: <prefix>_client (the current client of a site), <prefix>_Video / <prefix>_Client (classes
+    of a site package, prefixes in site_clients.SITE_PREFIXES) and LAZY_ATTRIBUTES. Clients and cores are never stored
+    as module globals, so refresh_clients() reaches every user of shared_functions.
+    """
+    prefix, _, suffix = name.partition("_")
+    site = SITE_PREFIXES.get(prefix)
+    if site is not None and suffix == "client":
+        return site_clients.client(site)
+
+    if site is not None and suffix in ("Video", "Client"):
+        return getattr(site_module(site), suffix)
+
+    if name in LAZY_ATTRIBUTES:
+        return LAZY_ATTRIBUTES[name]()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def refresh_clients(enable_kill_switch=False):
-    global mv_client, ep_client, ph_client, xv_client, xh_client, sp_client, hq_client, xn_client, core, core_ph
-
-    # One BaseCore per site, with its own RuntimeConfig (isolated headers/cookies)
-    core_common = BaseCore(config=config, auto_init=True)   # if you want a “generic” core
-    core_hq    = BaseCore(config=config, auto_init=True)
-    core_mv    = BaseCore(config=config, auto_init=True)
-    core_ep    = BaseCore(config=config, auto_init=True)
-    core_ph    = BaseCore(config=config, auto_init=True)
-    core_xv    = BaseCore(config=config, auto_init=True)
-    core_xh    = BaseCore(config=config, auto_init=True)
-    core_xn    = BaseCore(config=config, auto_init=True)
-    core_sp    = BaseCore(config=config, auto_init=True)
-
-    if enable_kill_switch:
-        core_common.enable_kill_switch()
-        core_hq.enable_kill_switch()
-        core_mv.enable_kill_switch()
-        core_ep.enable_kill_switch()
-        core_ph.enable_kill_switch()
-        core_xv.enable_kill_switch()
-        core_xh.enable_kill_switch()
-        core_xn.enable_kill_switch()
-
-    # Instantiate clients with their site-specific cores
-    mv_client = mv_Client(core=core_mv)
-    ep_client = ep_Client(core=core_ep)
-    ph_client = ph_Client(core=core_ph, use_webmaster_api=True)
-    xv_client = xv_Client(core=core_xv)
-    xh_client = xh_Client(core=core_xh)
-    sp_client = sp_Client(core=core_sp)
-    hq_client = hq_Client(core=core_hq)
-    xn_client = xn_Client(core=core_xn)
-
-    core = core_common
+    """
+    Apply a configuration change: clients / cores that were built already are dropped and built again (with the new
+    configuration) the next time a site is used. Nothing is built here.
+    """
+    site_clients.invalidate(kill_switch=enable_kill_switch)
 
 def origin(url: str) -> str:
     p = urlsplit(url)
     return f"{p.scheme}://{p.netloc}/"
 
 def enable_logging(level=logging.DEBUG, log_file="APIs.log", log_ip=http_log_ip, log_port=http_log_port):
-    global mv_client, ep_client, ph_client, xv_client, xh_client, sp_client, hq_client, xn_client
     pass # Need to implement that later lol
 
 logger = setup_logger(name="Porn Fetch - [shared_functions]", log_file="PornFetch.log", level=logging.DEBUG, http_ip=http_log_ip, http_port=http_log_port)
@@ -101,16 +119,6 @@ options_sponsoring = ["downloaded_videos", "notice_shown"]
 options_android = ["warning_shown"]
 
 
-pornhub_pattern = re.compile(r'(.*?)pornhub(.*)') # can also be .org
-hqporner_pattern = re.compile(r'(.*?)hqporner.com(.*)')
-xnxx_pattern = re.compile(r'(.*?)xnxx.com(.*)')
-xvideos_pattern = re.compile(r'(.*?)xvideos.com(.*)')
-eporner_pattern = re.compile(r'(.*?)eporner.com(.*)')
-missav_pattern = re.compile(r'(.*?)missav(.*?)')
-xhamster_pattern = re.compile(r'(.*?)xhamster(.*?)')
-spankbang_pattern = re.compile(r'(.*?)spankbang(.*?)')
-
-
 default_configuration = f"""[Setup]
 license_accepted = false
 install = unknown
@@ -129,6 +137,22 @@ timeout = 10
 retries = 4
 speed_limit = 0
 processing_delay = 0
+model_crawl_workers = 8
+model_crawl_per_site = 2
+model_crawl_lookback = 5
+model_refresh_min_hours = 1
+model_refresh_max_hours = 168
+metadata_cache_size = 1024
+metadata_cache_ttl = 3600
+metadata_store_path = metadata_cache.db
+metadata_store_size = 50000
+metadata_store_ttls = default=168,pornhub=24
+metadata_revalidation = strict
+http2 = false
+connection_pool_size = 100
+thumbnail_cache_path = thumbnails
+thumbnail_cache_size = 256
+thumbnail_workers = 4
 
 [Video]
 quality = best
@@ -145,6 +169,8 @@ write_metadata = true
 use_library = true
 library_path = library.json
 skip_library_duplicates = true
+fingerprint_downloads = false
+hardlink_duplicates = false
 
 [UI]
 language = system
@@ -160,63 +186,49 @@ warning_shown = false
 """
 
 
-def check_video(url, is_url=True):
-    if is_url:
-        if hqporner_pattern.search(str(url)) and not isinstance(url, hq_Video):
-            print("Returning HQPorner Video! ")
-            return hq_client.get_video(url)
-
-        elif eporner_pattern.search(str(url)) and not isinstance(url, ep_Video):
-            return ep_client.get_video(url, enable_html_scraping=True)
-
-        elif xnxx_pattern.search(str(url)) and not isinstance(url, xn_Video):
-            return xn_client.get_video(url)
-
-        elif xvideos_pattern.search(str(url)) and not isinstance(url, xv_Video):
-            return xv_client.get_video(url)
+# Site name (see video_keys.SITE_HOSTS) -> loader for a video URL of that site. The loaders get the client when
+# they are called, so it's only built for sites that are actually used.
+SITE_LOADERS = {
+    "pornhub": lambda url: fetch_pornhub_page(site_clients.client("pornhub").get(url)),
+    "hqporner": lambda url: site_clients.client("hqporner").get_video(url),
+    "eporner": lambda url: site_clients.client("eporner").get_video(url, enable_html_scraping=True),
+    "xnxx": lambda url: site_clients.client("xnxx").get_video(url),
+    "xvideos": lambda url: site_clients.client("xvideos").get_video(url),
+    "missav": lambda url: site_clients.client("missav").get_video(url),
+    "xhamster": lambda url: site_clients.client("xhamster").get_video(url),
+    "spankbang": lambda url: site_clients.client("spankbang").get_video(url),
+}
 
-        elif missav_pattern.search(str(url)) and not isinstance(url, mv_Video):
-            return mv_client.get_video(url)
 
-        elif xhamster_pattern.search(str(url)) and not isinstance(url, xh_Video):
-            return xh_client.get_video(url)
+def fetch_pornhub_page(video):
+    video.fetch("page@")
+    return video
 
-        elif spankbang_pattern.search(str(url)) and not isinstance(url, sp_Video):
-            return sp_client.get_video(url)
 
-        if isinstance(url, ph_Video):
-            url.fetch("page@") # If url is a PornHub Video object it does have the `fetch` method
-            return url
-
-        elif isinstance(url, hq_Video):
-            return url
-
-        elif isinstance(url, ep_Video):
-            return url
-
-        elif isinstance(url, xn_Video):
-            return url
-
-        elif isinstance(url, xv_Video):
-            return url
-
-        elif isinstance(url, xh_Video):
-            return url
+def check_video(url, is_url=True):
+    """
+    Turn a URL into the video object of its site. Video objects are returned as they are.
 
-        elif isinstance(url, mv_Video):
-            return url
+    The site is resolved from the host name (see video_keys.parse_video_url()), so a URL is only classified as a site
+    if its host belongs to that site, not if the site name appears somewhere in the URL.
 
-        elif isinstance(url, sp_Video):
-            return url
+    Returns:
+        The video object, False if the URL doesn't belong to a supported site
+    """
+    if is_url:
+        if isinstance(url, loaded_video_classes()):
+            return fetch_pornhub_page(url) if is_site_video(url, "pornhub") else url
 
-        elif isinstance(url, str) and not str(url).endswith(".html"):
-            video = ph_client.get(url) # PornHub client
-            video.fetch("page@")
-            return video
+        url = str(url).strip()
+        site, _ = parse_video_url(url)
+        if site is None and "://" not in url and url and not url.endswith(".html"):
+            site = "pornhub"  # Bare PornHub viewkey
 
-        else:
+        if site is None:
             return False
 
+        return SITE_LOADERS[site](url)
+
     else:
         pass
 
@@ -237,469 +249,117 @@ def setup_config_file(force=False):
             exit(1)
 
     else:
-        config = ConfigParser()
-        config.read("config.ini")
+        configuration = ConfigParser()
+        configuration.read("config.ini")
 
         for idx, section in enumerate(sections):
             if idx == 0:
                 for option in options_setup:
-                    if not config.has_option(section, option):
+                    if not configuration.has_option(section, option):
                         setup_config_file(force=True)
                         print("ISSUE 1")
 
             if idx == 1:
                 for option in options_performance:
-                    if not config.has_option(section, option):
+                    if not configuration.has_option(section, option):
                         setup_config_file(force=True)
                         print("ISSUE 2")
 
             if idx == 2:
                 for option in options_video:
-                    if not config.has_option(section, option):
+                    if not configuration.has_option(section, option):
                         print(f"Config mismatch: {section} | {option}")
                         setup_config_file(force=True)
                         print("ISSUE 4")
 
             if idx == 3:
                 for option in options_ui:
-                    if not config.has_option(section, option):
+                    if not configuration.has_option(section, option):
                         setup_config_file(force=True)
                         print("ISSUE 5")
 
             if idx == 4:
                 for option in options_sponsoring:
-                    if not config.has_option(section, option):
+                    if not configuration.has_option(section, option):
                         setup_config_file(force=True)
                         print("ISSUE 6")
 
             if idx == 5:
                 for option in options_android:
-                    if not config.has_option(section, option):
+                    if not configuration.has_option(section, option):
                         print(f"ISSUE 7, {section} {option}")
                         setup_config_file(force=True)
 
 
 
-def load_video_attributes(video):
-    title = video.title
-    actors = []  # Initialize actors list
-    duration_seconds = None  # Store duration in seconds
-
-    if isinstance(video, ph_Video):
-        try:
-            author = video.author.name
-        except Exception:
-            try:
-                # Try to get first pornstar as fallback
-                pornstars = video.pornstars
-                author = pornstars[0] if pornstars else "Unknown"
-            except Exception:
-                author = "Unknown"
-
-        try:
-            duration_seconds = video.duration.seconds  # Already in seconds
-            length = video.duration.seconds / 60  # Keep for backward compatibility
-        except Exception:
-            duration_seconds = None
-            length = "Not available"
-
-        try:
-            tags = ",".join([tag.name for tag in video.tags])
-        except Exception:
-            tags = "Not available"
-
-        try:
-            actors = video.pornstars if video.pornstars else []
-        except Exception:
-            actors = []
-
-        try:
-            publish_date = video.date
-        except Exception:
-            publish_date = "Not available"
-
-        try:
-            video.refresh()  # Throws an error otherwise. I have no idea why.
-            thumbnail = video.image.url
-        except Exception:
-            thumbnail = "Not available"
-
-    elif isinstance(video, xn_Video):
-        try:
-            author = video.author
-        except Exception:
-            author = "Unknown"
-
-        try:
-            length = video.length
-            # xnxx provides minutes, convert to seconds
-            if isinstance(video.length, (int, float)):
-                duration_seconds = int(video.length * 60)
-        except Exception:
-            length = "Not available"
-            duration_seconds = None
-
-        try:
-            tags = video.tags
-        except Exception:
-            tags = "Not available"
-
-        try:
-            publish_date = video.publish_date
-        except Exception:
-            publish_date = "Not available"
-
-        try:
-            thumbnail = video.thumbnail_url[0] if video.thumbnail_url else None
-        except Exception:
-            thumbnail = "Not available"
-
-    elif isinstance(video, xv_Video):
-        try:
-            author = video.author.name
-        except Exception:
-            author = "Unknown"
-
-        try:
-            length = video.length
-            # xvideos length handling - convert to seconds if numeric
-            if isinstance(video.length, (int, float)):
-                duration_seconds = int(video.length * 60)
-        except Exception:
-            length = "Not available"
-            duration_seconds = None
-
-        try:
-            tags = video.tags
-        except Exception:
-            tags = "Not available"
-
-        try:
-            publish_date = video.publish_date
-        except Exception:
-            publish_date = "Not available"
-
-        try:
-            thumbnail = video.thumbnail_url
-        except Exception:
-            thumbnail = "Not available"
-
-    elif isinstance(video, ep_Video):
-        try:
-            author = video.author
-        except Exception:
-            author = "Unknown"
-
-        try:
-            length = video.length_minutes
-            # eporner provides minutes, convert to seconds
-            if isinstance(video.length_minutes, (int, float)):
-                duration_seconds = int(video.length_minutes * 60)
-        except Exception:
-            length = "Not available"
-            duration_seconds = None
-
-        try:
-            tags = ",".join([tag for tag in video.tags])
-        except Exception:
-            tags = "Not available"
-
-        try:
-            publish_date = video.publish_date
-        except Exception:
-            publish_date = "Not available"
-
-        try:
-            thumbnail = video.thumbnail
-        except Exception:
-            thumbnail = "Not available"
-
-    elif isinstance(video, hq_Video):
-        try:
-            author = video.pornstars[0]
-            actors = video.pornstars if video.pornstars else []
-        except Exception:
-            author = "No pornstars / author"
-            actors = []
-
-        try:
-            length = video.length
-            # hqporner length handling - convert to seconds if numeric
-            if isinstance(video.length, (int, float)):
-                duration_seconds = int(video.length * 60)
-        except Exception:
-            length = "Not available"
-            duration_seconds = None
-
-        try:
-            tags = ",".join([category for category in video.tags])
-        except Exception:
-            tags = "Not available"
-
-        try:
-            publish_date = video.publish_date
-        except Exception:
-            publish_date = "Not available"
-
-        try:
-            thumbnail = video.get_thumbnails()[0]
-        except Exception:
-            thumbnail = "Not available"
-
-    elif isinstance(video, mv_Video):
-        author = "Not available"
-        length = "Not available"
-        tags = "Not available"
-        thumbnail = video.thumbnail
-        publish_date = video.publish_date
-
-    elif isinstance(video, xh_Video):
-        try:
-            author = ",".join(video.pornstars) if video.pornstars else "Unknown"
-            actors = video.pornstars if video.pornstars else []
-        except Exception:
-            author = "Unknown"
-            actors = []
-
-        length = "Not available"
-        tags = "Not available"
-
-        try:
-            thumbnail = video.thumbnail
-        except Exception:
-            thumbnail = "Not available"
-
-        publish_date = "Not available"
-
-    elif isinstance(video, sp_Video):
-        try:
-            author = video.author
-        except Exception:
-            author = "Unknown"
-
-        try:
-            length = video.length
-            # spankbang length handling - convert to seconds if numeric
-            if isinstance(video.length, (int, float)):
-                duration_seconds = int(video.length * 60)
-        except Exception:
-            length = "Not available"
-            duration_seconds = None
-
-        try:
-            tags = ",".join(video.tags)
-        except Exception:
-            tags = "Not available"
+def load_video_metadata(video, use_cache: bool = True) -> VideoMetadata:
+    """
+    Load the metadata (title, author, tags, ...) of a video. Many attributes are fetched lazily by the APIs, so the
+    record is cached by the canonical video key (see get_metadata_cache) and repeated calls for the same video don't touch
+    the network. The record is built once and shared by all callers (it's immutable).
 
-        try:
-            thumbnail = video.thumbnail
-        except Exception:
-            thumbnail = "Not available"
+    Args:
+        video: Video object of one of the APIs
+        use_cache: False to always load the metadata from the site (the result still replaces the cached one)
+    """
+    url = getattr(video, "url", None)
+    if not url:
+        return _extract_metadata(video)
 
-        try:
-            publish_date = video.publish_date
-        except Exception:
-            publish_date = "Not available"
+    key = video_key(str(url))
+    cache = get_metadata_cache()
+    if not use_cache:
+        cache.invalidate(key)
 
-    else:
-        raise "Instance Error! Please report this immediately on GitHub!"
+    return cache.get_or_load(key, lambda: _extract_metadata(video))
 
-    # Parse length for backward compatibility and get seconds if not already set
-    parsed_length = parse_length(length, str(video.url) if hasattr(video, 'url') else None)
 
-    # If duration_seconds not set but we have parsed_length in minutes, convert
-    if duration_seconds is None and isinstance(parsed_length, (int, float)) and parsed_length != "Not available":
-        duration_seconds = int(parsed_length * 60)
+def _extract_metadata(video) -> VideoMetadata:
+    metadata = extract_metadata(video)
+    logger.debug(f"Loaded video data: {metadata}")
+    return metadata
 
-    data = {
-        "title": title,
-        "author": author,
-        "length": parsed_length, # Keep for backward compatibility
-        "duration_seconds": duration_seconds,  # New field in seconds
-        "tags": tags,
-        "actors": actors,  # New field for actors/pornstars
-        "publish_date": publish_date,
-        "thumbnail": thumbnail,
-        "url": video.url if hasattr(video, 'url') else None,  # Add URL for library
-    }
-    logger.debug(f"Loaded video data: {data}")
 
-    return data
+# Seconds write_tags() waits for a thumbnail that is still being fetched
+THUMBNAIL_TAG_TIMEOUT = 30
 
 
-def write_tags(path, data: dict): # Using core from Porn Fetch to keep proxy support
+def write_tags(path, metadata: VideoMetadata): # Using core from Porn Fetch to keep proxy support
     comment = "Downloaded with Porn Fetch (GPLv3)"
     genre = "Porn"
 
-    title = data.get("title")
-    artist = data.get("author")
-    date = data.get("publish_date")
-    thumbnail = data.get("thumbnail")
     logging.debug("Tags [1/3]")
 
     audio = MP4(path)
-    audio.tags["\xa9nam"] = str(title)
-    audio.tags["\xa9ART"] = str(artist)
-    audio.tags["\xa9cmt"] = str(comment)
-    audio.tags["\xa9gen"] = str(genre)
-    audio.tags["\xa9day"] = str(date)
+    audio.tags["\xa9nam"] = metadata.title
+    audio.tags["\xa9ART"] = metadata.author
+    audio.tags["\xa9cmt"] = comment
+    audio.tags["\xa9gen"] = genre
+    if metadata.publish_date is not None:
+        audio.tags["\xa9day"] = metadata.publish_date_text
 
     logging.debug("Tags: [2/3] - Writing Thumbnail")
 
-    # Only try to fetch thumbnail if it's a valid URL
-    if thumbnail and thumbnail != "Not available" and isinstance(thumbnail, str) and (thumbnail.startswith("http://") or thumbnail.startswith("https://")):
+    # The thumbnail was prefetched while the video downloaded (see thumbnail_cache), this only waits if it's still
+    # being fetched
+    thumbnail_path = get_thumbnail_service().path(metadata.key, metadata.thumbnail, timeout=THUMBNAIL_TAG_TIMEOUT)
+
+    if thumbnail_path:
         try:
-            content = BaseCore().fetch(url=thumbnail, get_bytes=True)
-            cover = MP4Cover(content, imageformat=MP4Cover.FORMAT_JPEG)
+            with open(thumbnail_path, "rb") as image:
+                content = image.read()
+
+            image_format = MP4Cover.FORMAT_PNG if content.startswith(b"\x89PNG") else MP4Cover.FORMAT_JPEG
+            cover = MP4Cover(content, imageformat=image_format)
             audio.tags["covr"] = [cover] # Yes, it needs to be in a list
 
         except Exception as e:
-            logger.error("Could not download / write thumbnail into the metadata tags of the video. Please report the"
-                         f"following error on GitHub: {e} - Image URL: {thumbnail}")
+            logger.error("Could not write the thumbnail into the metadata tags of the video. Please report the"
+                         f"following error on GitHub: {e} - Image: {thumbnail_path}")
     else:
-        logger.debug(f"Skipping thumbnail download - invalid or unavailable URL: {thumbnail}")
+        logger.debug(f"Skipping thumbnail - invalid or unavailable URL: {metadata.thumbnail}")
 
     audio.save()
     logging.debug("Tags: [3/3] ✔")
 
 
-def parse_length(length, video_source=None):
-    "Entirely written and copied from ChatGPT. My brain is not ready to fix that myself now, seriously..."
-    """
-    Parse a video length value and return its duration in minutes (rounded).
-
-    Notes:
-      - If length is already numeric (int/float), it is assumed to be in minutes.
-      - If length is a string:
-          * A string of the format "mm:ss" (e.g. "16:19") is parsed as minutes and seconds.
-          * A digits-only string is treated based on the source:
-              - If video_source contains "xnxx", then the value is already in minutes.
-              - If video_source contains "eporner" or "phub", then the value is in seconds.
-              - Otherwise, digits-only defaults to minutes.
-          * A string with a decimal point is assumed to be a minute value.
-          * If the string contains "min" (case-insensitive), the numeric part is extracted and used as minutes.
-          * Otherwise, we try to extract components from mixed formats such as "59m 40s" or "24 seconds".
-      - If no valid duration is found (or if the video source provides no length information),
-        returns "Not available".
-
-    In all conversions, if the computed minute value is > 0 but rounds to 0, returns 1 instead.
-    """
-    if length in (None, "", "Not available"):
-        return "Not available"
-
-    try:
-        # If already numeric (non-string) assume minutes.
-        if isinstance(length, (int, float)):
-            # Ensure that a small positive value returns at least 1 minute.
-            result = round(length)
-            return result if result > 0 else (1 if length > 0 else 0)
-
-        # Work with a stripped string.
-        s = str(length).strip()
-
-        # -------------------------------
-        # Case 1: "mm:ss" format (e.g. "16:19")
-        if ":" in s:
-            parts = s.split(":")
-            if len(parts) == 2 and parts[0].isdigit() and parts[1].isdigit():
-                minutes = int(parts[0])
-                seconds = int(parts[1])
-                total = minutes + seconds / 60.0
-                result = round(total)
-                if result == 0 and total > 0:
-                    result = 1
-                return result
-
-        # -------------------------------
-        # Case 2: Digits-only string.
-        if s.isdigit():
-            num = int(s)
-            if video_source:
-                src = str(video_source).lower()
-                if "xnxx" in src:
-                    # xnxx provides minutes directly.
-                    return num
-                elif "eporner" in src or "phub" in src:
-                    # These sites give seconds; convert to minutes.
-                    result = round(num / 60)
-                    if result == 0 and num > 0:
-                        result = 1
-                    return result
-                else:
-                    # Default: assume minutes.
-                    return num
-            else:
-                # Without a source hint, default to minutes.
-                return num
-
-        # -------------------------------
-        # Case 3: Value with a decimal point (assumed to be minutes).
-        if '.' in s:
-            try:
-                val = float(s)
-                result = round(val)
-                if result == 0 and val > 0:
-                    result = 1
-                return result
-            except ValueError:
-                pass
-
-        # -------------------------------
-        # Case 4: Contains "min" (e.g. "9 Min").
-        if "min" in s.lower():
-            num_str = ''.join(ch for ch in s if ch.isdigit() or ch == '.')
-            if num_str:
-                try:
-                    val = float(num_str)
-                    result = round(val)
-                    if result == 0 and val > 0:
-                        result = 1
-                    return result
-                except ValueError:
-                    pass
-
-        # -------------------------------
-        # Case 5: Mixed time units such as "59m 40s" or "1h 2m 3s"
-        time_units = {'s': 1 / 60, 'm': 1, 'h': 60}
-        total_minutes = 0.0
-        for part in s.split():
-            # Extract numeric (or decimal) part and letter part.
-            value_str = ''.join(ch for ch in part if ch.isdigit() or ch == '.')
-            unit_str = ''.join(ch for ch in part if ch.isalpha()).lower()
-            if value_str and unit_str in time_units:
-                try:
-                    total_minutes += float(value_str) * time_units[unit_str]
-                except ValueError:
-                    continue
-        if total_minutes > 0:
-            result = round(total_minutes)
-            if result == 0 and total_minutes > 0:
-                result = 1
-            return result
-
-        # -------------------------------
-        # Case 6: Formats like "24 seconds"
-        if s.endswith("seconds"):
-            num_str = ''.join(ch for ch in s if ch.isdigit() or ch == '.')
-            if num_str:
-                try:
-                    sec = float(num_str)
-                    result = round(sec / 60)
-                    if result == 0 and sec > 0:
-                        result = 1
-                    return result
-                except ValueError:
-                    pass
-
-        # -------------------------------
-        # Case 7: Formats ending with "min" (e.g. "17 min")
-        if s.endswith("min"):
-            num_part = s[:-3].strip()
-            if num_part.isdigit():
-                return int(num_part)
-
-        # If nothing matches, return None.
-        return None
-
-    except Exception:
-        return 0
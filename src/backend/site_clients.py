@@ -0,0 +1,147 @@
+"""
+Lazy site clients for Porn Fetch
+
+Importing the eight site API packages and building their clients (each with its own BaseCore session) takes a
+noticeable part of the start-up time, although a run usually needs one or two sites. The site packages are only
+imported when a site is used for the first time and clients / cores are built on first use as well.
+
+A configuration change (proxy, timeout, speed limit, kill switch ...) only drops the clients that were built already,
+the next use of a site builds its client again with the new configuration.
+"""
+
+import sys
+import logging
+import importlib
+import threading
+from typing import Any, Dict, Tuple
+from base_api.base import BaseCore, setup_logger
+from base_api.modules.config import config
+from src.backend.http_pool import attach_shared_transport
+
+logger = setup_logger(name="Porn Fetch - [Site Clients]", log_file="PornFetch.log", level=logging.DEBUG)
+
+# Site name (see video_keys.SITE_HOSTS) -> (module with the Client and Video classes, keyword arguments of the client)
+SITE_MODULES = {
+    "pornhub": ("phub", {"use_webmaster_api": True}),
+    "hqporner": ("hqporner_api", {}),
+    "xnxx": ("xnxx_api", {}),
+    "xvideos": ("xvideos_api", {}),
+    "eporner": ("eporner_api", {}),
+    "missav": ("missav_api.missav_api", {}),
+    "xhamster": ("xhamster_api", {}),
+    "spankbang": ("spankbang_api", {}),
+}
+
+# Prefixes of the module-level names in shared_functions (ph_client, xv_Video, ...)
+SITE_PREFIXES = {"ph": "pornhub", "hq": "hqporner", "xn": "xnxx", "xv": "xvideos", "ep": "eporner", "mv": "missav",
+                 "xh": "xhamster", "sp": "spankbang"}
+
+
+def site_module(site: str):
+    """
+    Import (once) and return the API package of a site
+    """
+    return importlib.import_module(SITE_MODULES[site][0])
+
+
+def is_site_video(video: Any, site: str) -> bool:
+    """
+    isinstance() check against the Video class of a site without importing its package: if the package isn't
+    imported yet, video can't be one of its videos.
+    """
+    module = sys.modules.get(SITE_MODULES[site][0])
+    return module is not None and isinstance(video, module.Video)
+
+
+def loaded_video_classes() -> Tuple[type, ...]:
+    """
+    Video classes of all site packages that are imported already
+    """
+    return tuple(sys.modules[name].Video for name, _ in SITE_MODULES.values() if name in sys.modules)
+
+
+def loaded_class(module: str, name: str):
+    """
+    A class of a module if the module is imported already, else None (e.g., error classes of a site package for
+    isinstance() checks: an error of a site can only be raised once its package is imported)
+    """
+    loaded = sys.modules.get(module)
+    return getattr(loaded, name, None) if loaded is not None else None
+
+
+class SiteClients:
+    """Builds the client of a site and the BaseCore sessions on first use (thread-safe)"""
+
+    def __init__(self):
+        self._clients: Dict[str, Any] = {}
+        self._cores: Dict[str, BaseCore] = {}
+        self._lock = threading.RLock()
+        self.kill_switch = False
+
+    def client(self, site: str):
+        """
+        The client of a site, built with its own BaseCore (isolated headers / cookies) on first use
+        """
+        client = self._clients.get(site)
+        if client is not None:
+            return client
+
+        with self._lock:
+            client = self._clients.get(site)
+            if client is None:
+                _, kwargs = SITE_MODULES[site]
+                client = site_module(site).Client(core=self.core(site), **kwargs)
+                self._clients[site] = client
+                logger.debug(f"Built the {site} client")
+
+            return client
+
+    def set_client(self, site: str, client):
+        """
+        Replace the client of a site (e.g., a logged in PornHub client). It's dropped on the next invalidate().
+        """
+        with self._lock:
+            self._clients[site] = client
+
+    def core(self, name: str) -> BaseCore:
+        """
+        A BaseCore with the current configuration: one per site, plus "common" (thumbnails, ...) and "internet_checks".
+        All cores send their requests through the shared transport (see http_pool), but keep their own headers / cookies.
+        """
+        core = self._cores.get(name)
+        if core is not None:
+            return core
+
+        with self._lock:
+            core = self._cores.get(name)
+            if core is None:
+                core = BaseCore(config=config, auto_init=True)
+                attach_shared_transport(core)
+                if self.kill_switch:
+                    core.enable_kill_switch()
+
+                self._cores[name] = core
+
+            return core
+
+    def invalidate(self, kill_switch: bool = False):
+        """
+        Drop all clients and cores built so far, they are built again with the current configuration on their next use
+        """
+        with self._lock:
+            if self._clients:
+                logger.debug(f"Dropping the clients of {', '.join(sorted(self._clients))} after a configuration change")
+
+            self.kill_switch = kill_switch
+            self._clients.clear()
+            self._cores.clear()
+
+    def built(self) -> Tuple[str, ...]:
+        """
+        Sites whose client is built
+        """
+        with self._lock:
+            return tuple(self._clients)
+
+
+site_clients = SiteClients()
@@ -0,0 +1,349 @@
+"""
+Thumbnails for Porn Fetch
+
+Thumbnails used to be downloaded twice (by the GUI preview and again by write_tags() after the download, which added
+its latency to every job) and the library only kept the remote URL, which often expires (validto=...).
+
+The ThumbnailService fetches a thumbnail in the background as soon as the metadata of a video is known, in parallel to
+the video download. Images are stored content-addressed (BLAKE2b of the bytes, so the same image used by several videos
+is stored once) in a directory bounded by size, least recently used images are evicted first. An SQLite index maps
+video keys to images. Tagging and the GUI read the local file, the library records its path. Images the library refers
+to are pinned: they are never evicted and don't count towards the size limit.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Optional
+from base_api.base import setup_logger
+from src.backend.config import shared_config, config_directory
+from src.backend.video_keys import split_video_key
+from src.backend.site_clients import site_clients
+
+logger = setup_logger(name="Porn Fetch - [Thumbnails]", log_file="PornFetch.log", level=logging.DEBUG)
+
+# Sites whose image hosts only answer with a Referer of the site
+THUMBNAIL_REFERERS = {"hqporner": "https://hqporner.com"}
+
+
+def image_extension(content: bytes) -> str:
+    if content.startswith(b"\x89PNG"):
+        return ".png"
+
+    if content[8:12] == b"WEBP":
+        return ".webp"
+
+    return ".jpg"
+
+
+class ThumbnailCache:
+    """Content-addressed image files with an SQLite index: video key -> image, bounded by total size (LRU)"""
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            directory: Where the images and the index (index.db) are stored
+            max_bytes: Total size of the images that aren't pinned, the least recently used ones are evicted first
+        """
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max(1, max_bytes)
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(self.directory, "index.db"), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS images (digest TEXT PRIMARY KEY, name TEXT NOT NULL, "
+                                "size INTEGER NOT NULL, accessed REAL NOT NULL)")
+        if "pinned" not in [column[1] for column in self.connection.execute("PRAGMA table_info(images)")]:
+            self.connection.execute("ALTER TABLE images ADD COLUMN pinned INTEGER NOT NULL DEFAULT 0")
+
+        self.connection.execute("CREATE TABLE IF NOT EXISTS thumbnails (key TEXT PRIMARY KEY, digest TEXT NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS images_accessed ON images (accessed)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS thumbnails_digest ON thumbnails (digest)")
+        self.connection.commit()
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM images "
+                                                   "WHERE pinned = 0").fetchone()[0]
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name[:2], name)
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns:
+            Path of the cached image of a video, None if it isn't cached
+        """
+        now = time.time()
+        with self._lock:
+            row = self.connection.execute("SELECT images.digest, images.name FROM thumbnails JOIN images "
+                                          "ON images.digest = thumbnails.digest WHERE thumbnails.key = ?",
+                                          (key,)).fetchone()
+            if row is None:
+                return None
+
+            digest, name = row
+            path = self._path(name)
+            if not os.path.isfile(path):  # Deleted by hand
+                self._delete_images([digest])
+                self.connection.commit()
+                return None
+
+            # At most once a minute per image, so that reads don't turn into writes
+            if self.connection.execute("UPDATE images SET accessed = ? WHERE digest = ? AND accessed < ?",
+                                       (now, digest, now - 60)).rowcount:
+                self.connection.commit()
+
+            return path
+
+    def put(self, key: str, content: bytes) -> str:
+        """
+        Store the image of a video (written once per distinct content)
+
+        Returns:
+            Path of the cached image
+        """
+        digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+        name = digest + image_extension(content)
+        path = self._path(name)
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+
+            os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._lock:
+            if self.connection.execute("SELECT 1 FROM images WHERE digest = ?", (digest,)).fetchone() is None:
+                self.connection.execute("INSERT INTO images (digest, name, size, accessed) VALUES (?, ?, ?, ?)",
+                                        (digest, name, len(content), now))
+                self.total_bytes += len(content)
+
+            else:
+                self.connection.execute("UPDATE images SET accessed = ? WHERE digest = ?", (now, digest))
+
+            self.connection.execute("INSERT OR REPLACE INTO thumbnails (key, digest) VALUES (?, ?)", (key, digest))
+            if self.total_bytes > self.max_bytes:
+                self._evict(keep=digest)
+
+            self.connection.commit()
+
+        return path
+
+    def pin(self, key: str) -> Optional[str]:
+        """
+        Keep the image of a video for good (the library refers to it), it's never evicted afterwards
+
+        Returns:
+            Path of the cached image, None if it isn't cached
+        """
+        path = self.get(key)
+        if path is None:
+            return None
+
+        with self._lock:
+            row = self.connection.execute("SELECT images.digest, images.size FROM thumbnails JOIN images "
+                                          "ON images.digest = thumbnails.digest WHERE thumbnails.key = ? "
+                                          "AND images.pinned = 0", (key,)).fetchone()
+            if row is not None:
+                self.connection.execute("UPDATE images SET pinned = 1 WHERE digest = ?", (row[0],))
+                self.connection.commit()
+                self.total_bytes -= row[1]
+
+        return path
+
+    def _evict(self, keep: str):
+        """
+        Delete the least recently used images until 90 % of max_bytes are left (slack, so that eviction doesn't run
+        for every new image)
+        """
+        excess = self.total_bytes - int(self.max_bytes * 0.9)
+        evicted = []
+        for digest, size in self.connection.execute("SELECT digest, size FROM images WHERE pinned = 0 "
+                                                    "ORDER BY accessed").fetchall():
+            if excess <= 0:
+                break
+
+            if digest != keep:
+                evicted.append(digest)
+                excess -= size
+
+        self._delete_images(evicted)
+        logger.debug(f"Evicted {len(evicted)} thumbnails from the cache")
+
+    def _delete_images(self, digests):
+        for digest in digests:
+            row = self.connection.execute("SELECT name, size, pinned FROM images WHERE digest = ?",
+                                          (digest,)).fetchone()
+            if row is None:
+                continue
+
+            name, size, pinned = row
+            try:
+                os.remove(self._path(name))
+
+            except FileNotFoundError:
+                pass
+
+            except OSError as e:
+                logger.warning(f"Could not delete the thumbnail {name}: {e}")
+
+            self.connection.execute("DELETE FROM images WHERE digest = ?", (digest,))
+            self.connection.execute("DELETE FROM thumbnails WHERE digest = ?", (digest,))
+            if not pinned:
+                self.total_bytes -= size
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+def fetch_thumbnail(url: str, site: str) -> bytes:
+    """
+    Download a thumbnail with a core of its own per site (Referer, cookies), over the shared connection pool
+
+    Args:
+        url: Image URL (usually on a CDN host, not the site itself)
+        site: Site of the video
+    """
+    referer = THUMBNAIL_REFERERS.get(site)
+    return site_clients.core(f"thumbnails_{site}").fetch(url, get_bytes=True,
+                                                        headers={"Referer": referer} if referer else None)
+
+
+class ThumbnailService:
+    """Fetches thumbnails in a thread pool into a ThumbnailCache, every video's thumbnail at most once at a time"""
+
+    def __init__(self, cache: ThumbnailCache, workers: int = 4,
+                 fetch: Callable[[str, str], bytes] = fetch_thumbnail):
+        """
+        Args:
+            cache: Where the images are stored
+            workers: Number of thumbnails fetched at the same time
+            fetch: Downloads an image URL (arguments: URL, site of the video) and returns its bytes
+        """
+        self.cache = cache
+        self.fetch = fetch
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="Thumbnail")
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def prefetch(self, key: str, url: Optional[str]) -> Optional[Future]:
+        """
+        Start fetching the thumbnail of a video in the background (nothing happens if it's cached or being fetched)
+
+        Args:
+            key: Canonical video key (see video_keys.video_key())
+            url: Thumbnail URL
+
+        Returns:
+            A future with the path of the cached image, None if url isn't an HTTP(S) URL
+        """
+        if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+            return None
+
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return future
+
+        path = self.cache.get(key)
+        if path is not None:
+            future = Future()
+            future.set_result(path)
+            return future
+
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = self._executor.submit(self._load, key, url)
+                future.add_done_callback(lambda _: self._forget(key))
+
+            return future
+
+    def _forget(self, key: str):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def _load(self, key: str, url: str) -> str:
+        try:
+            return self.cache.put(key, self.fetch(url, split_video_key(key)[0]))
+
+        except Exception as e:
+            logger.warning(f"Could not fetch the thumbnail of {key} ({url}): {e}")
+            raise
+
+    def path(self, key: str, url: Optional[str] = None, timeout: Optional[float] = 0) -> Optional[str]:
+        """
+        Local path of a video's thumbnail
+
+        Args:
+            key: Canonical video key
+            url: Thumbnail URL, starts a prefetch if the image isn't cached yet (None to only look at the cache)
+            timeout: Seconds to wait for a running prefetch (0 to never wait, None to wait until it's done)
+
+        Returns:
+            The path, None if the image isn't (yet) available
+        """
+        path = self.cache.get(key)
+        if path is not None:
+            return path
+
+        with self._lock:
+            future = self._pending.get(key)
+
+        if future is None and url is not None:
+            future = self.prefetch(key, url)
+
+        if future is None:
+            return None
+
+        try:
+            return future.result(timeout=timeout)
+
+        except FutureTimeoutError:
+            return None
+
+        except Exception:
+            return None  # Already logged in _load()
+
+    def library_path(self, key: str) -> Optional[str]:
+        """
+        Local path of a video's thumbnail for a library entry. The image is pinned, so the path stays valid.
+
+        Args:
+            key: Canonical video key
+
+        Returns:
+            The path, None if the image isn't cached
+        """
+        return self.cache.pin(key)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.cache.close()
+
+
+_thumbnail_service = None
+_thumbnail_service_lock = threading.Lock()
+
+def get_thumbnail_service() -> ThumbnailService:
+    """
+    Get or create the global ThumbnailService (configured in the Performance section of config.ini)
+    """
+    global _thumbnail_service
+    with _thumbnail_service_lock:
+        if _thumbnail_service is None:
+            directory = shared_config.get("Performance", "thumbnail_cache_path", fallback="thumbnails")
+            if not os.path.isabs(directory):
+                directory = os.path.join(config_directory, directory)  # Next to config.ini
+
+            cache = ThumbnailCache(directory, max_bytes=shared_config.getint("Performance", "thumbnail_cache_size",
+                                                                             fallback=256) * 1024 * 1024)
+            _thumbnail_service = ThumbnailService(
+                cache, workers=shared_config.getint("Performance", "thumbnail_workers", fallback=4))
+
+        return _thumbnail_service
@@ -0,0 +1,186 @@
+"""
+Canonical video keys for Porn Fetch
+
+A video key identifies a video by (site, site-native video ID), e.g. "pornhub:ph5f1e2d3c4b5a6" or "xvideos:ouhbdfc0c2f".
+It is derived from the URL only, so it's the same in every run and for every variant of a URL (mirror domains,
+locale subdomains / paths, tracking query strings, trailing slashes ...). The library uses it as the video ID and the
+GUI uses it to identify videos while they are processed.
+
+This module has no dependencies on the site APIs, so the library manager can use it without importing all clients.
+"""
+
+import re
+import hashlib
+from functools import lru_cache
+from typing import Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+# Site name -> patterns that extract the native video ID from the URL path
+SITE_ID_PATTERNS = {
+    "pornhub": (re.compile(r"^/embed/([A-Za-z0-9]+)"),),  # viewkey is handled separately
+    "hqporner": (re.compile(r"^/hdporn/(\d+)"),),
+    "xnxx": (re.compile(r"^/(?:video-|embedframe/)([A-Za-z0-9]+)"),),
+    "xvideos": (re.compile(r"^/(?:video\.?|embedframe/)([A-Za-z0-9]+)"),),
+    "eporner": (re.compile(r"^/(?:video-|hd-porn/|embed/)([A-Za-z0-9]+)"),),
+    "missav": (re.compile(r"/([A-Za-z0-9]+(?:-[A-Za-z0-9]+)+)/?$"),),  # e.g. /de/sone-123 or /dm12/en/fc2-ppv-1234
+    "xhamster": (re.compile(r"^/(?:videos|movies)/(?:[^/]*-)?([A-Za-z0-9]+)/?$"), re.compile(r"^/embed/([A-Za-z0-9]+)")),
+    "spankbang": (re.compile(r"^/([A-Za-z0-9]+)/(?:video|play|embed)\b"), re.compile(r"^/embed/([A-Za-z0-9]+)")),
+}
+
+CASE_INSENSITIVE_SITES = {"missav", "spankbang", "xnxx", "eporner"}
+
+# host, path and query of a URL. video_key() runs for every library entry on load, urlsplit() is too slow for that.
+URL_PARTS = re.compile(r"^[A-Za-z][A-Za-z0-9+.-]*://(?:[^@/?#]*@)?([^/?#:]*)(?::\d*)?([^?#]*)(?:\?([^#]*))?")
+
+# Registered domain -> site name. Subdomains (www., de., m., ...) are matched by their suffix: "de.pornhub.com" is
+# looked up as "de.pornhub.com", then "pornhub.com".
+SITE_HOSTS = {
+    "pornhub.com": "pornhub",
+    "pornhub.org": "pornhub",
+    "hqporner.com": "hqporner",
+    "xnxx.com": "xnxx",
+    "xnxx.tv": "xnxx",
+    "xvideos.com": "xvideos",
+    "xvideos.es": "xvideos",
+    "eporner.com": "eporner",
+    "missav.com": "missav",
+    "missav.ws": "missav",
+    "missav.ai": "missav",
+    "xhamster.com": "xhamster",
+    "xhamster.desi": "xhamster",
+    "spankbang.com": "spankbang",
+}
+
+# Numbered mirrors (xvideos2.com, xhamster3.desi, missav123.com, ...): the label in front of the TLD is exactly a
+# site name followed by digits
+MIRROR_LABEL = re.compile(r"^(" + "|".join(SITE_ID_PATTERNS) + r")\d+$")
+VIEWKEY = re.compile(r"(?:^|&)viewkey=([^&]+)")
+
+# Query parameters that never change which video a URL points to
+TRACKING_PARAMETERS = {"utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content", "ref", "t", "pkey",
+                       "sid", "fbclid", "gclid"}
+
+
+def detect_site(url: str) -> Optional[str]:
+    """
+    Return the site name of a URL (e.g. "pornhub"), or None if it's not a supported site
+    """
+    parts = URL_PARTS.match(url)
+    return _site_of_host(parts.group(1)) if parts else None
+
+
+@lru_cache(maxsize=4096)
+def _site_of_host(host: str) -> Optional[str]:
+    """
+    Site name of a host name (exact domain or one of its subdomains, or a numbered mirror), None for other hosts.
+    There are only a few distinct hosts, so after the first URL of a host this is one dictionary lookup.
+    """
+    host = host.lower().rstrip(".")
+    suffix = host
+    while suffix:
+        site = SITE_HOSTS.get(suffix)
+        if site is not None:
+            return site
+
+        suffix = suffix.partition(".")[2]
+
+    labels = host.rsplit(".", 2)
+    if len(labels) >= 2:
+        match = MIRROR_LABEL.match(labels[-2])
+        if match:
+            return match.group(1)
+
+    return None
+
+
+def parse_video_url(url: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Classify a URL in one pass
+
+    Returns:
+        (site name or None if it's not a supported site, native video ID or None if the path has none)
+    """
+    parts = URL_PARTS.match(url)
+    if parts is None:
+        return None, None
+
+    host, path, query = parts.groups()
+    site = _site_of_host(host)
+    return site, (_native_id(site, path, query) if site is not None else None)
+
+
+def split_video_key(key: str) -> Tuple[str, str]:
+    """
+    Split a video key into (site, native video ID)
+    """
+    site, _, native_id = key.partition(":")
+    return site, native_id
+
+
+def _native_id(site: str, path: str, query: Optional[str]) -> Optional[str]:
+    if site == "pornhub" and query:
+        match = VIEWKEY.search(query)
+        if match:
+            return match.group(1)
+
+    for pattern in SITE_ID_PATTERNS[site]:
+        match = pattern.search(path)
+        if match:
+            native_id = match.group(1)
+            return native_id.lower() if site in CASE_INSENSITIVE_SITES else native_id
+
+    return None
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalize a URL for comparisons: lowercase host without "www.", no fragment, no tracking parameters,
+    sorted query and no trailing slash
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+
+    query = sorted((name, value) for name, value in parse_qsl(parts.query) if name.lower() not in TRACKING_PARAMETERS)
+    path = parts.path.rstrip("/")
+    return f"{host}{path}" + (f"?{urlencode(query)}" if query else "")
+
+
+def video_key(url: str) -> str:
+    """
+    Build the canonical key of a video
+
+    Args:
+        url: Video URL (or the title, if a video has no URL at all)
+
+    Returns:
+        "<site>:<native video ID>". URLs of unsupported sites (or without a recognizable ID) fall back to
+        "<site or host>:<normalized URL>", anything that isn't a URL to "title:<digest>".
+    """
+    url = str(url).strip()
+    parts = URL_PARTS.match(url)
+    if parts is None:
+        return f"title:{hashlib.blake2b(url.casefold().encode('utf-8'), digest_size=10).hexdigest()}"
+
+    host, path, query = parts.groups()
+    site = _site_of_host(host)
+    if site is not None:
+        native_id = _native_id(site, path, query)
+        if native_id:
+            return f"{site}:{native_id}"
+
+    # The host, not the start of the normalized URL: without a path, that would include the query
+    if site is None:
+        site = host.lower().rstrip(".")
+        if site.startswith("www."):
+            site = site[4:]
+
+    return f"{site}:{normalize_url(url)}"
+
+
+def video_key_as_filename(key: str) -> str:
+    """
+    Turn a video key into something that can be used as a file name on every OS (e.g. "pornhub_ph5f1e2d3c4b5a6")
+    """
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", key).strip("_.")
@@ -0,0 +1,461 @@
+"""
+Video metadata for Porn Fetch
+
+The site APIs return their attributes in many shapes: lengths in seconds, minutes or as "mm:ss" strings, tags as
+lists or comma separated strings, actors as objects or names, dates as datetime objects or strings. A VideoMetadata
+record is built once per video by the extractor of its site (see SITE_EXTRACTORS) with all fields normalized, and is
+then used as it is for listing, downloading, tagging and the library. Records are immutable, so the metadata cache
+hands out the same record to every caller.
+
+Records are stored as JSON dictionaries in the metadata store (to_dict() / from_dict()). from_dict() also reads the
+attribute dictionaries of older versions.
+"""
+
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+from src.backend.video_keys import video_key
+from src.backend.site_clients import is_site_video
+
+NOT_AVAILABLE = "Not available"
+
+# Formats of the publish dates the site APIs return as strings (ISO 8601 is tried first)
+DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%B %d, %Y", "%b %d, %Y", "%d %B %Y",
+                "%d %b %Y")
+
+
+@dataclass(frozen=True, slots=True)
+class VideoMetadata:
+    """
+    Normalized metadata of one video.
+
+    key: Canonical video key (see video_keys.video_key())
+    duration_seconds: None if the site doesn't provide the length
+    tags / actors: Names (interned, the same names appear in many videos)
+    publish_date: None if the site doesn't provide it or it couldn't be parsed
+    thumbnail: Thumbnail URL, None if not available
+    """
+
+    key: str
+    url: Optional[str]
+    title: str
+    author: str
+    duration_seconds: Optional[int]
+    tags: Tuple[str, ...]
+    actors: Tuple[str, ...]
+    publish_date: Optional[datetime]
+    thumbnail: Optional[str]
+
+    @property
+    def duration_minutes(self) -> Optional[int]:
+        """
+        The length in whole minutes (at least 1 for videos shorter than a minute), None if not available
+        """
+        if self.duration_seconds is None:
+            return None
+
+        minutes = round(self.duration_seconds / 60)
+        return minutes if minutes > 0 or self.duration_seconds <= 0 else 1
+
+    @property
+    def publish_date_text(self) -> Optional[str]:
+        """
+        The publish date as the library stores it ("2024-05-01 00:00:00"), None if not available
+        """
+        return str(self.publish_date) if self.publish_date is not None else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Plain JSON values, for the metadata store
+        """
+        return {
+            "key": self.key,
+            "url": self.url,
+            "title": self.title,
+            "author": self.author,
+            "duration_seconds": self.duration_seconds,
+            "tags": list(self.tags),
+            "actors": list(self.actors),
+            "publish_date": self.publish_date.isoformat() if self.publish_date is not None else None,
+            "thumbnail": self.thumbnail,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "VideoMetadata":
+        """
+        Build a record from to_dict() output, or from an attribute dictionary of an older version (tags as a comma
+        separated string, "Not available" placeholders, "length" in minutes, no "key")
+        """
+        url = data.get("url") or None
+        title = str(data.get("title") or "")
+        duration_seconds = data.get("duration_seconds")
+        if duration_seconds is None:
+            duration_seconds = minutes_to_seconds(data.get("length"))
+
+        return cls(
+            key=data.get("key") or video_key(str(url or title)),
+            url=url,
+            title=title,
+            author=str(data.get("author") or "Unknown"),
+            duration_seconds=duration_seconds,
+            tags=names(data.get("tags")),
+            actors=names(data.get("actors")),
+            publish_date=parse_publish_date(data.get("publish_date")),
+            thumbnail=thumbnail_url(data.get("thumbnail")),
+        )
+
+
+def names(value: Any) -> Tuple[str, ...]:
+    """
+    Normalize tags / actors: a comma separated string, or a list of names or objects with a name attribute
+    """
+    if value is None or value == NOT_AVAILABLE:
+        return ()
+
+    if isinstance(value, str):
+        value = value.split(",")
+
+    try:
+        stripped = (str(getattr(item, "name", item)).strip() for item in value)
+        return tuple(sys.intern(name) for name in stripped if name)
+
+    except TypeError:  # Not iterable
+        return ()
+
+
+def parse_publish_date(value: Any) -> Optional[datetime]:
+    """
+    Returns:
+        The publish date as a datetime, None if it's missing or in an unknown format (e.g. "3 days ago")
+    """
+    if isinstance(value, datetime):
+        return value
+
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+
+    if not isinstance(value, str) or not value.strip() or value == NOT_AVAILABLE:
+        return None
+
+    value = value.strip()
+    try:
+        return datetime.fromisoformat(value)
+
+    except ValueError:
+        pass
+
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+
+        except ValueError:
+            continue
+
+    return None
+
+
+def thumbnail_url(value: Any) -> Optional[str]:
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else None
+
+    return value if isinstance(value, str) and value.startswith(("http://", "https://")) else None
+
+
+def minutes_to_seconds(length: Any, video_source: Optional[str] = None) -> Optional[int]:
+    """
+    Convert a length as the site APIs return it (minutes as a number, or anything parse_length() understands) into
+    seconds
+    """
+    if isinstance(length, bool):
+        return None
+
+    if isinstance(length, (int, float)):
+        return int(length * 60) if length >= 0 else None
+
+    minutes = parse_length(length, video_source)
+    return minutes * 60 if isinstance(minutes, int) and not isinstance(minutes, bool) else None
+
+
+def _attribute(getter: Callable[[], Any], default: Any = None) -> Any:
+    """
+    Read a lazily fetched attribute of a site API, default if the site doesn't provide it
+    """
+    try:
+        return getter()
+
+    except Exception:
+        return default
+
+
+def _record(video, author, duration_seconds, tags, actors, publish_date, thumbnail) -> VideoMetadata:
+    url = getattr(video, "url", None)
+    url = str(url) if url else None
+    title = str(video.title)
+    return VideoMetadata(
+        key=video_key(url or title),
+        url=url,
+        title=title,
+        author=str(author) if author else "Unknown",
+        duration_seconds=duration_seconds,
+        tags=names(tags),
+        actors=names(actors),
+        publish_date=parse_publish_date(publish_date),
+        thumbnail=thumbnail_url(thumbnail),
+    )
+
+
+def _pornhub_author(video):
+    try:
+        return video.author.name
+
+    except Exception:
+        pornstars = _attribute(lambda: video.pornstars)  # First pornstar as fallback
+        return getattr(pornstars[0], "name", pornstars[0]) if pornstars else "Unknown"
+
+
+def _pornhub_thumbnail(video):
+    video.refresh()  # Throws an error otherwise. I have no idea why.
+    return video.image.url
+
+
+def extract_pornhub(video) -> VideoMetadata:
+    return _record(video,
+                   author=_pornhub_author(video),
+                   duration_seconds=_attribute(lambda: video.duration.seconds),
+                   tags=_attribute(lambda: [tag.name for tag in video.tags]),
+                   actors=_attribute(lambda: video.pornstars),
+                   publish_date=_attribute(lambda: video.date),
+                   thumbnail=_attribute(lambda: _pornhub_thumbnail(video)))
+
+
+def extract_xnxx(video) -> VideoMetadata:
+    return _record(video,
+                   author=_attribute(lambda: video.author, "Unknown"),
+                   duration_seconds=minutes_to_seconds(_attribute(lambda: video.length), "xnxx"),
+                   tags=_attribute(lambda: video.tags),
+                   actors=None,
+                   publish_date=_attribute(lambda: video.publish_date),
+                   thumbnail=_attribute(lambda: video.thumbnail_url))
+
+
+def extract_xvideos(video) -> VideoMetadata:
+    return _record(video,
+                   author=_attribute(lambda: video.author.name, "Unknown"),
+                   duration_seconds=minutes_to_seconds(_attribute(lambda: video.length), "xvideos"),
+                   tags=_attribute(lambda: video.tags),
+                   actors=None,
+                   publish_date=_attribute(lambda: video.publish_date),
+                   thumbnail=_attribute(lambda: video.thumbnail_url))
+
+
+def extract_eporner(video) -> VideoMetadata:
+    return _record(video,
+                   author=_attribute(lambda: video.author, "Unknown"),
+                   duration_seconds=minutes_to_seconds(_attribute(lambda: video.length_minutes), "eporner"),
+                   tags=_attribute(lambda: video.tags),
+                   actors=None,
+                   publish_date=_attribute(lambda: video.publish_date),
+                   thumbnail=_attribute(lambda: video.thumbnail))
+
+
+def extract_hqporner(video) -> VideoMetadata:
+    pornstars = _attribute(lambda: video.pornstars)
+    return _record(video,
+                   author=pornstars[0] if pornstars else "No pornstars / author",
+                   duration_seconds=minutes_to_seconds(_attribute(lambda: video.length), "hqporner"),
+                   tags=_attribute(lambda: video.tags),
+                   actors=pornstars,
+                   publish_date=_attribute(lambda: video.publish_date),
+                   thumbnail=_attribute(lambda: video.get_thumbnails()))
+
+
+def extract_missav(video) -> VideoMetadata:
+    return _record(video,
+                   author=NOT_AVAILABLE,
+                   duration_seconds=None,
+                   tags=None,
+                   actors=None,
+                   publish_date=_attribute(lambda: video.publish_date),
+                   thumbnail=_attribute(lambda: video.thumbnail))
+
+
+def extract_xhamster(video) -> VideoMetadata:
+    pornstars = _attribute(lambda: video.pornstars)
+    return _record(video,
+                   author=",".join(names(pornstars)) or "Unknown",
+                   duration_seconds=None,
+                   tags=None,
+                   actors=pornstars,
+                   publish_date=None,
+                   thumbnail=_attribute(lambda: video.thumbnail))
+
+
+def extract_spankbang(video) -> VideoMetadata:
+    return _record(video,
+                   author=_attribute(lambda: video.author, "Unknown"),
+                   duration_seconds=minutes_to_seconds(_attribute(lambda: video.length), "spankbang"),
+                   tags=_attribute(lambda: video.tags),
+                   actors=None,
+                   publish_date=_attribute(lambda: video.publish_date),
+                   thumbnail=_attribute(lambda: video.thumbnail))
+
+
+# Site name (see video_keys.SITE_HOSTS) -> extractor for a video object of that site
+SITE_EXTRACTORS: Dict[str, Callable[[Any], VideoMetadata]] = {
+    "pornhub": extract_pornhub,
+    "xnxx": extract_xnxx,
+    "xvideos": extract_xvideos,
+    "eporner": extract_eporner,
+    "hqporner": extract_hqporner,
+    "missav": extract_missav,
+    "xhamster": extract_xhamster,
+    "spankbang": extract_spankbang,
+}
+
+
+def extract_metadata(video) -> VideoMetadata:
+    """
+    Build the VideoMetadata of a video object of one of the site APIs (fetches the lazily loaded attributes)
+    """
+    for site, extract in SITE_EXTRACTORS.items():
+        if is_site_video(video, site):
+            return extract(video)
+
+    raise TypeError(f"Instance Error! Please report this immediately on GitHub! ({type(video).__name__})")
+
+
+def parse_length(length, video_source=None):
+    """
+    Parse the length of a video as the site APIs return it into minutes (rounded, at least 1 for any positive length)
+
+    Numbers are minutes. Strings can be "mm:ss", a decimal number of minutes, "9 Min" or mixed units ("59m 40s",
+    "1h 2m 3s"). A digits-only string is in seconds for EPorner / PornHub (video_source contains "eporner" or "phub")
+    and in minutes for all other sites.
+
+    Args:
+        length: The length as returned by the site API
+        video_source: URL (or name) of the video's site, decides the unit of digits-only strings
+
+    Returns:
+        The length in minutes, "Not available" if the site provides none, None if it can't be parsed
+    """
+    if length in (None, "", "Not available"):
+        return "Not available"
+
+    try:
+        # If already numeric (non-string) assume minutes.
+        if isinstance(length, (int, float)):
+            # Ensure that a small positive value returns at least 1 minute.
+            result = round(length)
+            return result if result > 0 else (1 if length > 0 else 0)
+
+        # Work with a stripped string.
+        s = str(length).strip()
+
+        # -------------------------------
+        # Case 1: "mm:ss" format (e.g. "16:19")
+        if ":" in s:
+            parts = s.split(":")
+            if len(parts) == 2 and parts[0].isdigit() and parts[1].isdigit():
+                minutes = int(parts[0])
+                seconds = int(parts[1])
+                total = minutes + seconds / 60.0
+                result = round(total)
+                if result == 0 and total > 0:
+                    result = 1
+                return result
+
+        # -------------------------------
+        # Case 2: Digits-only string.
+        if s.isdigit():
+            num = int(s)
+            if video_source:
+                src = str(video_source).lower()
+                if "xnxx" in src:
+                    # xnxx provides minutes directly.
+                    return num
+                elif "eporner" in src or "phub" in src:
+                    # These sites give seconds; convert to minutes.
+                    result = round(num / 60)
+                    if result == 0 and num > 0:
+                        result = 1
+                    return result
+                else:
+                    # Default: assume minutes.
+                    return num
+            else:
+                # Without a source hint, default to minutes.
+                return num
+
+        # -------------------------------
+        # Case 3: Value with a decimal point (assumed to be minutes).
+        if '.' in s:
+            try:
+                val = float(s)
+                result = round(val)
+                if result == 0 and val > 0:
+                    result = 1
+                return result
+            except ValueError:
+                pass
+
+        # -------------------------------
+        # Case 4: Contains "min" (e.g. "9 Min").
+        if "min" in s.lower():
+            num_str = ''.join(ch for ch in s if ch.isdigit() or ch == '.')
+            if num_str:
+                try:
+                    val = float(num_str)
+                    result = round(val)
+                    if result == 0 and val > 0:
+                        result = 1
+                    return result
+                except ValueError:
+                    pass
+
+        # -------------------------------
+        # Case 5: Mixed time units such as "59m 40s" or "1h 2m 3s"
+        time_units = {'s': 1 / 60, 'm': 1, 'h': 60}
+        total_minutes = 0.0
+        for part in s.split():
+            # Extract numeric (or decimal) part and letter part.
+            value_str = ''.join(ch for ch in part if ch.isdigit() or ch == '.')
+            unit_str = ''.join(ch for ch in part if ch.isalpha()).lower()
+            if value_str and unit_str in time_units:
+                try:
+                    total_minutes += float(value_str) * time_units[unit_str]
+                except ValueError:
+                    continue
+        if total_minutes > 0:
+            result = round(total_minutes)
+            if result == 0 and total_minutes > 0:
+                result = 1
+            return result
+
+        # -------------------------------
+        # Case 6: Formats like "24 seconds"
+        if s.endswith("seconds"):
+            num_str = ''.join(ch for ch in s if ch.isdigit() or ch == '.')
+            if num_str:
+                try:
+                    sec = float(num_str)
+                    result = round(sec / 60)
+                    if result == 0 and sec > 0:
+                        result = 1
+                    return result
+                except ValueError:
+                    pass
+
+        # -------------------------------
+        # Case 7: Formats ending with "min" (e.g. "17 min")
+        if s.endswith("min"):
+            num_part = s[:-3].strip()
+            if num_part.isdigit():
+                return int(num_part)
+
+        # If nothing matches, return None.
+        return None
+
+    except Exception:
+        return 0
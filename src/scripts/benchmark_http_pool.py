@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+HTTP connection pool benchmark for Porn Fetch
+
+Starts a local HTTPS server (self-signed certificate, created with the openssl command line tool) that stands in for a
+thumbnail / metadata host and sends --requests requests from --components clients (site cores, thumbnails, GUI ...):
+
+  - client per request: a new client for every request, like the old write_tags() (new BaseCore per thumbnail)
+  - client per component: one client with its own connections per component, like the old per-site cores
+  - shared transport: one client per component (own headers / cookies), all on the shared PooledTransport
+
+and reports the time, the number of TCP connections / TLS handshakes and the requests over reused connections.
+
+Usage:
+    python src/scripts/benchmark_http_pool.py [--requests 300] [--components 4] [--latency 0.002]
+"""
+
+import os
+import ssl
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+from src.backend.http_pool import PooledTransport, ConnectionStats
+
+
+class StandInHost(BaseHTTPRequestHandler):
+    """GET /<anything> -> 2 KB of bytes after the configured latency, with keep-alive"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Headers and body are written separately
+    latency = 0.002
+    body = os.urandom(2048)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_certificate(directory):
+    certificate = os.path.join(directory, "certificate.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", key, "-out", certificate,
+                    "-days", "1", "-subj", "/CN=localhost"], check=True, capture_output=True)
+    return certificate, key
+
+
+def start_server(directory):
+    certificate, key = create_certificate(directory)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certificate, key)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHost)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"https://127.0.0.1:{server.server_address[1]}"
+
+
+def run(base_url, requests, components, mode):
+    """
+    Returns:
+        (seconds, {"requests", "connections", "tls_handshakes", "reused"})
+    """
+    stats = ConnectionStats()
+    shared = PooledTransport(verify=False, stats=stats)
+    clients = []
+    if mode == "client per component":
+        clients = [httpx.Client(transport=PooledTransport(verify=False, stats=stats)) for _ in range(components)]
+
+    elif mode == "shared transport":
+        clients = [httpx.Client(transport=shared, headers={"Referer": f"https://site{index}.example/"})
+                   for index in range(components)]
+
+    start = time.perf_counter()
+    for index in range(requests):
+        url = f"{base_url}/thumbnail/{index}.jpg"
+        if mode == "client per request":
+            with httpx.Client(transport=PooledTransport(verify=False, stats=stats)) as client:
+                client.get(url).raise_for_status()
+
+        else:
+            clients[index % components].get(url).raise_for_status()
+
+    seconds = time.perf_counter() - start
+    for client in clients:
+        client.close()
+
+    shared.close()
+    totals = {}
+    for counters in stats.snapshot().values():
+        for field, value in counters.items():
+            totals[field] = totals.get(field, 0) + value
+
+    return seconds, totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark connection reuse with the shared HTTP transport")
+    parser.add_argument("--requests", type=int, default=300, help="Number of requests per run")
+    parser.add_argument("--components", type=int, default=4, help="Number of clients (site cores, thumbnails ...)")
+    parser.add_argument("--latency", type=float, default=0.002, help="Latency of the stand-in server in seconds")
+    args = parser.parse_args()
+
+    StandInHost.latency = args.latency
+    with tempfile.TemporaryDirectory() as directory:
+        server, base_url = start_server(directory)
+        print(f"{'mode':>22} {'seconds':>8} {'connections':>12} {'handshakes':>11} {'reused':>7}")
+        try:
+            for mode in ("client per request", "client per component", "shared transport"):
+                seconds, totals = run(base_url, args.requests, max(1, args.components), mode)
+                print(f"{mode:>22} {seconds:>8.3f} {totals.get('connections', 0):>12} "
+                      f"{totals.get('tls_handshakes', 0):>11} {totals.get('reused', 0):>7}")
+
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Import time benchmark for Porn Fetch
+
+Imports each module in a fresh interpreter with `python -X importtime` (best of --repeat runs) and reports the
+cumulative import time, the number of imported modules and which site API packages were imported. The site packages
+are imported on first use (see src/backend/site_clients.py), so none of them should show up here.
+
+With --max-ms and / or --no-site-packages the script exits with status 1 if a module is slower or imports a site
+package, so it can guard the start-up time in CI.
+
+Usage:
+    python src/scripts/benchmark_import_time.py [--repeat 5] [--max-ms 0] [--no-site-packages] [modules ...]
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+from src.backend.site_clients import SITE_MODULES
+
+DEFAULT_MODULES = ("src.backend.shared_functions", "src.backend.CLI_model_feature_addon", "Porn_Fetch_CLI")
+SITE_PACKAGES = {module.split(".")[0] for module, _ in SITE_MODULES.values()}
+
+
+def import_time(module):
+    """
+    Import module in a new interpreter
+
+    Returns:
+        (cumulative import time in ms, {imported module: cumulative time in µs})
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    imported = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+
+        _, cumulative, name = line.split("|")
+        try:
+            imported[name.strip()] = int(cumulative)
+
+        except ValueError:
+            continue  # Header line
+
+    return imported.get(module, 0) / 1000, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the import time of Porn Fetch's modules")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Modules to import")
+    parser.add_argument("--repeat", type=int, default=5, help="Imports per module, the fastest one is reported")
+    parser.add_argument("--max-ms", type=float, default=0, help="Fail if a module takes longer (0 to disable)")
+    parser.add_argument("--no-site-packages", action="store_true", help="Fail if a module imports a site package")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'module':<40} {'ms':>8} {'modules':>8}  site packages")
+    for module in args.modules:
+        runs = [import_time(module) for _ in range(max(1, args.repeat))]
+        milliseconds, imported = min(runs, key=lambda run: run[0])
+        site_packages = sorted(SITE_PACKAGES.intersection(name.split(".")[0] for name in imported))
+        print(f"{module:<40} {milliseconds:>8.1f} {len(imported):>8}  {', '.join(site_packages) or '-'}")
+
+        if args.max_ms and milliseconds > args.max_ms:
+            print(f"  {module} takes longer than {args.max_ms} ms to import")
+            failed = True
+
+        if args.no_site_packages and site_packages:
+            print(f"  {module} imports site packages at import time")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Library loading benchmark for Porn Fetch
+
+Generates synthetic library.json files (10k / 100k / 1M entries by default) and measures load time and peak memory of:
+  - json:    json.load() of the whole file, every entry kept as a dictionary (how the library used to be loaded)
+  - manager: LibraryManager (streaming loader, compact records, indexes)
+
+Every measurement runs in its own process, so the peak memory of one run doesn't hide the next one.
+
+Usage:
+    python src/scripts/benchmark_library.py [--sizes 10000 100000 1000000] [--directory DIRECTORY]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+
+def generate_library(path, size, seed=1337):
+    """
+    Write a synthetic library.json with realistic looking entries (CDN thumbnails, cloudflare_url, ...)
+    """
+    rng = random.Random(seed)
+    authors = [f"Author {i}" for i in range(max(size // 20, 10))]
+    tags = [f"tag{i}" for i in range(500)]
+    actors = [f"Actor Name {i}" for i in range(2000)]
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{\n  "version": "1.0",\n  "videos": [')
+        for i in range(size):
+            video_key = "ph" + format(rng.getrandbits(48), "x")
+            entry = {
+                "url": f"https://www.pornhub.com/view_video.php?viewkey={video_key}",
+                "video_id": f"pornhub:{video_key}",
+                "title": " ".join(rng.choice(tags) for _ in range(6)).title() + f" {i}",
+                "author": rng.choice(authors),
+                "duration": rng.randint(60, 3600),
+                "quality": rng.choice(("720", "1080", "best")),
+                "tags": rng.sample(tags, rng.randint(3, 12)),
+                "actors": rng.sample(actors, rng.randint(0, 3)),
+                "download_date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00",
+                "file_path": f"/home/user/Videos/Porn Fetch/{video_key}.mp4",
+                "thumbnail": f"https://ei.phncdn.com/videos/2025{i:08d}/original/({rng.getrandbits(64):x})"
+                             f"{rng.randint(1, 16)}.jpg?validfrom=1700000000&validto=1800000000&hash={rng.getrandbits(96):x}",
+                "publish_date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "cloudflare_url": f"https://videos.example.com/{video_key}.mp4",
+            }
+            f.write(("\n    " if i == 0 else ",\n    ") + json.dumps(entry, ensure_ascii=False))
+
+        f.write("\n  ]\n}\n")
+
+
+def peak_memory_mb():
+    """
+    Peak resident set size of this process in MB (None if the platform doesn't report it)
+    """
+    try:
+        import resource
+
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure(mode, path):
+    """
+    Runs inside the child process: load the library once and print the results as JSON
+    """
+    baseline = peak_memory_mb()
+    start = time.perf_counter()
+    if mode == "json":
+        with open(path, "r", encoding="utf-8") as f:
+            count = len(json.load(f)["videos"])
+
+    else:
+        from src.backend.library_manager import LibraryManager
+        manager = LibraryManager(path)
+        count = len(manager._videos)
+
+    elapsed = time.perf_counter() - start
+    peak = peak_memory_mb()
+    print(json.dumps({"count": count, "seconds": elapsed,
+                      "peak_mb": None if peak is None else peak - baseline}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark loading of large Porn Fetch libraries")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000, 1_000_000],
+                        help="Number of entries of the synthetic libraries")
+    parser.add_argument("--directory", default=os.path.join(tempfile.gettempdir(), "library-benchmark"),
+                        help="Where the synthetic libraries are written to")
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(*args.measure)
+        return
+
+    os.makedirs(args.directory, exist_ok=True)
+    print(f"{'entries':>10} {'file MB':>8} {'mode':>8} {'load s':>8} {'peak MB':>8}")
+    for size in args.sizes:
+        path = os.path.join(args.directory, f"library-{size}.json")
+        if not os.path.exists(path):
+            generate_library(path, size)
+
+        file_mb = os.path.getsize(path) / (1024 * 1024)
+        for mode in ("json", "manager"):
+            output = subprocess.run([sys.executable, __file__, "--measure", mode, path], capture_output=True,
+                                    text=True, check=True, cwd=args.directory).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            peak = "n/a" if result["peak_mb"] is None else f"{result['peak_mb']:.1f}"
+            print(f"{size:>10} {file_mb:>8.1f} {mode:>8} {result['seconds']:>8.2f} {peak:>8}")
+
+
+if __name__ == "__main__":
+    main()
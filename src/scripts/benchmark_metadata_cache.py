@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Metadata cache benchmark for Porn Fetch
+
+Starts a local HTTP server that stands in for a video site (every request waits --latency seconds) and lists
+--videos videos like re-listing a model does: the metadata of every video is loaded through a MetadataCache,
+every attribute (title, author, tags, thumbnail) costs one request, like the lazy properties of the site APIs.
+
+  - cold: empty metadata store, every video goes to the server
+  - warm: new process state (empty in-memory cache), same metadata store on disk
+
+Usage:
+    python src/scripts/benchmark_metadata_cache.py [--videos 500] [--latency 0.005] [--directory DIRECTORY]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+from src.backend.metadata_cache import MetadataCache, MetadataStore
+from src.backend.video_metadata import VideoMetadata
+
+ATTRIBUTES = ("title", "author", "tags", "thumbnail")
+
+
+class StandInSite(BaseHTTPRequestHandler):
+    """GET /<video id>/<attribute> -> JSON value, after the configured latency"""
+
+    latency = 0.005
+    requests = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with StandInSite.lock:
+            StandInSite.requests += 1
+
+        time.sleep(self.latency)
+        video_id, attribute = self.path.strip("/").split("/")
+        value = {
+            "title": f"Video {video_id}",
+            "author": f"Author {int(video_id) % 25}",
+            "tags": [f"tag{int(video_id) % 7}", f"tag{int(video_id) % 11}"],
+            "thumbnail": f"https://thumbnails.example.com/{video_id}.jpg",
+        }[attribute]
+        body = json.dumps(value).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInVideo:
+    """Video object with lazily fetched attributes, like the video classes of the site APIs"""
+
+    def __init__(self, base_url, video_id):
+        self.base_url = base_url
+        self.video_id = video_id
+        self.url = f"https://www.pornhub.com/view_video.php?viewkey=ph{video_id:08d}"
+
+    def fetch(self, attribute):
+        with urllib.request.urlopen(f"{self.base_url}/{self.video_id}/{attribute}") as response:
+            return json.loads(response.read())
+
+    def metadata(self):
+        attributes = {attribute: self.fetch(attribute) for attribute in ATTRIBUTES}
+        return VideoMetadata(key=f"pornhub:ph{self.video_id:08d}", url=self.url, title=attributes["title"],
+                             author=attributes["author"], duration_seconds=None, tags=tuple(attributes["tags"]),
+                             actors=(), publish_date=None, thumbnail=attributes["thumbnail"])
+
+
+def list_videos(base_url, store_path, count):
+    """
+    Load the attributes of `count` videos with a fresh in-memory cache on top of the store
+
+    Returns:
+        (seconds, requests sent to the server)
+    """
+    store = MetadataStore(store_path)
+    cache = MetadataCache(store=store, record_type=VideoMetadata)
+    requests_before = StandInSite.requests
+    start = time.perf_counter()
+    for video_id in range(count):
+        video = StandInVideo(base_url, video_id)
+        cache.get_or_load(f"pornhub:ph{video_id:08d}", video.metadata)
+
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed, StandInSite.requests - requests_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold vs warm listing with the persistent metadata cache")
+    parser.add_argument("--videos", type=int, default=500, help="Number of videos to list")
+    parser.add_argument("--latency", type=float, default=0.005, help="Latency of the stand-in server in seconds")
+    parser.add_argument("--directory", default=os.path.join(tempfile.gettempdir(), "metadata-benchmark"),
+                        help="Where the metadata store is written to")
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    store_path = os.path.join(args.directory, "metadata_cache.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(store_path + suffix):
+            os.remove(store_path + suffix)
+
+    StandInSite.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInSite)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print(f"{'run':>6} {'videos':>7} {'seconds':>8} {'requests':>9} {'ms/video':>9}")
+    try:
+        for run in ("cold", "warm"):
+            seconds, requests = list_videos(base_url, store_path, args.videos)
+            print(f"{run:>6} {args.videos:>7} {seconds:>8.3f} {requests:>9} {seconds / args.videos * 1000:>9.3f}")
+
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
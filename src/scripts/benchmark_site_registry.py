@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Site dispatch benchmark for Porn Fetch
+
+Classifies --urls video URLs (a mix of all supported sites, subdomains, mirrors and foreign hosts) with:
+
+  - regex chain: the substring patterns check_video() used before, tried one after another
+  - registry: video_keys.parse_video_url(), host name lookup in SITE_HOSTS (also extracts the video ID)
+
+and reports the time per URL and the number of URLs both methods classify differently.
+
+Usage:
+    python src/scripts/benchmark_site_registry.py [--urls 1000000]
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+from src.backend.video_keys import parse_video_url
+
+# The patterns of the old check_video(), in the order it tried them
+REGEX_CHAIN = (
+    ("hqporner", re.compile(r'(.*?)hqporner.com(.*)')),
+    ("eporner", re.compile(r'(.*?)eporner.com(.*)')),
+    ("xnxx", re.compile(r'(.*?)xnxx.com(.*)')),
+    ("xvideos", re.compile(r'(.*?)xvideos.com(.*)')),
+    ("missav", re.compile(r'(.*?)missav(.*?)')),
+    ("xhamster", re.compile(r'(.*?)xhamster(.*?)')),
+    ("spankbang", re.compile(r'(.*?)spankbang(.*?)')),
+    ("pornhub", re.compile(r'(.*?)pornhub(.*)')),
+)
+
+TEMPLATES = (
+    "https://www.pornhub.com/view_video.php?viewkey=ph{id:013x}",
+    "https://de.pornhub.org/view_video.php?viewkey=ph{id:013x}",
+    "https://hqporner.com/hdporn/{id}-some_title.html",
+    "https://www.xnxx.com/video-{id:x}/some_title",
+    "https://www.xvideos.com/video.{id:x}/some_title",
+    "https://www.xvideos2.com/video.{id:x}/some_title",
+    "https://www.eporner.com/video-{id:x}/some-title/",
+    "https://missav.ws/de/sone-{id}",
+    "https://xhamster.com/videos/some-title-{id:x}",
+    "https://xhamster3.desi/videos/some-title-{id:x}",
+    "https://spankbang.com/{id:x}/video/some+title",
+    # Foreign hosts that mention a site name somewhere in the URL
+    "https://www.reddit.com/r/pornhub_fans/comments/{id:x}/",
+    "https://example.com/redirect?to=https://www.xvideos.com/video.{id:x}/",
+)
+
+
+def regex_chain(url):
+    for site, pattern in REGEX_CHAIN:
+        if pattern.search(url):
+            return site
+
+    return None
+
+
+def registry(url):
+    return parse_video_url(url)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark regex chain vs host registry site dispatch")
+    parser.add_argument("--urls", type=int, default=1000000, help="Number of URLs to classify")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    urls = [rng.choice(TEMPLATES).format(id=rng.getrandbits(40)) for _ in range(args.urls)]
+
+    results = {}
+    print(f"{'method':>12} {'urls':>9} {'seconds':>8} {'ns/url':>8}")
+    for name, classify in (("regex chain", regex_chain), ("registry", registry)):
+        start = time.perf_counter()
+        results[name] = [classify(url) for url in urls]
+        seconds = time.perf_counter() - start
+        print(f"{name:>12} {args.urls:>9} {seconds:>8.3f} {seconds / args.urls * 1e9:>8.0f}")
+
+    different = sum(old != new for old, new in zip(results["regex chain"], results["registry"]))
+    print(f"\nClassified differently: {different} of {args.urls} URLs (foreign hosts and numbered mirrors)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The tests import the backend as "src.backend...", like Porn_Fetch_CLI.py and main.py do
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
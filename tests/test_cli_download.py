@@ -0,0 +1,105 @@
+import sys
+import threading
+from configparser import ConfigParser
+
+import pytest
+
+import Porn_Fetch_CLI
+from Porn_Fetch_CLI import CLI
+from src.backend import shared_functions
+from src.backend.library_manager import LibraryManager
+from src.backend.site_clients import SITE_MODULES
+from src.backend.video_keys import video_key
+from src.backend.video_metadata import VideoMetadata
+
+URL = "https://www.xvideos.com/video.ouhbdfc0c2f/title"
+
+
+class StandInVideo:
+    """Video of a site without a download protocol of its own (like xvideos), the transfer writes 1 KiB"""
+
+    def __init__(self, url=URL, fail=False):
+        self.url = url
+        self.title = "Video"
+        self.fail = fail
+
+    def download(self, path, callback=None, **kwargs):
+        with open(path, "wb") as f:
+            f.write(b"\0" * 1024)
+
+        if self.fail:
+            raise ConnectionError("Connection reset by peer")
+
+
+class NoThumbnails:
+    def library_path(self, key):
+        return None
+
+
+def metadata(video, use_cache=True):
+    return VideoMetadata(key=video_key(video.url), url=video.url, title=video.title, author="Someone",
+                         duration_seconds=60, tags=(), actors=(), publish_date=None, thumbnail=None)
+
+
+@pytest.fixture
+def library(tmp_path):
+    manager = LibraryManager(str(tmp_path / "library.json"))
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def cli(library, monkeypatch):
+    configuration = ConfigParser()
+    configuration.read_string(shared_functions.default_configuration)
+    configuration.set("Video", "write_metadata", "false")
+    monkeypatch.setattr(Porn_Fetch_CLI, "conf", configuration)
+    monkeypatch.setattr(Porn_Fetch_CLI, "get_library_manager", lambda: library)
+    monkeypatch.setattr(Porn_Fetch_CLI, "get_thumbnail_service", NoThumbnails)
+    monkeypatch.setattr(shared_functions, "load_video_metadata", metadata)
+
+    cli = CLI()
+    cli.semaphore = threading.Semaphore(2)
+    cli.quality = "best"
+    cli.threading_mode = "threaded"
+    return cli
+
+
+def download(cli, video, output_path):
+    cli.semaphore.acquire()  # Released by download(), like update_models() / process_video() do
+    cli.download(video, output_path, cli.progress.add_task("Downloading", total=None))
+
+
+def test_download_doesnt_import_site_packages(cli, tmp_path):
+    packages = {package for package, _ in SITE_MODULES.values()}
+    imported_before = packages & set(sys.modules)
+
+    download(cli, StandInVideo(), str(tmp_path / "video.mp4"))
+
+    assert packages & set(sys.modules) == imported_before
+
+
+def test_failed_transfer_doesnt_add_a_library_entry(cli, library, tmp_path):
+    with pytest.raises(ConnectionError):
+        download(cli, StandInVideo(fail=True), str(tmp_path / "video.mp4"))
+
+    assert library.get_all_videos() == []
+    assert library.check_duplicate(url=URL) is None  # The next run downloads it again
+    assert cli.semaphore._value == 2
+
+
+def test_complete_download_is_added_to_the_library(cli, library, tmp_path):
+    output_path = str(tmp_path / "video.mp4")
+    download(cli, StandInVideo(), output_path)
+
+    assert [video["file_path"] for video in library.get_all_videos()] == [output_path]
+    assert cli.semaphore._value == 2
+
+
+def test_skipped_duplicate_releases_the_semaphore_once(cli, library, tmp_path):
+    output_path = str(tmp_path / "video.mp4")
+    download(cli, StandInVideo(), output_path)
+    download(cli, StandInVideo(), output_path)  # Already in the library and on disk
+
+    assert len(library.get_all_videos()) == 1
+    assert cli.semaphore._value == 2
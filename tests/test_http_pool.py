@@ -0,0 +1,23 @@
+from src.backend import http_pool
+
+
+class Core:
+    """BaseCore of base_api 3.x: the session isn't an httpx.Client"""
+
+    def __init__(self):
+        self.config = None
+        self.session = None
+
+    def initialize_session(self):
+        self.session = object()
+
+
+def test_cores_keep_the_base_api_session_without_httpx(monkeypatch):
+    monkeypatch.setattr(http_pool, "httpx", None)
+    core = Core()
+    assert http_pool.attach_shared_transport(core)  # Checked again once the session is built
+
+    core.initialize_session()
+    session = core.session
+    assert not http_pool.attach_shared_transport(core)
+    assert core.session is session
@@ -0,0 +1,105 @@
+import os
+import struct
+
+import pytest
+
+from src.backend import library_fingerprint
+from src.backend.library_fingerprint import (Fingerprinter, fingerprint_download, fingerprint_file, fingerprint_library,
+                                             hardlink_duplicate)
+from src.backend.library_manager import LibraryManager
+
+
+def write(path, content: bytes) -> str:
+    with open(path, "wb") as f:
+        f.write(content)
+
+    return str(path)
+
+
+def box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def mp4(media: bytes, title: bytes) -> bytes:
+    return box(b"ftyp", b"isom\0\0\0\0") + box(b"moov", box(b"udta", title)) + box(b"mdat", media)
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    monkeypatch.setattr(library_fingerprint, "_fingerprinter_instance",
+                        Fingerprinter(str(tmp_path / "library.fingerprints.db"), workers=2))
+    manager = LibraryManager(str(tmp_path / "library.json"))
+    yield manager
+    manager.close()
+    library_fingerprint._fingerprinter_instance.close()
+
+
+def test_only_files_with_the_same_fingerprint_are_hardlinked(tmp_path, library):
+    content = os.urandom(64 * 1024)
+    original = write(tmp_path / "original.mp4", content)
+    copy = write(tmp_path / "copy.mp4", content)
+    same_size = write(tmp_path / "same_size.mp4", content[:-1] + bytes([content[-1] ^ 1]))
+    other_size = write(tmp_path / "other_size.mp4", content + b"\0")
+    for number, path in enumerate((original, copy, same_size, other_size)):
+        library.add_video_entry(url=f"https://example.com/video/{number}", video_id=f"example.com:{number}",
+                                title=f"Video {number}", file_path=path)
+
+    report = fingerprint_library(library, hardlink=True)
+
+    assert report["fingerprinted_files"] == 4
+    assert report["hardlinked_files"] == 1
+    assert [sorted(group["files"]) for group in report["duplicates"]] == [sorted([original, copy])]
+    assert os.path.samefile(original, copy)
+    assert not os.path.samefile(original, same_size)
+    assert not os.path.samefile(original, other_size)
+    with open(copy, "rb") as f:
+        assert f.read() == content
+
+
+def test_writing_the_tags_doesnt_change_the_fingerprint_of_an_mp4(tmp_path):
+    media = os.urandom(4096)
+    untagged = write(tmp_path / "untagged.mp4", mp4(media, b""))
+    tagged = write(tmp_path / "tagged.mp4", mp4(media, b"title: Video"))
+    other = write(tmp_path / "other.mp4", mp4(media[:-1] + b"\0", b""))
+
+    assert fingerprint_file(untagged) == fingerprint_file(tagged)
+    assert fingerprint_file(untagged) != fingerprint_file(other)
+    assert fingerprint_file(untagged, chunk_size=1000) == fingerprint_file(untagged)
+
+
+def test_files_are_not_linked_if_they_changed_since_they_were_fingerprinted(tmp_path, library):
+    content = os.urandom(64 * 1024)
+    original = write(tmp_path / "original.mp4", content)
+    copy = write(tmp_path / "copy.mp4", content)
+    fingerprinter = library_fingerprint._fingerprinter_instance
+    fingerprint = fingerprinter.fingerprint(original)
+    assert fingerprinter.fingerprint(copy) == fingerprint
+
+    write(tmp_path / "copy.mp4", content[::-1])  # Same size, but rewritten after it was fingerprinted
+    os.utime(copy, ns=(os.stat(copy).st_atime_ns, os.stat(original).st_mtime_ns + 10 ** 9))
+    assert not hardlink_duplicate(original, copy, fingerprint, fingerprinter.cache)
+    assert not os.path.samefile(original, copy)
+
+
+def test_a_download_with_the_same_content_is_linked_and_not_tagged_again(tmp_path, library):
+    media = os.urandom(4096)
+    original = write(tmp_path / "original.mp4", mp4(media, b""))
+    fingerprint, _, _ = fingerprint_download(library, original)
+    library.add_video_entry(url="https://example.com/video/1", video_id="example.com:1", title="Video",
+                            file_path=original, fingerprint=fingerprint)
+    write(tmp_path / "original.mp4", mp4(media, b"title: Video"))  # Tagged after it was fingerprinted
+
+    download = write(tmp_path / "download.mp4", mp4(media, b""))
+    assert fingerprint_download(library, download, hardlink=True) == (
+        fingerprint, library.get_video_by_id("example.com:1"), True)
+    assert os.path.samefile(original, download)
+
+
+def test_files_of_different_size_are_never_linked(tmp_path, library):
+    original = write(tmp_path / "original.mp4", b"a" * 1024)
+    changed = write(tmp_path / "changed.mp4", b"a" * 2048)  # e.g. rewritten after it was fingerprinted
+    fingerprinter = library_fingerprint._fingerprinter_instance
+
+    assert not hardlink_duplicate(original, changed, fingerprinter.fingerprint(original), fingerprinter.cache)
+    assert not os.path.samefile(original, changed)
+    assert os.path.getsize(changed) == 2048
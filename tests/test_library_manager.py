@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from src.backend.library_manager import LibraryManager
+
+URL_1 = "https://example.com/video/1"
+URL_2 = "https://example.com/video/2"
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "library.json")
+
+
+@pytest.fixture
+def open_library(path):
+    libraries = []
+
+    def open_library():
+        library = LibraryManager(path)
+        libraries.append(library)
+        return library
+
+    yield open_library
+    for library in libraries:
+        library.close()
+
+
+def saved_library(open_library):
+    """A library whose entries are read back from library.json by their byte offsets"""
+    library = open_library()
+    library.add_video_entry(url=URL_1, video_id="example.com:1", title="First", tags=["beach"])
+    library.add_video_entry(url=URL_2, video_id="example.com:2", title="Second")
+    assert library.save_library()
+    return library
+
+
+def test_entries_are_read_correctly_after_another_program_rewrote_the_file(path, open_library):
+    library = saved_library(open_library)
+
+    # upload_to_r2.py loads library.json and dumps it again with indent=2, every entry moves
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    data["videos"].append({"url": "https://example.com/video/3", "video_id": "example.com:3", "title": "Third"})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+    assert library.check_duplicate(url=URL_2)["title"] == "Second"
+    assert library.get_video_by_id("example.com:3")["title"] == "Third"
+    assert [video["title"] for video in library.get_all_videos()] == ["First", "Second", "Third"]
+    assert [video["title"] for video in library.search_videos("beach")] == ["First"]
+
+
+def test_changes_that_werent_written_yet_survive_the_reload(path, open_library):
+    library = saved_library(open_library)
+    library.add_video_entry(url="https://example.com/video/3", video_id="example.com:3", title="Third")
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+    assert [video["title"] for video in library.get_all_videos()] == ["First", "Second", "Third"]
+    assert library.save_library()
+    library.close()
+    assert [video["title"] for video in open_library().get_all_videos()] == ["First", "Second", "Third"]
+
+
+def test_every_entry_of_a_video_is_updated(path, open_library):
+    with open(path, "w", encoding="utf-8") as f:  # Added twice by an older version
+        json.dump({"version": "1.0", "videos": [
+            {"url": URL_1, "video_id": "example.com:1", "title": "Video", "download_date": "2024-01-01"},
+            {"url": URL_1, "video_id": "example.com:1", "title": "Video", "download_date": "2024-02-01"}]}, f)
+
+    library = open_library()
+    assert library.update_video_entries({"example.com:1": {"file_path": "/new/video.mp4"}}) == 2
+
+    videos = open_library().get_all_videos()  # Replays the updates from the journal
+    assert [(video["download_date"], video["file_path"]) for video in videos] == [
+        ("2024-01-01", "/new/video.mp4"), ("2024-02-01", "/new/video.mp4")]
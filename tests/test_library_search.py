@@ -0,0 +1,83 @@
+import pytest
+
+from src.backend.library_manager import LibraryManager
+from src.backend.library_search import SearchIndex
+
+
+@pytest.fixture
+def library(tmp_path):
+    manager = LibraryManager(str(tmp_path / "library.json"))
+    yield manager
+    manager.close()
+
+
+def titles(videos):
+    return [video["title"] for video in videos]
+
+
+def test_title_matches_rank_above_tag_matches():
+    index = SearchIndex()
+    index.add(1, {"title": "Beach day", "author": "someone", "tags": ["outdoor"]})
+    index.add(2, {"title": "Outdoor fun", "author": "someone", "tags": []})
+    index.add(3, {"title": "Indoor", "author": "outdoor channel", "tags": []})
+
+    assert [doc_id for doc_id, _ in index.search("outdoor")] == [2, 3, 1]
+
+
+def test_words_are_combined_with_and_groups_with_or():
+    index = SearchIndex()
+    index.add(1, {"title": "amateur pov"})
+    index.add(2, {"title": "amateur outdoor"})
+    index.add(3, {"title": "pov"})
+
+    assert {doc_id for doc_id, _ in index.search("amateur pov")} == {1}
+    assert {doc_id for doc_id, _ in index.search("amateur pov OR outdoor")} == {1, 2}
+
+
+def test_the_last_word_matches_as_a_prefix_and_exact_matches_rank_higher():
+    index = SearchIndex()
+    index.add(1, {"title": "footjob"})
+    index.add(2, {"title": "foot"})
+
+    assert [doc_id for doc_id, _ in index.search("foot")] == [2, 1]
+    assert index.search("amateur foo") == []
+
+
+def test_equal_scores_list_the_newest_video_first_and_pages_follow_the_ranking():
+    index = SearchIndex()
+    for doc_id in range(5):
+        index.add(doc_id, {"title": "same title"})
+
+    assert [doc_id for doc_id, _ in index.search("same")] == [4, 3, 2, 1, 0]
+    assert [doc_id for doc_id, _ in index.search("same", limit=2, offset=2)] == [2, 1]
+
+
+def test_library_search_is_ranked_and_follows_removals(library):
+    library.add_video_entry(url="https://example.com/video/1", video_id="example.com:1", title="Sunset",
+                            tags=["beach"])
+    library.add_video_entry(url="https://example.com/video/2", video_id="example.com:2", title="Beach walk")
+    assert titles(library.search_videos("beach")) == ["Beach walk", "Sunset"]
+    assert titles(library.search_videos("beach", page=2, per_page=1)) == ["Sunset"]
+
+    library.remove_video_entry("example.com:2")
+    assert titles(library.search_videos("beach")) == ["Sunset"]
+
+
+def test_the_same_video_from_another_url_is_a_duplicate(library):
+    url = "https://www.pornhub.com/view_video.php?viewkey=ph5f1e2d3c4b5a6"
+    assert library.add_video_entry(url=url, video_id="pornhub:ph5f1e2d3c4b5a6", title="Video")
+
+    mirror = "https://de.pornhub.org/view_video.php?viewkey=ph5f1e2d3c4b5a6&t=12"
+    assert library.check_duplicate(url=mirror)["url"] == url
+    assert not library.add_video_entry(url=mirror, video_id="ph5f1e2d3c4b5a6", title="Video")
+    assert library.check_duplicate(url="https://www.pornhub.com/view_video.php?viewkey=ph0000000000") is None
+    assert len(library.get_all_videos()) == 1
+
+
+def test_files_with_the_same_fingerprint_are_duplicates(library):
+    library.add_video_entry(url="https://example.com/video/1", video_id="example.com:1", title="Video",
+                            fingerprint="blake2b:0123")
+
+    duplicate = library.check_duplicate(url="https://other.example.com/video/9", fingerprint="blake2b:0123")
+    assert duplicate["video_id"] == "example.com:1"
+    assert titles(library.find_by_fingerprint("blake2b:0123")) == ["Video"]
@@ -0,0 +1,104 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.backend import metadata_cache
+from src.backend.metadata_cache import MetadataCache, MetadataStore
+
+KEY = "pornhub:ph0000000001"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the clocks of metadata_cache, advanced by hand"""
+    now = SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(metadata_cache, "time", SimpleNamespace(time=lambda: now.value, monotonic=lambda: now.value))
+    return now
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MetadataStore(str(tmp_path / "metadata_cache.db"), site_ttls={"pornhub": 100})
+    yield store
+    store.close()
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = MetadataCache(ttl=60)
+    cache.put(KEY, {"title": "Video"})
+    clock.value += 59
+    assert cache.get(KEY) == {"title": "Video"}
+
+    clock.value += 2
+    assert cache.get(KEY) is None
+    assert cache.get_or_load(KEY, lambda: {"title": "Reloaded"}) == {"title": "Reloaded"}
+
+
+def test_a_stale_store_entry_is_reloaded_before_returning_by_default(clock, store):
+    MetadataCache(store=store).put(KEY, {"title": "Old"})
+    clock.value += 101  # Past the TTL of the site in the store
+
+    cache = MetadataCache(store=store)  # A new process, nothing in memory
+    assert cache.get_or_load(KEY, lambda: {"title": "New"}) == {"title": "New"}
+    assert store.get(KEY) == ({"title": "New"}, False)
+
+
+def test_stale_while_revalidate_returns_the_stale_entry_and_reloads_it_in_the_background(clock, store):
+    MetadataCache(store=store).put(KEY, {"title": "Old"})
+    clock.value += 101
+
+    reloaded = threading.Event()
+
+    def loader():
+        reloaded.set()
+        return {"title": "New"}
+
+    cache = MetadataCache(store=store, revalidation="stale-while-revalidate")
+    assert cache.get_or_load(KEY, loader) == {"title": "Old"}
+    assert reloaded.wait(5)
+    for _ in range(100):  # The background thread writes the store right after the loader returned
+        if store.get(KEY)[0] == {"title": "New"}:
+            break
+
+        time.sleep(0.01)
+
+    assert store.get(KEY) == ({"title": "New"}, False)
+
+
+def test_concurrent_loads_of_the_same_key_call_the_loader_once():
+    cache = MetadataCache()
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(threading.get_ident())
+        release.wait(5)
+        return {"title": "Video"}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load(KEY, loader))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+
+    time.sleep(0.1)  # Everyone waits for the first loader
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"title": "Video"}] * 8
+    assert (cache.hits, cache.misses) == (7, 1)
+
+
+def test_a_failed_load_lets_the_next_caller_try_again():
+    cache = MetadataCache()
+
+    def failing_loader():
+        raise ConnectionError("Connection reset by peer")
+
+    with pytest.raises(ConnectionError):
+        cache.get_or_load(KEY, failing_loader)
+
+    assert cache.get_or_load(KEY, lambda: {"title": "Video"}) == {"title": "Video"}
@@ -0,0 +1,69 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+from src.backend.CLI_model_feature_addon import _crawl_model
+from src.backend.video_keys import video_key
+
+MODEL = "https://www.pornhub.com/model/a"
+
+
+def url(number: int) -> str:
+    return f"https://www.pornhub.com/view_video.php?viewkey=ph{number:010d}"
+
+
+class Listing:
+    """A model's listing, newest video first. Counts the videos that were read, can break off after `fail_after`"""
+
+    def __init__(self, numbers, fail_after=None):
+        self.numbers = list(numbers)
+        self.fail_after = fail_after
+        self.read = 0
+
+    def __call__(self, model_url, do_return=True):
+        for number in self.numbers:
+            if self.read == self.fail_after:
+                raise ConnectionError("Connection reset by peer")
+
+            self.read += 1
+            yield SimpleNamespace(url=url(number))
+
+
+def crawl(listing, known, watermark, lookback=2, publish_date_fn=None):
+    return _crawl_model(listing, MODEL, known, watermark, lookback, publish_date_fn)
+
+
+def test_the_crawl_stops_after_the_lookback_window_behind_the_watermark():
+    known = set()
+    urls, watermark, read = crawl(Listing(range(20, 0, -1)), known, None)
+    assert len(urls) == read == 20
+    assert watermark["video_key"] == video_key(url(20))
+
+    listing = Listing(range(23, 0, -1))  # Three new uploads
+    urls, watermark, read = crawl(listing, known, watermark)
+    assert urls == [url(23), url(22), url(21)]
+    assert read == listing.read == 3 + 1 + 2  # New videos, watermark video, lookback window
+    assert watermark["video_key"] == video_key(url(23))
+
+
+def test_a_listing_that_broke_off_is_read_past_the_known_videos_next_time():
+    known = set()
+    urls, watermark, read = crawl(Listing(range(30, 0, -1), fail_after=10), known, None)
+    assert len(urls) == read == 10
+    assert watermark["resume_position"] == 10
+
+    urls, watermark, read = crawl(Listing(range(30, 0, -1)), known, watermark)
+    assert urls == [url(number) for number in range(20, 0, -1)]
+    assert "resume_position" not in watermark
+
+
+def test_the_watermark_stores_the_publish_date_and_never_moves_back():
+    dates = {video_key(url(2)): datetime(2024, 5, 1), video_key(url(9)): datetime(2023, 1, 1)}
+    publish_date = lambda video: dates[video_key(video.url)]
+
+    _, watermark, _ = crawl(Listing([2, 1]), set(), None, publish_date_fn=publish_date)
+    assert watermark["publish_date"] == "2024-05-01T00:00:00"
+
+    # A stale listing page whose newest video is older than the watermark
+    _, stale, _ = crawl(Listing([9, 2, 1]), set(), watermark, publish_date_fn=publish_date)
+    assert stale["video_key"] == video_key(url(2))
+    assert stale["publish_date"] == "2024-05-01T00:00:00"
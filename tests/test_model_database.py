@@ -0,0 +1,112 @@
+import os
+import threading
+
+import pytest
+
+from src.backend.CLI_model_feature_addon import ModelDatabase, ModelScheduler
+
+MODEL_A = "https://www.pornhub.com/model/a"
+MODEL_B = "https://www.pornhub.com/model/b"
+VIDEO_1 = "https://www.pornhub.com/view_video.php?viewkey=ph0000000001"
+VIDEO_2 = "https://www.pornhub.com/view_video.php?viewkey=ph0000000002"
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "model_database.json")
+
+
+@pytest.fixture
+def open_database(path):
+    databases = []
+
+    def open_database(**kwargs):
+        database = ModelDatabase(path, **kwargs)
+        databases.append(database)
+        return database
+
+    yield open_database
+    for database in databases:
+        database.close()
+
+
+def test_replay_after_a_crash_drops_the_torn_last_line(path, open_database):
+    database = open_database(compact_after=1000)
+    database.add_model(MODEL_A)
+    database.add_pending(MODEL_A, [VIDEO_1, VIDEO_2])
+    database.record_download(MODEL_A, VIDEO_1)
+    with open(f"{path}.journal", "ab") as f:
+        f.write(b'{"seq": 99, "op": "add_model", "model": "https://www.pornhub.com/mod')  # Killed mid-write
+
+    reopened = open_database(compact_after=1000)
+    assert list(reopened.models) == [MODEL_A]
+    assert reopened.is_video_downloaded(MODEL_A, VIDEO_1)
+    assert reopened.get_pending(MODEL_A) == [VIDEO_2]
+    with open(f"{path}.journal", "rb") as f:
+        assert f.read().endswith(b"\n")
+
+    reopened.add_model(MODEL_B)  # Must not be glued to the torn line
+    assert set(open_database().models) == {MODEL_A, MODEL_B}
+
+
+def test_compaction_keeps_the_changes_of_other_instances(path, open_database):
+    first = open_database()
+    second = open_database()
+    first.add_model(MODEL_A)
+    second.add_model(MODEL_B)
+    second.add_pending(MODEL_B, [VIDEO_1])
+
+    first.compact()
+    assert not os.path.exists(f"{path}.journal")
+    second.record_download(MODEL_B, VIDEO_1)  # Written after the other instance compacted
+    first.close()
+    second.close()
+
+    reopened = open_database()
+    assert set(reopened.models) == {MODEL_A, MODEL_B}
+    assert reopened.is_video_downloaded(MODEL_B, VIDEO_1)
+
+
+def test_concurrent_writers_with_frequent_compaction_lose_nothing(open_database):
+    databases = [open_database(compact_after=5) for _ in range(4)]
+
+    def add_models(number, database):
+        for index in range(25):
+            database.add_model(f"https://www.pornhub.com/model/{number}-{index}")
+
+    threads = [threading.Thread(target=add_models, args=(number, database))
+               for number, database in enumerate(databases)]
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    for database in databases:
+        database.close()
+
+    assert len(open_database().models) == 100
+
+
+def test_downloaded_videos_stay_sorted(open_database):
+    database = open_database()
+    database.add_model(MODEL_A)
+    database.record_download(MODEL_A, VIDEO_2)
+    database.record_download(MODEL_A, VIDEO_1)
+
+    assert database.get_models()[0][1]["downloaded"] == [VIDEO_1, VIDEO_2]
+
+
+def test_the_scheduler_lists_due_models_most_overdue_first(open_database):
+    database = open_database()
+    database.add_model(MODEL_A)
+    database.add_model(MODEL_B)
+    scheduler = ModelScheduler(database, min_interval=3600)
+    assert scheduler.due_models(now=0) == [MODEL_A, MODEL_B]  # Never refreshed
+
+    scheduler.record_refresh(MODEL_A, 0, now=1000)
+    scheduler.record_refresh(MODEL_B, None, now=500)
+    assert database.get_schedule(MODEL_A)["next_due"] == 1000 + 3600
+    assert scheduler.due_models(now=5000) == [MODEL_B, MODEL_A]
+    assert scheduler.due_models(now=4200) == [MODEL_B]
+    assert scheduler.next_due() == 500 + 3600
@@ -0,0 +1,39 @@
+import os
+
+from src.backend import thumbnail_cache
+from src.backend.thumbnail_cache import ThumbnailCache
+
+
+def image(number: int) -> bytes:
+    return bytes([number]) * 1024
+
+
+def test_images_the_library_refers_to_are_never_evicted(tmp_path):
+    cache = ThumbnailCache(str(tmp_path), max_bytes=2048)
+    cache.put("example.com:1", image(1))
+    library_path = cache.pin("example.com:1")  # Recorded as thumbnail_path of a library entry
+    for number in range(2, 6):
+        cache.put(f"example.com:{number}", image(number))
+
+    assert cache.get("example.com:1") == library_path
+    assert os.path.isfile(library_path)
+    assert cache.get("example.com:2") is None  # Least recently used, not pinned
+    assert cache.get("example.com:5") is not None
+    cache.close()
+
+    reopened = ThumbnailCache(str(tmp_path), max_bytes=2048)
+    assert reopened.total_bytes <= 2048  # The pinned image doesn't count towards the limit
+    reopened.close()
+
+
+def test_the_default_directory_is_next_to_the_configuration(tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbnail_cache, "config_directory", str(tmp_path))
+    monkeypatch.setattr(thumbnail_cache, "_thumbnail_service", None)
+    monkeypatch.chdir(tmp_path / "..")
+
+    service = thumbnail_cache.get_thumbnail_service()
+    try:
+        assert service.cache.directory == str(tmp_path / "thumbnails")
+
+    finally:
+        service.close()
@@ -0,0 +1,30 @@
+from src.backend.video_keys import detect_site, parse_video_url, video_key
+
+
+def test_supported_sites_use_the_native_id():
+    assert video_key("https://www.pornhub.com/view_video.php?viewkey=ph5f1e2d3c4b5a6&t=12") == "pornhub:ph5f1e2d3c4b5a6"
+    assert video_key("https://de.pornhub.org/view_video.php?viewkey=ph5f1e2d3c4b5a6") == "pornhub:ph5f1e2d3c4b5a6"
+    assert video_key("https://www.xvideos2.com/video.ouhbdfc0c2f/title") == "xvideos:ouhbdfc0c2f"
+
+
+def test_pathless_url_with_query_uses_the_host_as_prefix():
+    key = video_key("https://evil.com?q=pornhub.com")
+    assert key == "evil.com:evil.com?q=pornhub.com"
+    assert detect_site("https://evil.com?q=pornhub.com") is None
+    assert parse_video_url("https://evil.com?q=pornhub.com") == (None, None)
+
+
+def test_unknown_site_prefix_is_the_lowercase_host_without_www():
+    assert video_key("https://WWW.Example.com/a/b/?x=1&utm_source=y").startswith("example.com:")
+    assert video_key("https://example.com?a=1") != video_key("https://example.com?a=2")
+    assert video_key("https://example.com?a=1").split(":")[0] == video_key("https://example.com?a=2").split(":")[0]
+
+
+def test_site_names_in_the_path_or_query_dont_make_a_site():
+    assert detect_site("https://example.com/pornhub.com/view_video.php?viewkey=ph1") is None
+    assert video_key("https://example.com/x?viewkey=ph1").startswith("example.com:")
+
+
+def test_titles_get_a_stable_digest():
+    assert video_key("Some Title") == video_key("some title")
+    assert video_key("Some Title").startswith("title:")
@@ -0,0 +1,26 @@
+import pytest
+
+from src.backend import shared_functions
+from src.backend.video_metadata import minutes_to_seconds, parse_length
+
+
+@pytest.mark.parametrize("length, source, minutes", [
+    (12, None, 12),
+    (0.2, None, 1),
+    ("16:19", None, 16),
+    ("600", "https://www.eporner.com/video-abc/", 10),
+    ("600", "https://www.xnxx.com/video-abc/", 600),
+    ("7.6", None, 8),
+    ("9 Min", None, 9),
+    ("59m 40s", None, 60),
+    ("24 seconds", None, 1),
+    (None, None, "Not available"),
+    ("soon", None, None),
+])
+def test_parse_length(length, source, minutes):
+    assert parse_length(length, source) == minutes
+
+
+def test_shared_functions_uses_the_same_helper():
+    assert shared_functions.parse_length is parse_length
+    assert minutes_to_seconds("16:19") == 16 * 60